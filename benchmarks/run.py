@@ -0,0 +1,253 @@
+"""
+Benchmark `local_machine` against a synthetic home directory.
+
+    python benchmarks/run.py --profile small --output bench.json
+    python benchmarks/run.py --profile small --compare bench.json
+
+Each case runs in a fresh subprocess (cold in-process caches, `HOME` pointing
+at the synthetic tree, stub tools first on `PATH`) and is repeated
+`--repeat` times. Results are written as JSON so runs can be compared across
+commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import synthetic
+
+REPO = Path(__file__).resolve().parent.parent
+
+# case name -> (class in local_machine.utils, method timed)
+BACKUP_CASES = {
+    "dotfiles": ("DotfilesBackup", "backup"),
+    "brew": ("BrewBackup", "backup"),
+    "r": ("RBackup", "backup"),
+    "git": ("GitBackup", "backup"),
+    "terminal": ("TerminalBackup", "backup"),
+    "cloud": ("CloudCLIsBackup", "backup"),
+    "duckdb": ("DuckDBBackup", "backup"),
+}
+LISTING_CASES = {
+    "brew_formulae": ("BrewBackup", "list_formulae"),
+    "ssh": ("SSHKeysLister", "list_keys"),
+    "macos": ("MacOSInfo", "get_info"),
+    "vscode": ("VSCodeExtensions", "list_extensions"),
+    "crontab": ("CrontabBackup", "export_crontab"),
+    "launchagents": ("LaunchAgentsBackup", "list_agents"),
+    "pipx": ("PipxList", "list_tools"),
+    "uv": ("UVToolList", "list_tools"),
+}
+OTHER_CASES = ["secrets", "secrets_parallel", "config", "cli_all"]
+CASES = list(BACKUP_CASES) + list(LISTING_CASES) + OTHER_CASES
+
+
+def _case_callable(case: str, backup_dir: Path):
+    """Build the zero-argument callable timed for `case` (in the child)."""
+    from local_machine.log import configure
+
+    # Through local_machine.log, so debug/info calls stay as cheap as in a
+    # normal run and process-pool workers get the same set-up
+    configure("WARNING")
+    from local_machine import utils
+
+    if case in BACKUP_CASES:
+        cls, method = BACKUP_CASES[case]
+        return lambda: getattr(getattr(utils, cls)(backup_dir, force=True), method)()
+    if case in LISTING_CASES:
+        cls, method = LISTING_CASES[case]
+        if cls == "BrewBackup":
+            from local_machine.cache import inventory_cache
+
+            def listing():
+                inventory_cache.invalidate()
+                return utils.BrewBackup(backup_dir).list_formulae()
+
+            return listing
+        return lambda: getattr(getattr(utils, cls)(), method)()
+    if case == "secrets":
+        return lambda: utils.SecretsBackup().report_table()
+    if case == "secrets_parallel":
+        return lambda: utils.SecretsBackup().report_table(workers=os.cpu_count())
+    if case == "config":
+        from local_machine.config import ProjectConfig
+
+        return lambda: ProjectConfig(start_dir=REPO)
+    if case == "cli_all":
+        cmd = [
+            sys.executable,
+            str(REPO / "app" / "main.py"),
+            "--backup-dir",
+            str(backup_dir),
+            "--force",
+            "all",
+        ]
+        return lambda: subprocess.run(
+            cmd, cwd=backup_dir, check=True, capture_output=True
+        )
+    raise ValueError(f"Unknown case {case!r}")
+
+
+def run_case(case: str, repeat: int, scratch: Path) -> list:
+    """Time `case` `repeat` times in this process; a fresh backup dir per run."""
+    timings = []
+    for i in range(repeat):
+        backup_dir = scratch / f"{case}_{i}"
+        backup_dir.mkdir(parents=True)
+        fn = _case_callable(case, backup_dir)
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        shutil.rmtree(backup_dir, ignore_errors=True)
+    return timings
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def summarise(timings: list) -> dict:
+    return {
+        "runs": [round(t, 6) for t in timings],
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+    }
+
+
+def compare(current: dict, baseline_path: Path) -> str:
+    baseline = json.loads(Path(baseline_path).read_text())
+    lines = [
+        f"baseline {baseline['meta']['commit']} -> current {current['meta']['commit']}",
+        f"{'case':<18} {'baseline':>10} {'current':>10} {'ratio':>7}",
+    ]
+    for case, result in current["results"].items():
+        old = baseline["results"].get(case)
+        if "error" in result or not old or "error" in old:
+            lines.append(f"{case:<18} {'-':>10} {'-':>10} {'-':>7}")
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("inf")
+        lines.append(
+            f"{case:<18} {old['median']:>10.4f} {result['median']:>10.4f} {ratio:>6.2f}x"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=synthetic.PROFILES, default="small")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Stub tool latency in seconds"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--duckdb-mb", type=int, default=None)
+    parser.add_argument("--dotfiles", type=int, default=None)
+    parser.add_argument("--repos", type=int, default=None)
+    parser.add_argument(
+        "--workdir", type=Path, default=None, help="Keep the synthetic tree here"
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    # Internal: run one case in this process and print its timings as JSON
+    parser.add_argument("--child", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--scratch", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_case(args.child, args.repeat, args.scratch)))
+        return
+
+    prof = synthetic.profile(
+        args.profile,
+        seed=args.seed,
+        duckdb_mb=args.duckdb_mb,
+        dotfiles=args.dotfiles,
+        repos=args.repos,
+    )
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="local-machine-bench-"))
+    home, bin_dir = workdir / "home", workdir / "bin"
+    start = time.perf_counter()
+    if not home.exists():
+        counts = synthetic.generate_home(home, prof)
+    else:
+        counts = {"reused": str(home)}
+    synthetic.write_stubs(bin_dir, prof)
+    print(f"Synthetic home ready in {time.perf_counter() - start:.1f}s: {counts}")
+
+    env = synthetic.environment(home, bin_dir, args.latency)
+    # Benchmark the working tree, not whatever copy happens to be installed
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(REPO / "src"), env.get("PYTHONPATH")])
+    )
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "profile": args.profile,
+            "params": synthetic.describe(prof),
+            "latency": args.latency,
+            "repeat": args.repeat,
+            "home": counts,
+        },
+        "results": {},
+    }
+    for case in args.cases:
+        scratch = workdir / "scratch"
+        proc = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                case,
+                "--repeat",
+                str(args.repeat),
+                "--scratch",
+                str(scratch),
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        shutil.rmtree(scratch, ignore_errors=True)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1:] or ["failed"]
+            report["results"][case] = {"error": error[0]}
+            print(f"{case:<18} error: {error[0]}")
+            continue
+        report["results"][case] = summarise(json.loads(proc.stdout.splitlines()[-1]))
+        print(f"{case:<18} {report['results'][case]['median']:.4f}s (median)")
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Wrote {args.output}")
+    if args.compare:
+        print(compare(report, args.compare))
+    if args.workdir is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Synthetic `$HOME` trees and stub tools for benchmarking `local_machine`.
+
+Everything is generated from a seed, so the same profile produces the same
+tree on every machine and commit.
+"""
+
+import os
+import random
+import stat
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+# DuckDB file header: 8-byte checksum, then the "DUCK" magic
+DUCKDB_HEADER = b"\0" * 8 + b"DUCK" + b"\0" * 4084
+
+
+@dataclass(frozen=True)
+class HomeProfile:
+    dotfiles: int = 200
+    dotfile_bytes: int = 2048
+    repos: int = 20
+    repo_depth: int = 4
+    files_per_dir: int = 8
+    venv_files: int = 50
+    node_modules_files: int = 200
+    secrets_ratio: float = 0.3
+    gcloud_logs: int = 5
+    gcloud_log_mb: int = 1
+    duckdb_mb: int = 64
+    packages: int = 150
+    seed: int = 42
+
+
+PROFILES = {
+    "small": HomeProfile(),
+    "medium": HomeProfile(
+        dotfiles=2000,
+        repos=200,
+        repo_depth=6,
+        venv_files=200,
+        node_modules_files=1000,
+        gcloud_logs=20,
+        gcloud_log_mb=5,
+        duckdb_mb=1024,
+        packages=400,
+    ),
+    "large": HomeProfile(
+        dotfiles=5000,
+        repos=1000,
+        repo_depth=8,
+        venv_files=500,
+        node_modules_files=3000,
+        gcloud_logs=50,
+        gcloud_log_mb=10,
+        duckdb_mb=4096,
+        packages=1000,
+    ),
+}
+
+
+def profile(name: str, **overrides) -> HomeProfile:
+    return replace(
+        PROFILES[name], **{k: v for k, v in overrides.items() if v is not None}
+    )
+
+
+def _text(rng: random.Random, size: int) -> bytes:
+    words = [b"export", b"alias", b"PATH", b"true", b"config", b"# comment", b"="]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words) + b" " + str(rng.random()).encode() + b"\n"
+    return bytes(out[:size])
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def generate_home(root: Path, p: HomeProfile) -> dict:
+    """Create a synthetic home directory under `root`; returns file counts."""
+    rng = random.Random(p.seed)
+    root = Path(root)
+    counts = {"dotfiles": 0, "repo_files": 0, "secrets": 0, "bytes": 0}
+
+    for i in range(p.dotfiles):
+        data = _text(rng, rng.randint(p.dotfile_bytes // 4, p.dotfile_bytes))
+        _write(root / f".dotfile_{i:05d}", data)
+        counts["dotfiles"] += 1
+        counts["bytes"] += len(data)
+    for name in (".zshrc", ".gitconfig", ".gitignore_global", ".Rprofile", ".Renviron"):
+        _write(root / name, _text(rng, p.dotfile_bytes))
+
+    code = root / "code" / "github"
+    for r in range(p.repos):
+        repo = code / f"org{r % 10}" / f"repo{r:04d}"
+        current = repo
+        for depth in range(p.repo_depth):
+            current = current / f"pkg{depth}"
+            for f in range(p.files_per_dir):
+                _write(current / f"module{f}.py", _text(rng, 512))
+                counts["repo_files"] += 1
+        if rng.random() < p.secrets_ratio:
+            _write(repo / ".env", b"API_KEY=not-a-real-key\n")
+            counts["secrets"] += 1
+        if rng.random() < p.secrets_ratio / 3:
+            _write(repo / "conf" / ".secrets.toml", b'token = "placeholder"\n')
+            counts["secrets"] += 1
+        # Pruned by the secrets scan, but still bulky on disk
+        for f in range(p.venv_files):
+            _write(repo / ".venv" / "lib" / f"site{f % 10}" / f"mod{f}.py", b"x" * 256)
+        for f in range(p.node_modules_files):
+            _write(repo / "node_modules" / f"dep{f % 50}" / f"index{f}.js", b"y" * 256)
+        _write(repo / ".venv" / ".env", b"IGNORED=1\n")
+
+    gcloud = root / ".config" / "gcloud"
+    _write(gcloud / "configurations" / "config_default", b"[core]\nproject = demo\n")
+    for i in range(p.gcloud_logs):
+        log = gcloud / "logs" / f"2024.01.{i % 28 + 1:02d}" / f"run{i:03d}.log"
+        chunk = _text(rng, 64 * 1024)
+        log.parent.mkdir(parents=True, exist_ok=True)
+        with open(log, "wb") as f:
+            for _ in range(p.gcloud_log_mb * 16):
+                f.write(chunk)
+        counts["bytes"] += p.gcloud_log_mb * 1024 * 1024
+    _write(root / ".aws" / "config", b"[default]\nregion = ap-southeast-2\n")
+    for d in (".config/rstudio", ".rstudio-desktop", ".warp"):
+        for f in range(5):
+            _write(root / d / f"prefs{f}.json", _text(rng, 4096))
+    (root / ".ssh").mkdir(exist_ok=True)
+    _write(root / ".ssh" / "config", b"Host *\n  AddKeysToAgent yes\n")
+    _write(root / ".ssh" / "id_ed25519.pub", b"ssh-ed25519 AAAA demo\n")
+
+    # Sparse beyond the header, so a multi-GB database costs no disk space
+    db = root / "duckdb.db"
+    with open(db, "wb") as f:
+        f.write(DUCKDB_HEADER)
+        f.truncate(p.duckdb_mb * 1024 * 1024)
+    counts["bytes"] += p.duckdb_mb * 1024 * 1024
+    return counts
+
+
+def _stub(name: str, body: str) -> str:
+    var = "STUB_LATENCY_" + name.upper()
+    return "#!/bin/sh\n" f'sleep "${{{var}:-${{STUB_LATENCY:-0}}}}"\n' f"{body}\n"
+
+
+def write_stubs(bin_dir: Path, p: HomeProfile) -> list:
+    """
+    Write stub `brew`, `code`, `uv`, `pipx`, `crontab` and `sw_vers` tools.
+
+    Each sleeps for `$STUB_LATENCY_<TOOL>` (or `$STUB_LATENCY`) seconds before
+    printing plausible output, so probe latency can be dialled in per run.
+    """
+    bin_dir = Path(bin_dir)
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    n = p.packages
+    formulae = "\n".join(f"formula{i} 1.{i}.0" for i in range(n))
+    casks = "\n".join(f"cask{i} 2.{i}" for i in range(n // 4))
+    brewfile = "\n".join(f'brew "formula{i}"' for i in range(n))
+    extensions = "\n".join(f"publisher{i}.extension{i}" for i in range(n // 3))
+    uv_tools = "\n".join(f"tool{i} v0.{i}.0\n- tool{i}" for i in range(n // 10))
+    pipx_tools = "\n".join(
+        f"   package pkg{i} 1.{i}, installed using Python 3.12" for i in range(n // 10)
+    )
+    stubs = {
+        "brew": f"""case "$1 $2" in
+  "bundle dump")
+    while [ $# -gt 0 ]; do
+      if [ "$1" = "--file" ]; then shift; cat > "$1" <<'EOF'
+{brewfile}
+EOF
+      fi
+      shift
+    done ;;
+  list*)
+    case "$*" in
+      *--cask*) cat <<'EOF'
+{casks}
+EOF
+      ;;
+      *) cat <<'EOF'
+{formulae}
+EOF
+      ;;
+    esac ;;
+esac""",
+        "code": f"cat <<'EOF'\n{extensions}\nEOF",
+        "uv": f"cat <<'EOF'\n{uv_tools}\nEOF",
+        "pipx": f"cat <<'EOF'\nvenvs are in ~/.local/pipx/venvs\n{pipx_tools}\nEOF",
+        "crontab": "echo '0 3 * * * /usr/local/bin/backup'",
+        "sw_vers": "printf 'ProductName:\\tmacOS\\nProductVersion:\\t14.5\\n'",
+    }
+    written = []
+    for name, body in stubs.items():
+        path = bin_dir / name
+        path.write_text(_stub(name, body))
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        written.append(str(path))
+    return written
+
+
+def describe(p: HomeProfile) -> dict:
+    return asdict(p)
+
+
+def environment(home: Path, bin_dir: Path, latency: float) -> dict:
+    """Environment for running `local_machine` against the synthetic home."""
+    env = dict(os.environ)
+    env.update(
+        HOME=str(home),
+        PATH=f"{bin_dir}{os.pathsep}{env.get('PATH', '')}",
+        XDG_CACHE_HOME=str(Path(home) / ".cache"),
+        HOMEBREW_PREFIX=str(Path(home) / "homebrew"),
+        STUB_LATENCY=str(latency),
+    )
+    return env
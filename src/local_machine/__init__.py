@@ -1,2 +1,4 @@
-def main() -> None:
-    print("Hello from local-machine!")
+def main() -> int:
+    from local_machine.cli import main as cli_main
+
+    return cli_main()
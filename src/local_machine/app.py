@@ -1,68 +1,398 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import streamlit as st
-from loguru import logger
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from local_machine.log import add_sink
 import pandas as pd
 import plistlib
+import re
 
-from local_machine.utils import (
-    DotfilesBackup,
-    BrewBackup,
-    SSHKeysLister,
-    MacOSInfo,
-    VSCodeExtensions,
-    CrontabBackup,
-    LaunchAgentsBackup,
-    PipxList,
-    UVToolList,
-    RBackup,
-    GitBackup,
-    TerminalBackup,
-    CloudCLIsBackup,
-    DuckDBBackup,
-    SecretsBackup,
+from local_machine.cache import inventory_cache
+from local_machine.jobs import DEFAULT_WORKERS, JobManager
+from local_machine.metrics import write_report
+from local_machine.registry import (
+    load_registry,
+    resolve,
+    tab_units,
+    tabs,
+    unit_filters,
+    unit_sources,
 )
+from local_machine.filters import parse_size
+from local_machine.store import ChunkStore
+from local_machine.tree import dir_totals, list_level, paginate
+from local_machine.units import RunContext
+from local_machine.verify import verify_backup
+
+# Seconds before cached inventory results are fetched again
+INVENTORY_TTL = 10 * 60
+# How often the jobs panel refreshes while backups are running
+JOB_POLL_SECONDS = 1.0
+# Finished jobs listed in the jobs panel
+RECENT_JOBS = 10
+# Entries per page of a config-tree listing
+TREE_PAGE_SIZE = 50
+
+# Display names of cloud CLIs whose directory name is not just capitalized;
+# the directories themselves are the cloud unit's sources
+CLOUD_LABELS = {"aws": "AWS", "gcloud": "GCloud"}
+
+
+# Inventory results are cached per Streamlit server process. Arguments with a
+# leading underscore (the utility objects) are not hashed by Streamlit.
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_dotfiles(_dotfiles):
+    return [str(f) for f in _dotfiles.sources()]
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_brew_packages(_brew):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        formulae = pool.submit(_brew.list_formulae)
+        casks = pool.submit(_brew.list_casks)
+        return {"formulae": formulae.result(), "casks": casks.result()}
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_ssh(_ssh):
+    return {"keys": _ssh.list_keys(), "config": _ssh.show_config()}
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_macos_info(_info):
+    return _info.get_info()
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_vscode(_vscode):
+    return {
+        "extensions": _vscode.list_extensions(),
+        "settings": _vscode.user_settings(),
+    }
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_crontab(_cron):
+    return _cron.export_crontab()
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_launch_agents(_agents):
+    return _agents.list_agents()
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_python_tools(_uv, _pipx):
+    return {"uv": _uv.list_tools(), "pipx": _pipx.list_tools()}
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_dir_totals(root: str):
+    return dir_totals(root)
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_dir_level(path: str, root: str):
+    # Sizes of subdirectories come from the tree's cached totals
+    return list_level(path, cached_dir_totals(root))
+
+
+@st.cache_data(ttl=INVENTORY_TTL, show_spinner=False)
+def cached_secrets(_secrets):
+    return _secrets.report_table()
+
+
+@st.cache_data(show_spinner=False)
+def cached_plist(path: str, mtime_ns: int):
+    # Keyed on mtime, so an edited plist is parsed again
+    with open(path, "rb") as f:
+        return plistlib.load(f)
+
+
+def read_texts(paths, errors="strict"):
+    return {p.name: p.read_text(errors=errors) for p in paths if p.exists()}
+
+
+def refresh_inventory():
+    st.cache_data.clear()
+    inventory_cache.invalidate()
+
+
+def _slug(tab_name):
+    return re.sub(r"[^a-z0-9]+", "_", tab_name.lower()).strip("_")
+
+
+def show_files(files, target=st):
+    if isinstance(files, (list, tuple)):
+        for f in files:
+            target.code(f"Backup file: {f}")
+    else:
+        target.code(f"Backup file: {files}")
 
 
 class MacBackupApp:
-    def __init__(self, config, tabs_list=None):
+    """
+    The Streamlit app. Tabs and the objects behind them come from the unit
+    registry; a tab is drawn by its `tab_<slug>` method (and its "Show All"
+    panel by `panel_<slug>`), or generically for units declared only in the
+    config.
+
+    Backups run as background jobs (see `local_machine.jobs`), so a click
+    returns at once; the sidebar's jobs panel follows their progress.
+    """
+
+    def __init__(self, config, tabs_list=None, registry=None):
         self.config = config
-        self.tabs_list = tabs_list or [
-            "Dotfiles",
-            "Homebrew",
-            "SSH Keys",
-            "macOS Info",
-            "VS Code",
-            "Crontab",
-            "LaunchAgents",
-            "Python tools",
-            "R",
-            "Git",
-            "Terminal",
-            "Cloud CLIs",
-            "DuckDB",
-            "Secrets",
-        ]
+        self.registry = registry or load_registry(config)
+        self.tabs_list = tabs_list or tabs(self.registry)
         self.backup_dir = Path(
             self.config.get("backup", "dir", default=str(Path.home() / "icloud/backup"))
         )
-
-        # Initialize all backup utilities
-        self.backup_utils = {
-            "Dotfiles": DotfilesBackup(self.backup_dir),
-            "Homebrew": BrewBackup(self.backup_dir),
-            "SSH Keys": SSHKeysLister(),
-            "macOS Info": MacOSInfo(),
-            "VS Code": VSCodeExtensions(),
-            "Crontab": CrontabBackup(),
-            "LaunchAgents": LaunchAgentsBackup(),
-            "Python tools": {"uv": UVToolList(), "pipx": PipxList()},
-            "R": RBackup(self.backup_dir),
-            "Git": GitBackup(self.backup_dir),
-            "Terminal": TerminalBackup(self.backup_dir),
-            "Cloud CLIs": CloudCLIsBackup(self.backup_dir),
-            "DuckDB": DuckDBBackup(self.backup_dir),
-            "Secrets": SecretsBackup(),
+        self.ctx = RunContext(
+            backup_dir=self.backup_dir,
+            store=(
+                ChunkStore(self.backup_dir / "store")
+                if self.config.get("backup", "store", default=False)
+                else None
+            ),
+            codec=self.config.get("backup", "codec", default="deflate"),
+            duckdb_mode=self.config.get("duckdb", "mode", default="copy"),
+            duckdb_workers=self.config.get("duckdb", "workers", default=None),
+            secrets_exclude=self.config.get("secrets", "exclude", default=None),
+            secrets_max_scan_size=parse_size(
+                self.config.get("secrets", "max_scan_size", default=None)
+            ),
+            filters=unit_filters(self.registry),
+            sources=unit_sources(self.registry),
+        )
+        # Backup/listing objects, keyed by unit name
+        self.utils = {
+            spec.name: resolve(spec.make)(self.ctx)
+            for spec in self.registry.values()
+            if spec.make
         }
+        self.jobs = JobManager(
+            self.config.get("ui", "job_workers", default=DEFAULT_WORKERS)
+        )
+
+    def panel(self, tab_name):
+        """
+        Data for a tab's "Show All" sidebar panel as (st method, value) pairs.
+
+        Returns None for tabs without a panel. Only plain data is produced here
+        so panels can be fetched off the script thread.
+        """
+        build = getattr(self, f"panel_{_slug(tab_name)}", None)
+        return build() if build else None
+
+    def panel_dotfiles(self):
+        return [("write", cached_dotfiles(self.utils["dotfiles"]))]
+
+    def panel_homebrew(self):
+        packages = cached_brew_packages(self.utils["brew"])
+        return [("code", packages["formulae"]), ("code", packages["casks"])]
+
+    def panel_ssh_keys(self):
+        ssh = cached_ssh(self.utils["ssh"])
+        return [("write", ssh["keys"]), ("code", ssh["config"])]
+
+    def panel_macos_info(self):
+        info = cached_macos_info(self.utils["macos"])
+        return [
+            ("write", {"Date": info["date"], "macOS Version": info["macos_version"]}),
+            ("write", info["applications"]),
+        ]
+
+    def panel_vs_code(self):
+        vscode = cached_vscode(self.utils["vscode"])
+        return [("write", vscode["extensions"]), ("code", vscode["settings"])]
+
+    def panel_crontab(self):
+        return [("code", cached_crontab(self.utils["crontab"]))]
+
+    def panel_launchagents(self):
+        return [("write", cached_launch_agents(self.utils["launchagents"]))]
+
+    def panel_python_tools(self):
+        tools = self.python_tools()
+        return [("code", tools["uv"]), ("code", tools["pipx"])]
+
+    def source_files(self, unit):
+        """The files among a unit's registry sources that exist."""
+        return [p for p in self.utils[unit].sources() if p.is_file()]
+
+    def cloud_config_dirs(self):
+        """(label, directory) for each cloud CLI config directory."""
+        for path in self.utils["cloud"].sources():
+            name = path.name.lstrip(".")
+            yield CLOUD_LABELS.get(name, name.capitalize()), path
+
+    def panel_r(self):
+        texts = read_texts(self.source_files("r"))
+        return [("code", text) for text in texts.values()]
+
+    def panel_git(self):
+        texts = read_texts(self.source_files("git"))
+        return [("code", text) for text in texts.values()]
+
+    def panel_terminal(self):
+        texts = read_texts(self.source_files("terminal"), errors="replace")
+        return [("code", text) for text in texts.values()]
+
+    def panel_cloud_clis(self):
+        items = []
+        for label, path in self.cloud_config_dirs():
+            if path.exists():
+                size, files = cached_dir_totals(str(path)).get(str(path), (0, 0))
+                entries = cached_dir_level(str(path), str(path))
+                items.append(
+                    ("write", f"{label} Config: {files} files, {size / 1024:.1f} KB")
+                )
+                items.append(("dataframe", [e.row() for e in entries[:TREE_PAGE_SIZE]]))
+                if len(entries) > TREE_PAGE_SIZE:
+                    items.append(
+                        (
+                            "caption",
+                            f"{len(entries) - TREE_PAGE_SIZE} more entries "
+                            "on the Cloud CLIs tab",
+                        )
+                    )
+        return items
+
+    def panel_duckdb(self):
+        db = self.utils["duckdb"].sources()[0]
+        if not db.exists():
+            return []
+        return [
+            ("write", f"Database location: {db}"),
+            ("write", f"Size: {db.stat().st_size / 1024:.1f} KB"),
+        ]
+
+    def panel_secrets(self):
+        secrets = cached_secrets(self.utils["secrets"])
+        if not secrets:
+            return [("info", "No .env or .secrets.toml files found")]
+        return [("write", secrets)]
+
+    def python_tools(self):
+        return cached_python_tools(self.utils["uv"], self.utils["pipx"])
+
+    def fetch_panels(self):
+        """
+        Fetch every tab's panel concurrently, so "Show All" takes as long as
+        the slowest probe. Failures are returned in place of the panel.
+        """
+        ctx = get_script_run_ctx()
+
+        def fetch(tab_name):
+            add_script_run_ctx(threading.current_thread(), ctx)
+            return self.panel(tab_name)
+
+        panels = {}
+        with ThreadPoolExecutor(max_workers=max(len(self.tabs_list), 1)) as pool:
+            futures = {pool.submit(fetch, name): name for name in self.tabs_list}
+            for future in as_completed(futures):
+                try:
+                    panels[futures[future]] = future.result()
+                except Exception as e:
+                    panels[futures[future]] = e
+        return panels
+
+    def start_backup(self, name, target=st):
+        """Back up unit `name` in the background, unless it already is."""
+        job = self.jobs.submit(name, self.utils[name].backup)
+        target.info(f"{job.label} backup {job.status} (job {job.id})")
+        return job
+
+    def backup_all(self):
+        """Queue a backup of every unit on the tabs, as one tracked run."""
+        job_ids = []
+        for tab_name in self.tabs_list:
+            for spec in tab_units(self.registry, tab_name):
+                if hasattr(self.utils.get(spec.name), "backup"):
+                    job_ids.append(
+                        self.jobs.submit(spec.name, self.utils[spec.name].backup).id
+                    )
+        st.session_state["backup_all_jobs"] = job_ids
+        st.session_state.pop("backup_all_report", None)
+        st.sidebar.info(f"Queued {len(job_ids)} backups")
+
+    def show_metrics(self, run_metrics, target=st.sidebar):
+        """
+        Summarise a Backup All run. Its JSON/Prometheus report is written once,
+        when the run's last job finishes.
+        """
+        if "backup_all_report" not in st.session_state:
+            try:
+                report = f"Run report: {write_report(self.backup_dir, run_metrics)}"
+            except OSError as e:
+                report = f"Could not write run report: {e}"
+            st.session_state["backup_all_report"] = report
+        target.markdown("### Run metrics")
+        target.dataframe(
+            pd.DataFrame([m.as_dict() for m in run_metrics]).sort_values(
+                "wall_seconds", ascending=False
+            ),
+            hide_index=True,
+        )
+        target.caption(st.session_state["backup_all_report"])
+
+    def jobs_panel(self, polling=False):
+        """
+        Running and recent jobs, drawn as a fragment that refreshes itself
+        every `JOB_POLL_SECONDS` while `polling`. Once the last job finishes
+        the whole app reruns, which stops the polling.
+        """
+        jobs = self.jobs.jobs()
+        active = [job for job in jobs if not job.done]
+        if jobs:
+            st.markdown("---")
+            st.markdown("### Jobs")
+        if active:
+            st.dataframe(
+                pd.DataFrame([job.progress() for job in active]), hide_index=True
+            )
+            for job in active:
+                if st.button(f"Cancel {job.label}", key=f"cancel_job_{job.id}"):
+                    self.jobs.cancel(job.id)
+        for job in [job for job in jobs if job.done][:RECENT_JOBS]:
+            if job.status == "done":
+                st.success(f"{job.label} backup complete! ({job.elapsed:.1f}s)")
+                show_files(job.result)
+            elif job.status == "cancelled":
+                st.warning(f"{job.label} backup cancelled")
+            else:
+                st.error(f"Error in {job.label}: {job.error}")
+
+        batch = [self.jobs.get(i) for i in st.session_state.get("backup_all_jobs", ())]
+        batch = [job for job in batch if job is not None]
+        if batch and all(job.done for job in batch):
+            run_metrics = [job.metrics for job in batch if job.metrics is not None]
+            if run_metrics:
+                self.show_metrics(run_metrics, target=st)
+        if polling and not active:
+            st.rerun()
+
+    def verify(self):
+        """Check the backup directory against its recorded checksums."""
+        if not self.backup_dir.exists():
+            st.warning(f"Backup directory {self.backup_dir} does not exist")
+            return
+        with st.spinner(f"Verifying {self.backup_dir}..."):
+            progress = st.progress(0.0)
+            results = verify_backup(
+                self.backup_dir, progress_callback=progress.progress
+            )
+        failed = [r for r in results if not r.ok]
+        if failed:
+            st.error(f"{len(failed)} of {len(results)} checks failed")
+        else:
+            st.success(f"All {len(results)} checks passed")
+        if results:
+            st.dataframe(
+                pd.DataFrame([vars(r) for r in results]), use_container_width=True
+            )
 
     def run(self):
         st.set_page_config(
@@ -73,398 +403,280 @@ class MacBackupApp:
         st.title("MacBook Configuration Backup")
 
         show_all = st.sidebar.button("Show All", key="sidebar_show_all")
-        backup_all = st.sidebar.button("Backup All", key="sidebar_backup_all")
+        if st.sidebar.button("Backup All", key="sidebar_backup_all"):
+            self.backup_all()
+        if st.sidebar.button("Refresh inventory", key="sidebar_refresh"):
+            refresh_inventory()
+        if st.sidebar.button("Verify", key="sidebar_verify"):
+            self.verify()
 
         # Optionally, collect results to display in the sidebar
-        if show_all or backup_all:
+        if show_all:
             st.sidebar.markdown("---")
             st.sidebar.markdown("### Results")
+            panels = self.fetch_panels()
             for tab_name in self.tabs_list:
                 try:
-                    if show_all:
-                        if tab_name == "Dotfiles":
-                            files = [
-                                str(f)
-                                for f in Path.home().glob(".*")
-                                if f.is_file() and f.name != ".DS_Store"
-                            ]
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.write(files)
-                        elif tab_name == "Homebrew":
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.code(
-                                self.backup_utils["Homebrew"].list_formulae()
-                            )
-                            st.sidebar.code(self.backup_utils["Homebrew"].list_casks())
-                        elif tab_name == "SSH Keys":
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.write(self.backup_utils["SSH Keys"].list_keys())
-                            st.sidebar.code(self.backup_utils["SSH Keys"].show_config())
-                        elif tab_name == "macOS Info":
-                            info = self.backup_utils["macOS Info"].get_info()
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.write(
-                                {
-                                    "Date": info["date"],
-                                    "macOS Version": info["macos_version"],
-                                }
-                            )
-                            st.sidebar.write(info["applications"])
-                        elif tab_name == "VS Code":
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.write(
-                                self.backup_utils["VS Code"].list_extensions()
-                            )
-                            st.sidebar.code(
-                                self.backup_utils["VS Code"].user_settings()
-                            )
-                        elif tab_name == "Crontab":
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.code(
-                                self.backup_utils["Crontab"].export_crontab()
-                            )
-                        elif tab_name == "LaunchAgents":
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.write(
-                                self.backup_utils["LaunchAgents"].list_agents()
-                            )
-                        elif tab_name == "Python tools":
-                            st.sidebar.write(f"**{tab_name}:**")
-                            st.sidebar.code(
-                                self.backup_utils["Python tools"]["uv"].list_tools()
-                            )
-                            st.sidebar.code(
-                                self.backup_utils["Python tools"]["pipx"].list_tools()
-                            )
-                        elif tab_name == "R":
-                            rprofile = Path.home() / ".Rprofile"
-                            renviron = Path.home() / ".Renviron"
-                            st.sidebar.write(f"**{tab_name}:**")
-                            if rprofile.exists():
-                                st.sidebar.code(rprofile.read_text())
-                            if renviron.exists():
-                                st.sidebar.code(renviron.read_text())
-                        elif tab_name == "Git":
-                            gitconfig = Path.home() / ".gitconfig"
-                            gitignore = Path.home() / ".gitignore_global"
-                            st.sidebar.write(f"**{tab_name}:**")
-                            if gitconfig.exists():
-                                st.sidebar.code(gitconfig.read_text())
-                            if gitignore.exists():
-                                st.sidebar.code(gitignore.read_text())
-                        elif tab_name == "Terminal":
-                            term_plist = (
-                                Path.home()
-                                / "Library/Preferences/com.apple.Terminal.plist"
-                            )
-                            iterm_plist = (
-                                Path.home()
-                                / "Library/Preferences/com.googlecode.iterm2.plist"
-                            )
-                            st.sidebar.write(f"**{tab_name}:**")
-                            for plist_file in [term_plist, iterm_plist]:
-                                if plist_file.exists():
-                                    st.sidebar.code(
-                                        plist_file.read_text(errors="replace")
-                                    )
-                        elif tab_name == "Cloud CLIs":
-                            st.sidebar.write(f"**{tab_name}:**")
-                            for label, path in [
-                                ("AWS", Path.home() / ".aws"),
-                                ("GCloud", Path.home() / ".config/gcloud"),
-                                ("Azure", Path.home() / ".azure"),
-                            ]:
-                                if path.exists():
-                                    st.sidebar.write(f"{label} Config")
-                                    st.sidebar.write(list(path.glob("**/*")))
-                        elif tab_name == "DuckDB":
-                            db = Path.home() / "duckdb.db"
-                            st.sidebar.write(f"**{tab_name}:**")
-                            if db.exists():
-                                st.sidebar.write(f"Database location: {db}")
-                                st.sidebar.write(
-                                    f"Size: {db.stat().st_size / 1024:.1f} KB"
-                                )
-                        elif tab_name == "Secrets":
-                            secrets = self.backup_utils["Secrets"].report_table()
-                            st.sidebar.write(f"**{tab_name}:**")
-                            if not secrets:
-                                st.sidebar.info("No .env or .secrets.toml files found")
-                            else:
-                                st.sidebar.write(secrets)
-                    if backup_all:
-                        if tab_name in self.backup_utils and hasattr(
-                            self.backup_utils[tab_name], "backup"
-                        ):
-                            result = self.backup_utils[tab_name].backup()
-                            st.sidebar.success(f"{tab_name} backup complete!")
-                            if isinstance(result, (list, tuple)):
-                                for f in result:
-                                    st.sidebar.code(f"Backup file: {f}")
-                            else:
-                                st.sidebar.code(f"Backup file: {result}")
+                    panel = panels.get(tab_name)
+                    if isinstance(panel, Exception):
+                        raise panel
+                    if panel is not None:
+                        st.sidebar.write(f"**{tab_name}:**")
+                        for method, value in panel:
+                            getattr(st.sidebar, method)(value)
                 except Exception as e:
                     st.sidebar.error(f"Error in {tab_name}: {e}")
 
-        tabs = st.tabs(self.tabs_list)
-        tab_indices = {name: idx for idx, name in enumerate(self.tabs_list)}
-
-        # Dotfiles Tab
-        if "Dotfiles" in tab_indices:
-            with tabs[tab_indices["Dotfiles"]]:
-                st.header("Dotfiles")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Dotfiles", key="dotfiles_show"):
-                        files = [
-                            str(f)
-                            for f in Path.home().glob(".*")
-                            if f.is_file() and f.name != ".DS_Store"
-                        ]
-                        st.write(files)
-                with col2:
-                    if st.button("Backup Dotfiles", key="dotfiles_backup"):
-                        backup_file = self.backup_utils["Dotfiles"].backup()
-                        st.success("Dotfiles backup complete!")
-                        st.code(f"Backup file: {backup_file}")
-
-        # Homebrew Tab
-        if "Homebrew" in tab_indices:
-            with tabs[tab_indices["Homebrew"]]:
-                st.header("Homebrew")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Packages", key="homebrew_show"):
-                        st.subheader("Formulae")
-                        st.code(self.backup_utils["Homebrew"].list_formulae())
-                        st.subheader("Casks")
-                        st.code(self.backup_utils["Homebrew"].list_casks())
-                with col2:
-                    if st.button("Backup Brewfile", key="homebrew_backup"):
-                        brewfile = self.backup_utils["Homebrew"].backup()
-                        st.success("Brewfile backup complete!")
-                        st.code(f"Backup file: {brewfile}")
-
-        # SSH Keys Tab
-        if "SSH Keys" in tab_indices:
-            with tabs[tab_indices["SSH Keys"]]:
-                st.header("SSH Keys")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show SSH Keys", key="sshkeys_show"):
-                        st.write(self.backup_utils["SSH Keys"].list_keys())
-                with col2:
-                    if st.button("Show SSH Config", key="sshkeys_config"):
-                        st.code(self.backup_utils["SSH Keys"].show_config())
-
-        # macOS Info Tab
-        if "macOS Info" in tab_indices:
-            with tabs[tab_indices["macOS Info"]]:
-                st.header("macOS Info")
-                if st.button("Show System Info", key="macosinfo_show"):
-                    info = self.backup_utils["macOS Info"].get_info()
-                    st.write(
-                        {"Date": info["date"], "macOS Version": info["macos_version"]}
-                    )
-                    st.subheader("Installed Applications")
-                    st.write(info["applications"])
-
-        # VS Code Tab
-        if "VS Code" in tab_indices:
-            with tabs[tab_indices["VS Code"]]:
-                st.header("VS Code")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Extensions", key="vscode_ext_show"):
-                        st.write(self.backup_utils["VS Code"].list_extensions())
-                with col2:
-                    if st.button("Show Settings", key="vscode_settings_show"):
-                        st.code(self.backup_utils["VS Code"].user_settings())
-
-        # Crontab Tab
-        if "Crontab" in tab_indices:
-            with tabs[tab_indices["Crontab"]]:
-                st.header("Crontab")
-                if st.button("Show Crontab", key="crontab_show"):
-                    st.code(self.backup_utils["Crontab"].export_crontab())
-
-        # LaunchAgents Tab
-        if "LaunchAgents" in tab_indices:
-            with tabs[tab_indices["LaunchAgents"]]:
-                st.header("LaunchAgents")
-                if st.button("Show LaunchAgents", key="launchagents_show"):
-                    st.write(self.backup_utils["LaunchAgents"].list_agents())
-
-        # Python Tools Tab
-        if "Python tools" in tab_indices:
-            with tabs[tab_indices["Python tools"]]:
-                st.header("Python Tools")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show uv Tools", key="uvtools_show"):
-                        st.code(self.backup_utils["Python tools"]["uv"].list_tools())
-                with col2:
-                    if st.button("Show pipx Tools", key="pipx_show"):
-                        st.code(self.backup_utils["Python tools"]["pipx"].list_tools())
-
-        # R Tab
-        if "R" in tab_indices:
-            with tabs[tab_indices["R"]]:
-                st.header("R and RStudio")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Configs", key="r_show"):
-                        rprofile = Path.home() / ".Rprofile"
-                        renviron = Path.home() / ".Renviron"
-                        if rprofile.exists():
-                            st.subheader(".Rprofile")
-                            st.code(rprofile.read_text())
-                        if renviron.exists():
-                            st.subheader(".Renviron")
-                            st.code(renviron.read_text())
-                with col2:
-                    if st.button("Backup R Configs", key="r_backup"):
-                        files = self.backup_utils["R"].backup()
-                        st.success("R backup complete!")
-                        for f in files:
-                            st.code(f"Backup file: {f}")
-
-        # Git Tab
-        if "Git" in tab_indices:
-            with tabs[tab_indices["Git"]]:
-                st.header("Git Configs")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Configs", key="git_show"):
-                        gitconfig = Path.home() / ".gitconfig"
-                        gitignore = Path.home() / ".gitignore_global"
-                        if gitconfig.exists():
-                            st.subheader(".gitconfig")
-                            st.code(gitconfig.read_text())
-                        if gitignore.exists():
-                            st.subheader(".gitignore_global")
-                            st.code(gitignore.read_text())
-                with col2:
-                    if st.button("Backup Git Configs", key="git_backup"):
-                        files = self.backup_utils["Git"].backup()
-                        st.success("Git backup complete!")
-                        for f in files:
-                            st.code(f"Backup file: {f}")
-
-        # Terminal Tab
-        if "Terminal" in tab_indices:
-            with tabs[tab_indices["Terminal"]]:
-                st.header("Terminal Apps")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Configs", key="terminal_show"):
-                        term_plist = (
-                            Path.home() / "Library/Preferences/com.apple.Terminal.plist"
-                        )
-                        iterm_plist = (
-                            Path.home()
-                            / "Library/Preferences/com.googlecode.iterm2.plist"
-                        )
-                        for plist_file in [term_plist, iterm_plist]:
-                            if plist_file.exists():
-                                st.subheader(plist_file.name)
-                                try:
-                                    with open(plist_file, "rb") as f:
-                                        content = plistlib.load(f)
-                                    st.json(content)
-                                except Exception:
-                                    st.code(plist_file.read_text(errors="replace"))
-                with col2:
-                    if st.button("Backup Terminal Configs", key="terminal_backup"):
-                        files = self.backup_utils["Terminal"].backup()
-                        st.success("Terminal backup complete!")
-                        for f in files:
-                            st.code(f"Backup file: {f}")
-
-        # Cloud CLIs Tab
-        if "Cloud CLIs" in tab_indices:
-            with tabs[tab_indices["Cloud CLIs"]]:
-                st.header("Cloud CLI Tools")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Configs", key="cloudcli_show"):
-                        for label, path in [
-                            ("AWS", Path.home() / ".aws"),
-                            ("GCloud", Path.home() / ".config/gcloud"),
-                            ("Azure", Path.home() / ".azure"),
-                        ]:
-                            if path.exists():
-                                st.subheader(f"{label} Config")
-                                st.write(list(path.glob("**/*")))
-                with col2:
-                    if st.button("Backup Cloud Configs", key="cloudcli_backup"):
-                        files = self.backup_utils["Cloud CLIs"].backup()
-                        st.success("Cloud backup complete!")
-                        for f in files:
-                            st.code(f"Backup file: {f}")
-
-        # DuckDB Tab
-        if "DuckDB" in tab_indices:
-            with tabs[tab_indices["DuckDB"]]:
-                st.header("DuckDB")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Show Database Info", key="duckdb_show"):
-                        db = Path.home() / "duckdb.db"
-                        if db.exists():
-                            st.write(f"Database location: {db}")
-                            st.write(f"Size: {db.stat().st_size / 1024:.1f} KB")
-                with col2:
-                    if st.button("Backup DuckDB", key="duckdb_backup"):
-                        files = self.backup_utils["DuckDB"].backup()
-                        st.success("DuckDB backup complete!")
-                        for f in files:
-                            st.code(f"Backup file: {f}")
-
-        # Secrets Tab
-        if "Secrets" in tab_indices:
-            with tabs[tab_indices["Secrets"]]:
-                st.header("Secrets Audit")
-                if st.button("Scan for Secrets", key="secrets_show"):
-                    with st.spinner("Scanning for secret files..."):
-                        progress = st.progress(0)
-                        secrets = self.backup_utils["Secrets"].report_table(
-                            progress_callback=progress.progress
+        for tab_name, tab in zip(self.tabs_list, st.tabs(self.tabs_list)):
+            with tab:
+                draw = getattr(self, f"tab_{_slug(tab_name)}", None)
+                if draw is not None:
+                    draw()
+                else:
+                    self.generic_tab(tab_name)
+
+        # Last, so jobs submitted by this run start the polling
+        with st.sidebar:
+            polling = bool(self.jobs.active())
+            st.fragment(
+                self.jobs_panel, run_every=JOB_POLL_SECONDS if polling else None
+            )(polling=polling)
+
+    def generic_tab(self, tab_name):
+        """A tab for units declared only in the config: run or back them up."""
+        st.header(tab_name)
+        for spec in tab_units(self.registry, tab_name):
+            util = self.utils.get(spec.name)
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"Run {spec.name}", key=f"{spec.name}_run"):
+                    st.code("\n".join(resolve(spec.run)(self.ctx)))
+            with col2:
+                if hasattr(util, "backup") and st.button(
+                    f"Backup {spec.name}", key=f"{spec.name}_backup"
+                ):
+                    self.start_backup(spec.name)
+
+    def tab_dotfiles(self):
+        st.header("Dotfiles")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show Dotfiles", key="dotfiles_show"):
+                st.write(cached_dotfiles(self.utils["dotfiles"]))
+        with col2:
+            if st.button("Backup Dotfiles", key="dotfiles_backup"):
+                self.start_backup("dotfiles")
+
+    def tab_homebrew(self):
+        st.header("Homebrew")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show Packages", key="homebrew_show"):
+                packages = cached_brew_packages(self.utils["brew"])
+                st.subheader("Formulae")
+                st.code(packages["formulae"])
+                st.subheader("Casks")
+                st.code(packages["casks"])
+        with col2:
+            if st.button("Backup Brewfile", key="homebrew_backup"):
+                self.start_backup("brew")
+
+    def tab_ssh_keys(self):
+        st.header("SSH Keys")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show SSH Keys", key="sshkeys_show"):
+                st.write(cached_ssh(self.utils["ssh"])["keys"])
+        with col2:
+            if st.button("Show SSH Config", key="sshkeys_config"):
+                st.code(cached_ssh(self.utils["ssh"])["config"])
+
+    def tab_macos_info(self):
+        st.header("macOS Info")
+        if st.button("Show System Info", key="macosinfo_show"):
+            info = cached_macos_info(self.utils["macos"])
+            st.write({"Date": info["date"], "macOS Version": info["macos_version"]})
+            st.subheader("Installed Applications")
+            st.write(info["applications"])
+
+    def tab_vs_code(self):
+        st.header("VS Code")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show Extensions", key="vscode_ext_show"):
+                st.write(cached_vscode(self.utils["vscode"])["extensions"])
+        with col2:
+            if st.button("Show Settings", key="vscode_settings_show"):
+                st.code(cached_vscode(self.utils["vscode"])["settings"])
+
+    def tab_crontab(self):
+        st.header("Crontab")
+        if st.button("Show Crontab", key="crontab_show"):
+            st.code(cached_crontab(self.utils["crontab"]))
+
+    def tab_launchagents(self):
+        st.header("LaunchAgents")
+        if st.button("Show LaunchAgents", key="launchagents_show"):
+            st.write(cached_launch_agents(self.utils["launchagents"]))
+
+    def tab_python_tools(self):
+        st.header("Python Tools")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show uv Tools", key="uvtools_show"):
+                st.code(self.python_tools()["uv"])
+        with col2:
+            if st.button("Show pipx Tools", key="pipx_show"):
+                st.code(self.python_tools()["pipx"])
+
+    def tab_r(self):
+        st.header("R and RStudio")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show Configs", key="r_show"):
+                for name, text in read_texts(self.source_files("r")).items():
+                    st.subheader(name)
+                    st.code(text)
+        with col2:
+            if st.button("Backup R Configs", key="r_backup"):
+                self.start_backup("r")
+
+    def tab_git(self):
+        st.header("Git Configs")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show Configs", key="git_show"):
+                for name, text in read_texts(self.source_files("git")).items():
+                    st.subheader(name)
+                    st.code(text)
+        with col2:
+            if st.button("Backup Git Configs", key="git_backup"):
+                self.start_backup("git")
+
+    def tab_terminal(self):
+        st.header("Terminal Apps")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show Configs", key="terminal_show"):
+                for plist_file in self.source_files("terminal"):
+                    st.subheader(plist_file.name)
+                    try:
+                        content = cached_plist(
+                            str(plist_file), plist_file.stat().st_mtime_ns
                         )
-                    if not secrets:
-                        st.info("No .env or .secrets.toml files found")
-                    else:
-                        st.write("Secret files found:")
-                        st.dataframe(pd.DataFrame(secrets))
+                        st.json(content)
+                    except Exception:
+                        st.code(plist_file.read_text(errors="replace"))
+        with col2:
+            if st.button("Backup Terminal Configs", key="terminal_backup"):
+                self.start_backup("terminal")
 
+    def tab_cloud_clis(self):
+        st.header("Cloud CLI Tools")
+        col1, col2 = st.columns(2)
+        with col1:
+            show = st.toggle("Show Configs", key="cloudcli_show")
+        with col2:
+            if st.button("Backup Cloud Configs", key="cloudcli_backup"):
+                self.start_backup("cloud")
+        if show:
+            for label, path in self.cloud_config_dirs():
+                if path.exists():
+                    st.subheader(f"{label} Config")
+                    self.tree_browser(f"cloudcli_{_slug(label)}", path)
 
-if __name__ == "__main__":
+    def tree_browser(self, key, root):
+        """
+        Browse `root` one directory level at a time, `TREE_PAGE_SIZE`
+        entries per page. Sizes and file counts include everything below a
+        folder; they come from one cached walk of `root`.
+        """
+        current = Path(st.session_state.get(key, str(root)))
+        if current != root and root not in current.parents:
+            current = root
+        size, files = cached_dir_totals(str(root)).get(str(current), (0, 0))
+        st.caption(f"{current}: {files} files, {size / 1024:.1f} KB")
+        entries = cached_dir_level(str(current), str(root))
+        page = 1
+        if len(entries) > TREE_PAGE_SIZE:
+            pages = -(-len(entries) // TREE_PAGE_SIZE)
+            page = st.number_input(
+                f"Page (of {pages})", 1, pages, key=f"{key}_page_{current}"
+            )
+        shown, _ = paginate(entries, page, TREE_PAGE_SIZE)
+        if shown:
+            st.dataframe([e.row() for e in shown], hide_index=True)
+
+        folders = [".."] if current != root else []
+        folders += [e.name for e in entries if e.is_dir]
+        if folders:
+            col1, col2 = st.columns([3, 1])
+            folder = col1.selectbox(
+                "Folder", folders, key=f"{key}_folder", label_visibility="collapsed"
+            )
+            target = current.parent if folder == ".." else current / folder
+            col2.button(
+                "Open",
+                key=f"{key}_open",
+                on_click=st.session_state.update,
+                args=({key: str(target)},),
+            )
+
+    def tab_duckdb(self):
+        st.header("DuckDB")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Show Database Info", key="duckdb_show"):
+                db = self.utils["duckdb"].sources()[0]
+                if db.exists():
+                    st.write(f"Database location: {db}")
+                    st.write(f"Size: {db.stat().st_size / 1024:.1f} KB")
+        with col2:
+            if st.button("Backup DuckDB", key="duckdb_backup"):
+                self.start_backup("duckdb")
+
+    def tab_secrets(self):
+        st.header("Secrets Audit")
+        content = st.checkbox(
+            "Scan file contents",
+            key="secrets_content",
+            help="Also search inside text files for keys, tokens and passwords",
+        )
+        if st.button("Scan for Secrets", key="secrets_show"):
+            with st.spinner("Scanning for secrets..."):
+                progress = st.progress(0)
+                secrets = self.utils["secrets"].report_table(
+                    progress_callback=progress.progress,
+                    workers=self.config.get("secrets", "workers", default=None),
+                    content=content,
+                )
+            if not secrets:
+                st.info(
+                    "No secrets found"
+                    if content
+                    else "No .env or .secrets.toml files found"
+                )
+            else:
+                st.write("Secrets found:" if content else "Secret files found:")
+                st.dataframe(pd.DataFrame(secrets))
+            index = self.utils["secrets"].index
+            if not content and index is not None and (index.added or index.removed):
+                st.subheader("Changes since last scan")
+                st.write({"Added": index.added, "Removed": index.removed})
+
+
+@st.cache_resource
+def get_app():
+    """Build the config, logger sink and backup utilities once per server."""
     from local_machine.config import ProjectConfig
 
-    logger.add("backup.log", rotation="1 week")
+    add_sink("backup.log", rotation="1 week")
     config = ProjectConfig()
 
-    # Get tabs list from config, with fallback
-    tabs_list = config.get(
-        "ui",
-        "tabs",
-        default=[
-            "Dotfiles",
-            "Homebrew",
-            "SSH Keys",
-            "macOS Info",
-            "VS Code",
-            "Crontab",
-            "LaunchAgents",
-            "Python tools",
-            "R",
-            "Git",
-            "Terminal",
-            "Cloud CLIs",
-            "DuckDB",
-            "Secrets",
-        ],
-    )
-
-    app = MacBackupApp(config, tabs_list=tabs_list)
-    app.run()
+    # Get tabs list from config, falling back to the registry's tabs
+    tabs_list = config.get("ui", "tabs", default=None)
+    return MacBackupApp(config, tabs_list=tabs_list)
+
+
+if __name__ == "__main__":
+    get_app().run()
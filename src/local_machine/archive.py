@@ -0,0 +1,400 @@
+import io
+import lzma
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Tuple
+
+from local_machine.log import logger
+
+from local_machine import cancel, metrics
+from local_machine.fastcopy import hash_file, write_sidecar
+
+if TYPE_CHECKING:
+    from local_machine.filters import PathFilter
+
+CODECS = ("deflate", "store", "xz", "zstd")
+EXTENSIONS = {"deflate": ".zip", "store": ".zip", "xz": ".tar.xz", "zstd": ".tar.zst"}
+DEFAULT_LEVELS = {"deflate": 6, "store": 0, "xz": 6, "zstd": 10}
+
+READ_SIZE = 1024 * 1024
+# Members up to this size are compressed in memory, larger ones via a temp file
+SPOOL_SIZE = 4 * 1024 * 1024
+# Uncompressed tar bytes per independently compressed xz/zstd frame
+TAR_BLOCK_SIZE = 8 * 1024 * 1024
+SAMPLE_SIZE = 64 * 1024
+
+# Content that is already compressed (or is a database page file) is stored
+# as-is rather than burning CPU on recompressing it.
+COMPRESSED_SUFFIXES = frozenset(
+    {
+        ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar", ".lz4",
+        ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+        ".mp3", ".m4a", ".aac", ".mp4", ".mov", ".mkv", ".webm",
+        ".whl", ".jar", ".epub", ".docx", ".xlsx", ".pptx", ".parquet",
+        ".db", ".sqlite", ".sqlite3", ".duckdb",
+    }
+)  # fmt: skip
+MAGIC_PREFIXES = (
+    b"PK\x03\x04",  # zip and zip-based formats
+    b"\x1f\x8b",  # gzip
+    b"\xfd7zXZ\x00",  # xz
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"BZh",  # bzip2
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # jpeg
+    b"GIF8",
+    b"PAR1",  # parquet
+    b"SQLite format 3\x00",
+)
+
+
+def is_compressed(path: Path) -> bool:
+    """
+    Guess whether compressing `path` is a waste of CPU.
+
+    Checks the suffix, then magic bytes (including the DuckDB header), then
+    test-compresses a small sample.
+    """
+    if path.suffix.lower() in COMPRESSED_SUFFIXES:
+        return True
+    try:
+        with open(path, "rb") as f:
+            sample = f.read(SAMPLE_SIZE)
+    except OSError:
+        return False
+    if sample.startswith(MAGIC_PREFIXES) or sample[8:12] == b"DUCK":
+        return True
+    if len(sample) < 4096:
+        return False
+    return len(zlib.compress(sample, 1)) > 0.95 * len(sample)
+
+
+def _zstd_compress(level: int):
+    try:
+        import zstandard
+    except ImportError:
+        try:
+            from compression import zstd  # Python 3.14+
+        except ImportError:
+            raise ValueError(
+                "The zstd codec needs the 'zstandard' package (the 'zstd' extra) "
+                "or Python 3.14+"
+            ) from None
+        # Frame checksums let `verify` detect corruption without the sidecar
+        options = {
+            zstd.CompressionParameter.compression_level: level,
+            zstd.CompressionParameter.checksum_flag: 1,
+        }
+        return lambda data: zstd.compress(data, options=options)
+    compressor = zstandard.ZstdCompressor(level=level, write_checksum=True)
+    return lambda data: compressor.compress(data)
+
+
+def zstd_reader(fileobj):
+    """A readable stream decompressing every zstd frame of `fileobj`."""
+    try:
+        import zstandard
+    except ImportError:
+        try:
+            from compression import zstd  # Python 3.14+
+        except ImportError:
+            raise ValueError(
+                "Reading zstd needs the 'zstandard' package (the 'zstd' extra) "
+                "or Python 3.14+"
+            ) from None
+        return zstd.ZstdFile(fileobj)
+    # The writer emits one frame per TAR_BLOCK_SIZE block
+    return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True)
+
+
+def _counted(files: Iterable[Tuple[Path, str]]) -> Iterator[Tuple[Path, str]]:
+    for path, arcname in files:
+        cancel.checkpoint()
+        if not arcname.endswith("/"):
+            try:
+                metrics.record(bytes_read=path.stat().st_size, files=1)
+            except OSError:
+                pass
+        yield path, arcname
+
+
+def iter_dir_files(
+    src_dir: Path, path_filter: Optional["PathFilter"] = None
+) -> Iterator[Tuple[Path, str]]:
+    """
+    (path, archive name) for every regular file under `src_dir`, sorted, and
+    for every directory below it that holds none (its name ending in "/"),
+    so that extracting recreates empty directories. With a `path_filter`,
+    excluded directories are pruned from the walk.
+    """
+    src_dir = Path(src_dir)
+    if path_filter:
+        yield from path_filter.walk(src_dir, empty_dirs=True)
+        return
+    for root, dirs, files in os.walk(src_dir):
+        dirs.sort()
+        kept = False
+        for name in sorted(files):
+            path = Path(root) / name
+            if path.is_file() and not path.is_symlink():
+                kept = True
+                yield path, path.relative_to(src_dir).as_posix()
+        if not (kept or dirs) and Path(root) != src_dir:
+            yield Path(root), Path(root).relative_to(src_dir).as_posix() + "/"
+
+
+class _FrameWriter(io.RawIOBase):
+    """
+    Write-only file object that cuts the stream into blocks and compresses
+    them as independent frames on a thread pool, writing frames in order.
+
+    Concatenated xz streams and zstd frames are both valid single files, so
+    the result is readable by `tarfile`, `xz` and `zstd` as usual.
+    """
+
+    def __init__(self, fileobj, compress, pool, window):
+        self.fileobj = fileobj
+        self.compress = compress
+        self.pool = pool
+        self.window = window
+        self.buffer = bytearray()
+        self.pending = deque()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= TAR_BLOCK_SIZE:
+            block = bytes(self.buffer[:TAR_BLOCK_SIZE])
+            del self.buffer[:TAR_BLOCK_SIZE]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block):
+        self.pending.append(self.pool.submit(self.compress, block))
+        while len(self.pending) > self.window:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def close(self):
+        if not self.closed:
+            if self.buffer:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+        super().close()
+
+
+# zipfile has no public way to append an already-compressed member, so
+# `_write_precompressed` repeats what `ZipFile._open_to_write` and
+# `_ZipWriteFile.close` do on the CPython versions in this range (checked
+# against their source) and uses the private state below. Anywhere else
+# members are compressed on the writing thread through the public API.
+_ZIP_INTERNALS_VERSIONS = ((3, 11), (3, 13))
+_ZIP_INTERNALS = ("fp", "start_dir", "_writecheck", "_didModify", "_writing")
+
+
+def _can_write_precompressed(zf: zipfile.ZipFile) -> bool:
+    first, last = _ZIP_INTERNALS_VERSIONS
+    return (
+        sys.implementation.name == "cpython"
+        and first <= sys.version_info[:2] <= last
+        and all(hasattr(zf, name) for name in _ZIP_INTERNALS)
+    )
+
+
+def _write_precompressed(zf: zipfile.ZipFile, zinfo, crc, size, csize, data):
+    """
+    Append a member whose deflate stream, CRC and sizes were produced by a
+    worker, through ZipFile internals (see `_ZIP_INTERNALS_VERSIONS`).
+    """
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = csize
+    zip64 = size > zipfile.ZIP64_LIMIT or csize > zipfile.ZIP64_LIMIT
+    if zf._writing:
+        raise ValueError("Can't write to the ZIP file while a member is open")
+    zf.fp.seek(zf.start_dir)
+    zinfo.header_offset = zf.fp.tell()
+    zf._writecheck(zinfo)
+    zf._didModify = True
+    zf.fp.write(zinfo.FileHeader(zip64))
+    shutil.copyfileobj(data, zf.fp, READ_SIZE)
+    zf.start_dir = zf.fp.tell()
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+
+
+class ArchiveWriter:
+    """
+    Shared archive writer for the backup classes.
+
+    `deflate` (and `store`) produce a .zip whose members are compressed in
+    parallel, one member per worker (on the CPython versions
+    `_write_precompressed` supports); already-compressed members are stored.
+    `xz` and `zstd` produce a tar compressed in parallel frames. Files are
+    streamed from disk and only a bounded number of members or frames are in
+    flight at once, so memory stays flat regardless of directory size.
+    """
+
+    def __init__(
+        self,
+        codec: str = "deflate",
+        level: Optional[int] = None,
+        workers: Optional[int] = None,
+    ):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}; expected one of {CODECS}")
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+        self.workers = workers or os.cpu_count() or 1
+        if codec == "zstd":
+            _zstd_compress(self.level)  # fail early if unavailable
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.codec]
+
+    def write_dir(
+        self, dest_base: Path, src_dir: Path, path_filter: Optional["PathFilter"] = None
+    ) -> Path:
+        return self.write(dest_base, iter_dir_files(src_dir, path_filter))
+
+    def write(self, dest_base: Path, files: Iterable[Tuple[Path, str]]) -> Path:
+        """
+        Archive (path, archive name) pairs to `dest_base` + codec extension.
+
+        The archive is written to a temporary name and renamed into place, so
+        a failed run never leaves a truncated archive behind. Its SHA-256 is
+        recorded in a `.sha256` sidecar for `verify`.
+        """
+        dest = Path(str(dest_base) + self.extension)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+        try:
+            if self.codec in ("deflate", "store"):
+                self._write_zip(tmp, _counted(files))
+            else:
+                self._write_tar(tmp, _counted(files))
+            metrics.record(bytes_written=tmp.stat().st_size)
+            digest = hash_file(tmp)
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
+        write_sidecar(dest, digest)
+        logger.info(f"Archived to {dest} ({self.codec}, level {self.level})")
+        return dest
+
+    # -- zip ---------------------------------------------------------------
+
+    def _deflate(self, path: Path, tmp_dir: Path):
+        """
+        Raw-deflate one file, spooling large ones to a temp file in
+        `tmp_dir`; returns (crc, size, compressed size, data).
+        """
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        crc = size = 0
+        size_hint = path.stat().st_size
+        out = (
+            io.BytesIO()
+            if size_hint <= SPOOL_SIZE
+            else tempfile.TemporaryFile(dir=tmp_dir)
+        )
+        with open(path, "rb") as f:
+            while block := f.read(READ_SIZE):
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+                out.write(compressor.compress(block))
+        out.write(compressor.flush())
+        compressed = out.tell()
+        out.seek(0)
+        return crc, size, compressed, out
+
+    def _write_zip(self, dest: Path, files: Iterable[Tuple[Path, str]]) -> None:
+        window = self.workers * 2
+        pending = deque()
+        with (
+            zipfile.ZipFile(dest, "w", allowZip64=True, strict_timestamps=False) as zf,
+            ThreadPoolExecutor(max_workers=self.workers) as pool,
+        ):
+            parallel = _can_write_precompressed(zf)
+            if not parallel:
+                logger.debug(
+                    "Deflating serially: zipfile internals are not "
+                    f"known for Python {sys.version_info[0]}.{sys.version_info[1]}"
+                )
+
+            def drain(limit):
+                while len(pending) > limit:
+                    zinfo, path, store, future = pending.popleft()
+                    if zinfo.is_dir():
+                        zf.writestr(zinfo, b"")
+                    elif future is not None:
+                        crc, size, csize, data = future.result()
+                        with data:
+                            _write_precompressed(zf, zinfo, crc, size, csize, data)
+                    elif store:
+                        zinfo.compress_type = zipfile.ZIP_STORED
+                        with (
+                            open(path, "rb") as src,
+                            zf.open(zinfo, "w", force_zip64=True) as member,
+                        ):
+                            shutil.copyfileobj(src, member, READ_SIZE)
+                    else:
+                        zf.write(
+                            path,
+                            zinfo.filename,
+                            compress_type=zipfile.ZIP_DEFLATED,
+                            compresslevel=self.level,
+                        )
+
+            for path, arcname in files:
+                try:
+                    zinfo = zipfile.ZipInfo.from_file(
+                        path, arcname, strict_timestamps=False
+                    )
+                    store = (
+                        self.codec == "store" or zinfo.is_dir() or is_compressed(path)
+                    )
+                except OSError as e:
+                    logger.error(f"Skipping {path}: {e}")
+                    continue
+                future = (
+                    pool.submit(self._deflate, path, dest.parent)
+                    if parallel and not store
+                    else None
+                )
+                pending.append((zinfo, path, store, future))
+                drain(window)
+            drain(0)
+
+    # -- tar ---------------------------------------------------------------
+
+    def _write_tar(self, dest: Path, files: Iterable[Tuple[Path, str]]) -> None:
+        if self.codec == "xz":
+            preset = self.level
+            compress = lambda data: lzma.compress(data, preset=preset)  # noqa: E731
+        else:
+            compress = _zstd_compress(self.level)
+        with (
+            open(dest, "wb") as raw,
+            ThreadPoolExecutor(max_workers=self.workers) as pool,
+        ):
+            frames = _FrameWriter(raw, compress, pool, window=self.workers * 2)
+            with tarfile.open(fileobj=frames, mode="w|") as tar:
+                for path, arcname in files:
+                    try:
+                        tar.add(path, arcname=arcname, recursive=False)
+                    except OSError as e:
+                        logger.error(f"Skipping {path}: {e}")
+            frames.close()
@@ -0,0 +1,218 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Tuple
+
+from local_machine.log import logger
+
+from local_machine.results import failed
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAXSIZE = 128
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "local-machine" / "inventory"
+
+
+def signature(paths: Iterable[Path]) -> Tuple:
+    """Cheap change signal: the mtime of each path (None if it is missing)."""
+    sig = []
+    for p in paths:
+        try:
+            sig.append((str(p), os.stat(p).st_mtime_ns))
+        except OSError:
+            sig.append((str(p), None))
+    return tuple(sig)
+
+
+class InventoryCache:
+    """
+    TTL + LRU cache for slow tool listings, invalidated by path mtimes.
+
+    An entry is served while it is younger than its TTL and the mtimes of its
+    signal paths (e.g. the Homebrew Cellar) are unchanged. Entries are also
+    written to `cache_dir` as JSON so separate CLI invocations share them;
+    at most `maxsize` files are kept there too, the least recently used
+    going first. Failed results (see `local_machine.results`) are never
+    cached.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        ttl: float = DEFAULT_TTL,
+        cache_dir: Optional[Path] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key: Hashable) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return Path(self.cache_dir) / f"{digest}.json"
+
+    @staticmethod
+    def _name(key: Hashable) -> Optional[str]:
+        """The part of `key` that `invalidate` matches prefixes against."""
+        if isinstance(key, tuple) and key and isinstance(key[0], str):
+            return key[0]
+        return None
+
+    def _load(self, key: Hashable) -> Optional[tuple]:
+        path = self._disk_path(key)
+        if path is None:
+            return None
+        try:
+            data = json.loads(path.read_text())
+            # Mark it used, for pruning
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        sig = tuple(tuple(s) for s in data["signature"])
+        return data["expires"], sig, data["value"]
+
+    def _store(self, key: Hashable, entry: tuple) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        expires, sig, value = entry
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(
+                json.dumps(
+                    {
+                        "name": self._name(key),
+                        "expires": expires,
+                        "signature": sig,
+                        "value": value,
+                    }
+                )
+            )
+            os.replace(tmp, path)
+        except (OSError, TypeError) as e:
+            logger.debug(f"Not persisting cache entry {key}: {e}")
+            return
+        self._prune_disk()
+
+    def _disk_files(self) -> List[Path]:
+        try:
+            return list(Path(self.cache_dir).glob("*.json"))
+        except OSError:
+            return []
+
+    def _prune_disk(self) -> None:
+        """Delete the least recently used files beyond `maxsize`."""
+        files = self._disk_files()
+        if len(files) <= self.maxsize:
+            return
+
+        def last_used(path):
+            try:
+                return path.stat().st_mtime_ns
+            except OSError:
+                return 0
+
+        files.sort(key=last_used)
+        for path in files[: len(files) - self.maxsize]:
+            path.unlink(missing_ok=True)
+
+    def get(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        signals: Iterable[Path] = (),
+        ttl: Optional[float] = None,
+    ) -> Any:
+        sig = signature(signals)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+        if entry is not None:
+            expires, old_sig, value = entry
+            if expires > now and old_sig == sig:
+                with self._lock:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                logger.debug(f"Inventory cache hit: {key}")
+                return value
+        value = compute()
+        if failed(value):
+            return value
+        entry = (now + (self.ttl if ttl is None else ttl), sig, value)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        self._store(key, entry)
+        return value
+
+    def invalidate(self, prefix: Optional[str] = None) -> None:
+        """
+        Drop entries whose key starts with `prefix` (all entries if None), in
+        memory and on disk, including ones written by other processes.
+        """
+        with self._lock:
+            keys = [
+                k
+                for k in self._entries
+                if prefix is None or (self._name(k) or "").startswith(prefix)
+            ]
+            for k in keys:
+                del self._entries[k]
+        if self.cache_dir is None:
+            return
+        for path in self._disk_files():
+            if prefix is not None:
+                try:
+                    name = json.loads(path.read_text()).get("name")
+                except (OSError, ValueError, AttributeError):
+                    name = None
+                # Files without a name cannot be matched; drop them too
+                if name is not None and not name.startswith(prefix):
+                    continue
+            path.unlink(missing_ok=True)
+
+
+inventory_cache = InventoryCache(cache_dir=default_cache_dir())
+
+
+def cached_inventory(
+    *signals: Callable[[], Iterable[Path]],
+    ttl: Optional[float] = None,
+    cache: Optional[InventoryCache] = None,
+):
+    """
+    Cache a lister method in `inventory_cache` (or `cache`).
+
+    `signals` are callables returning the paths whose mtimes invalidate the
+    entry. The key is the method's qualified name plus its arguments, so all
+    instances of a lister share one entry.
+    """
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args):
+            key = (fn.__qualname__,) + args
+            paths = [p for signal in signals for p in signal()]
+            return (cache or inventory_cache).get(
+                key, lambda: fn(self, *args), paths, ttl
+            )
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,49 @@
+"""
+Cooperative cancellation of long-running work.
+
+A job (see `local_machine.jobs`) runs inside `cancellable(event)`; the
+archive, store, secrets, verify, restore and mirror loops and blocking tool
+calls call `checkpoint()`, which raises `Cancelled` once the event is set.
+The event lives in a context variable, so worker threads started with
+`metrics.submit` see it too. Outside a job `checkpoint()` does nothing.
+"""
+
+import contextlib
+import contextvars
+import threading
+from typing import Optional
+
+# How often a blocking wait (e.g. on a subprocess) checks for cancellation
+POLL_SECONDS = 0.2
+
+
+class Cancelled(Exception):
+    pass
+
+
+_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    "cancel_event", default=None
+)
+
+
+def current() -> Optional[threading.Event]:
+    return _event.get()
+
+
+def cancelled() -> bool:
+    event = _event.get()
+    return event is not None and event.is_set()
+
+
+def checkpoint() -> None:
+    if cancelled():
+        raise Cancelled()
+
+
+@contextlib.contextmanager
+def cancellable(event: threading.Event):
+    token = _event.set(event)
+    try:
+        yield event
+    finally:
+        _event.reset(token)
@@ -0,0 +1,384 @@
+"""
+The `local-machine` command line.
+
+Startup is kept cheap: argument parsing imports nothing from the backup
+modules, a unit's engines are loaded only when that unit runs, and only
+`--ui` touches Streamlit (in a separate `streamlit run` process).
+`--profile-startup` reruns a command under `python -X importtime` and reports
+its import cost against `STARTUP_BUDGET_MS`.
+"""
+
+import argparse
+import os
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+# Import time a quick command (e.g. `local-machine ssh`) may add on top of a
+# bare interpreter; override with $LOCAL_MACHINE_STARTUP_BUDGET_MS.
+STARTUP_BUDGET_MS = 75.0
+
+
+def load_units():
+    """The unit registry, with `[units]` overrides from the project config."""
+    from local_machine.registry import load_registry
+
+    try:
+        from local_machine.config import ProjectConfig
+
+        config = ProjectConfig()
+    except FileNotFoundError:
+        config = None
+    return load_registry(config)
+
+
+def build_parser(actions) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="local-machine", description="MacBook Configuration Backup Utility"
+    )
+    parser.add_argument("--ui", action="store_true", help="Run the Streamlit GUI app")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running, and re-run the selected units whenever their "
+        "sources change",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="--daemon: quiet time after the last change before a batch runs "
+        "(default: 2)",
+    )
+    parser.add_argument(
+        "--backup-dir", type=Path, default=Path.home() / "icloud/backup"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Do not write any files")
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="Write archives into the deduplicating chunk store under BACKUP_DIR/store",
+    )
+    parser.add_argument(
+        "--codec",
+        default="deflate",
+        help="Archive codec: deflate/store write .zip, xz/zstd write a compressed .tar",
+    )
+    parser.add_argument(
+        "--duckdb-export",
+        action="store_true",
+        help="Export ~/duckdb.db per table to Parquet instead of copying the file",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Back up every unit even if its sources are unchanged since the last run",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="Maximum number of units to run concurrently "
+        "(1 = serial, default: CPUs + 4)",
+    )
+    parser.add_argument(
+        "action",
+        nargs="*",
+        choices=[*actions, "all"],
+        default="all",
+        help="Units to run (default: all; verify only runs when named)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Processes used by the secrets scan and verify, threads used by "
+        "restore (default: serial scan, one per CPU otherwise)",
+    )
+    parser.add_argument(
+        "--scan-contents",
+        action="store_true",
+        help="secrets: also search inside text files for keys, tokens and "
+        "passwords, reporting each by line and detector",
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="secrets: re-list every directory instead of only those changed "
+        "since the last scan (rebuilds the index)",
+    )
+    parser.add_argument(
+        "--mirror-to",
+        type=Path,
+        default=None,
+        metavar="DIR",
+        help="After the backup, mirror BACKUP_DIR to DIR, sending only changed "
+        "blocks (adds the mirror action)",
+    )
+    parser.add_argument(
+        "--mirror-delete",
+        action="store_true",
+        help="mirror: delete files from DIR that are no longer in BACKUP_DIR",
+    )
+    parser.add_argument(
+        "--target",
+        type=Path,
+        default=None,
+        help="restore: directory to restore into (default: the home directory)",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="CATEGORY",
+        help="restore: only this category, e.g. dotfiles, cloud, brew or vscode "
+        "(repeatable)",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        metavar="GLOB",
+        help="restore: only files whose path relative to the target matches, "
+        "e.g. '.aws/*' (repeatable; installs then need --only)",
+    )
+    parser.add_argument(
+        "--install-jobs",
+        type=int,
+        default=None,
+        help="restore: maximum concurrent brew/code/uv/pipx installs (default: 4)",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", help="Log debug messages too"
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Run the command under `python -X importtime` and report its "
+        "import cost against the startup budget",
+    )
+    return parser
+
+
+def _print_result(result) -> None:
+    print(f"== {result.name} ({result.elapsed:.2f}s) ==")
+    if result.error:
+        print(f"Error: {result.error}")
+    for line in result.lines:
+        print(line)
+    print()
+
+
+def make_context(args, registry):
+    from local_machine.registry import unit_filters, unit_sources
+    from local_machine.units import RunContext
+
+    store = None
+    if args.store:
+        from local_machine.store import ChunkStore
+
+        store = ChunkStore(args.backup_dir / "store")
+    return RunContext(
+        backup_dir=args.backup_dir,
+        dry_run=args.dry_run,
+        store=store,
+        force=args.force,
+        workers=args.workers,
+        secrets_contents=args.scan_contents,
+        secrets_rescan=args.rescan,
+        codec=args.codec,
+        duckdb_mode="export" if args.duckdb_export else "copy",
+        restore_target=args.target,
+        restore_only=args.only,
+        restore_include=args.include,
+        install_jobs=args.install_jobs,
+        mirror_dest=args.mirror_to,
+        mirror_delete=args.mirror_delete,
+        filters=unit_filters(registry),
+        sources=unit_sources(registry),
+    )
+
+
+def run_batch(args, registry, names, ctx) -> None:
+    """Run the named units (then the mirror, if asked for) and report."""
+    from local_machine.metrics import write_report
+    from local_machine.registry import build_units, prepare, select
+    from local_machine.scheduler import format_summary, run_units
+
+    if args.mirror_to is not None:
+        names = [*names, "mirror"]
+    specs = select(registry, names)
+    prepare(ctx, specs)
+    results = run_units(
+        build_units(specs, ctx), jobs=args.jobs, on_result=_print_result
+    )
+    print(format_summary(results))
+    # Listing-only runs (e.g. `local-machine ssh`) leave the backup directory
+    # and the last backup's metrics alone
+    if not args.dry_run and any(s.outputs for s in specs):
+        report = write_report(
+            args.backup_dir, [r.metrics for r in results if r.metrics is not None]
+        )
+        print(f"\nRun report: {report}")
+
+
+def run_cli(args, registry) -> None:
+    names = [args.action] if isinstance(args.action, str) else args.action
+    run_batch(args, registry, names, make_context(args, registry))
+
+
+def run_daemon(args, registry) -> int:
+    """Back up continuously: re-run units as their sources change."""
+    from local_machine.daemon import Daemon
+    from local_machine.registry import select
+
+    names = [args.action] if isinstance(args.action, str) else args.action
+    # Only units that back something up; units with `daemon` off (the
+    # secrets scan) only when named
+    specs = [
+        s
+        for s in select(registry, names)
+        if s.sources and s.outputs and (s.daemon or s.name in names)
+    ]
+    if not specs:
+        print("None of the selected units has sources to watch.", file=sys.stderr)
+        return 1
+    ctx = make_context(args, registry)
+    ignore = [args.backup_dir] + ([args.mirror_to] if args.mirror_to else [])
+    options = {} if args.debounce is None else {"debounce": args.debounce}
+    daemon = Daemon(
+        specs,
+        partial(run_batch, args, registry, ctx=ctx),
+        ignore=ignore,
+        filters=ctx.filters,
+        **options,
+    )
+    daemon.run()
+    return 0
+
+
+def run_ui() -> int:
+    import subprocess
+
+    app_path = Path(__file__).with_name("app.py")
+    return subprocess.call([sys.executable, "-m", "streamlit", "run", str(app_path)])
+
+
+def _import_times(stderr: str):
+    """
+    Split `-X importtime` output into `{module: (self_us, cumulative_us)}` and
+    the rest of stderr (the command's own messages).
+    """
+    times, other = {}, []
+    for line in stderr.splitlines(keepends=True):
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times, "".join(other)
+
+
+def profile_startup(argv, top: int = 15) -> int:
+    """
+    Run `local-machine <argv>` under `-X importtime` and report, on stderr,
+    the import time it adds over a bare interpreter and the slowest modules.
+    Returns the command's exit status, or 1 if it succeeded over budget.
+    """
+    import subprocess
+
+    budget = float(os.environ.get("LOCAL_MACHINE_STARTUP_BUDGET_MS", STARTUP_BUDGET_MS))
+    bare = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "pass"],
+        capture_output=True,
+        text=True,
+    )
+    baseline, _ = _import_times(bare.stderr)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "local_machine.cli", *argv],
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    times, other = _import_times(proc.stderr)
+    sys.stderr.write(other)
+
+    own = {name: t for name, t in times.items() if name not in baseline}
+    total_ms = sum(self_us for self_us, _ in own.values()) / 1000
+    over = total_ms > budget
+    lines = [
+        f"Startup profile: local-machine {' '.join(argv)}",
+        f"  wall time  {wall_ms:8.1f} ms (under -X importtime)",
+        f"  imports    {total_ms:8.1f} ms over a bare interpreter, "
+        f"{len(own)} modules (budget {budget:g} ms: "
+        f"{'OVER BUDGET' if over else 'ok'})",
+        f"  {'self ms':>8}  {'cumul ms':>8}  module",
+    ]
+    slowest = sorted(own.items(), key=lambda item: item[1][0], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[:top]:
+        lines.append(f"  {self_us / 1000:>8.1f}  {cumulative_us / 1000:>8.1f}  {name}")
+    print("\n".join(lines), file=sys.stderr)
+    if proc.returncode:
+        return proc.returncode
+    return 1 if over else 0
+
+
+def main(argv=None) -> int:
+    from local_machine.log import configure
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # --profile-startup reruns the command and --ui hands over to Streamlit,
+    # so neither needs the unit registry or the project config
+    early = argparse.ArgumentParser(add_help=False)
+    early.add_argument("--ui", action="store_true")
+    early.add_argument("--profile-startup", action="store_true")
+    known, _ = early.parse_known_args(argv)
+    if known.profile_startup:
+        return profile_startup([a for a in argv if a != "--profile-startup"])
+    if known.ui:
+        return run_ui()
+
+    # Quiet until --verbose is known; the config below logs at DEBUG
+    configure("INFO")
+    registry = load_units()
+    parser = build_parser(registry)
+    args = parser.parse_args(argv)
+    if args.codec != "deflate":
+        from local_machine.archive import CODECS
+
+        if args.codec not in CODECS:
+            parser.error(
+                f"argument --codec: invalid choice: {args.codec!r} "
+                f"(choose from {', '.join(CODECS)})"
+            )
+
+    actions = [args.action] if isinstance(args.action, str) else args.action
+    if "restore" in actions and (
+        len(actions) > 1 or args.mirror_to is not None or args.daemon
+    ):
+        parser.error("restore cannot be combined with other actions")
+    if "mirror" in actions and args.mirror_to is None:
+        parser.error("the mirror action needs --mirror-to")
+    if args.only:
+        from local_machine.restore import CATEGORIES
+
+        unknown = [c for c in args.only if c not in CATEGORIES]
+        if unknown:
+            parser.error(
+                f"argument --only: invalid choice: {unknown[0]!r} "
+                f"(choose from {', '.join(CATEGORIES)})"
+            )
+
+    configure("DEBUG" if args.verbose else "INFO", "backup_main.log", rotation="1 week")
+    if args.daemon:
+        return run_daemon(args, registry)
+    run_cli(args, registry)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,56 @@
 from pathlib import Path
-from typing import Optional, List, Any, Dict, Union
+from typing import Optional, List, Any, Dict, Tuple, Union
+import hashlib
+import json
 import os
-import tomllib
-from loguru import logger
-from dotenv import load_dotenv, find_dotenv
+from local_machine.log import logger
+
+CACHE_VERSION = 2
+
+# A flattened key path, e.g. ("backup", "dir")
+KeyPath = Tuple[str, ...]
+
+
+def default_config_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "local-machine" / "config"
+
+
+def _stat_key(path: Path) -> Optional[List[int]]:
+    # A list, so it compares equal to its JSON round trip
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _cacheable(conf: dict) -> Optional[dict]:
+    """`conf` if it survives JSON; None if it holds TOML dates or times."""
+    try:
+        json.dumps(conf)
+    except (TypeError, ValueError):
+        return None
+    return conf
+
+
+def _flatten(conf: Any, prefix: KeyPath, out: Dict[KeyPath, Any]) -> None:
+    """Index `conf` and every nested table under its full key path."""
+    out[prefix] = conf
+    if isinstance(conf, dict):
+        for key, value in conf.items():
+            _flatten(value, prefix + (key,), out)
 
 
 class ProjectConfig:
     """
     Loads and manages configuration from TOML files and environment variables.
+
+    Every key path of every file is indexed once at load time, so `get` is a
+    dict lookup. Parsed files and the project root are cached on disk as
+    JSON (see `default_config_cache_dir`) and reused while each TOML file's
+    mtime and size, or failing that its SHA-256, are unchanged. Files with
+    date or time values, which JSON cannot hold, are parsed every time.
     """
 
     def __init__(
@@ -18,23 +60,45 @@ class ProjectConfig:
         project_root_marker: str = "pyproject.toml",
         start_dir: Optional[Union[str, Path]] = None,
         dotenv_file: str = ".env",
+        cache_dir: Optional[Union[str, Path]] = None,
+        use_cache: bool = True,
     ) -> None:
-        logger.info("Initialising ProjectConfig")
-        self.project_root: Path = self.find_project_root(
-            marker=project_root_marker, start_dir=start_dir
-        )
-        logger.info(f"Project root found: {self.project_root}")
+        logger.debug("Initialising ProjectConfig")
+        start = Path(start_dir).resolve() if start_dir else Path.cwd()
+        self._cache_path: Optional[Path] = None
+        if use_cache:
+            key = repr(
+                (CACHE_VERSION, str(start), project_root_marker, conf_dir, toml_files)
+            )
+            digest = hashlib.sha1(key.encode()).hexdigest()
+            self._cache_path = (
+                Path(cache_dir) if cache_dir else default_config_cache_dir()
+            ) / f"{digest}.json"
+        cached = self._read_cache()
 
-        self.conf_dir: Path = (self.project_root / conf_dir).resolve()
-        logger.info(f"Config directory set to: {self.conf_dir}")
+        root = cached.get("project_root")
+        if root is not None and (Path(root) / project_root_marker).exists():
+            self.project_root: Path = Path(root)
+        else:
+            self.project_root = self.find_project_root(
+                marker=project_root_marker, start_dir=start
+            )
+            cached = {}
+        logger.debug(f"Project root: {self.project_root}")
 
+        self.conf_dir: Path = (self.project_root / conf_dir).resolve()
         if toml_files is not None:
             self.toml_files: List[Path] = [self.conf_dir / Path(f) for f in toml_files]
+        elif cached.get("conf_dir_stat") == _stat_key(self.conf_dir):
+            # Adding or removing a file changes the directory's mtime
+            self.toml_files = [Path(f) for f in cached["toml_files"]]
         else:
-            self.toml_files: List[Path] = sorted(self.conf_dir.glob("*.toml"))
-        logger.info(f"TOML files to load: {[str(f) for f in self.toml_files]}")
+            self.toml_files = sorted(self.conf_dir.glob("*.toml"))
+        logger.debug(f"TOML files to load: {[str(f) for f in self.toml_files]}")
 
-        self.configs: Dict[str, dict] = self._load_all()
+        self.configs: Dict[str, dict] = self._load_all(cached.get("files", {}))
+        self._build_index()
+        self._write_cache(cached)
         self._load_dotenv(dotenv_file=dotenv_file)
 
     @staticmethod
@@ -44,61 +108,128 @@ class ProjectConfig:
         current = Path(start_dir).resolve() if start_dir else Path.cwd()
         logger.debug(f"Searching for project root from: {current}")
         while current != current.parent:
-            logger.debug(f"Checking for {marker} in {current}")
             if (current / marker).exists():
-                logger.success(f"Found project root at: {current}")
+                logger.debug(f"Found project root at: {current}")
                 return current
             current = current.parent
-        logger.error(f"Could not find project root (missing {marker})")
+        # Expected outside a source checkout (every installed use), so the
+        # caller decides whether it is an error
+        logger.debug(f"No project root above {start_dir or Path.cwd()} ({marker})")
         raise FileNotFoundError(f"Could not find project root (missing {marker})")
 
-    def _load_all(self) -> Dict[str, dict]:
+    def _read_cache(self) -> dict:
+        if self._cache_path is None:
+            return {}
+        try:
+            with open(self._cache_path, "rb") as fp:
+                cached = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable config cache {self._cache_path}: {e}")
+            return {}
+        return cached if isinstance(cached, dict) else {}
+
+    def _write_cache(self, cached: dict) -> None:
+        if self._cache_path is None:
+            return
+        data = {
+            "project_root": str(self.project_root),
+            "conf_dir_stat": _stat_key(self.conf_dir),
+            "toml_files": [str(f) for f in self.toml_files],
+            "files": self._file_state,
+        }
+        if data == cached:
+            return
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._cache_path.with_name(
+                f".{self._cache_path.name}.{os.getpid()}.tmp"
+            )
+            with open(tmp, "w") as fp:
+                json.dump(data, fp)
+            os.replace(tmp, self._cache_path)
+        except OSError as e:
+            logger.debug(f"Not persisting config cache: {e}")
+
+    def _load_all(self, cached_files: Dict[str, list]) -> Dict[str, dict]:
+        """
+        Parse each TOML file unless the cache holds it. A file whose stat
+        changed but whose content hash did not (e.g. touched, or checked out
+        again) is not re-parsed either.
+        """
         configs: Dict[str, dict] = {}
+        # str(path) -> [stat key, sha256, parsed dict or None]
+        self._file_state: Dict[str, list] = {}
+        parsed = 0
         for f in self.toml_files:
-            logger.info(f"Loading TOML config: {f}")
-            with open(f, "rb") as fp:
-                configs[f.stem] = tomllib.load(fp)
-        logger.success("All TOML configs loaded successfully")
+            stat = _stat_key(f)
+            entry = cached_files.get(str(f))
+            if entry is not None and entry[2] is None:
+                entry = None  # not cacheable, so never cached
+            if entry is not None and stat is not None and entry[0] == stat:
+                _, digest, conf = entry
+                stored = conf
+            else:
+                with open(f, "rb") as fp:
+                    data = fp.read()
+                digest = hashlib.sha256(data).hexdigest()
+                if entry is not None and entry[1] == digest:
+                    conf = stored = entry[2]
+                else:
+                    import tomllib
+
+                    logger.debug(f"Parsing TOML config: {f}")
+                    conf = tomllib.loads(data.decode())
+                    stored = _cacheable(conf)
+                    parsed += 1
+            configs[f.stem] = conf
+            self._file_state[str(f)] = [stat, digest, stored]
+        logger.debug(
+            f"Loaded {len(configs)} TOML configs ({parsed} parsed, "
+            f"{len(configs) - parsed} from cache)"
+        )
         return configs
 
+    def _build_index(self) -> None:
+        # Per-file indexes, plus a merged one where the first file (in load
+        # order) that defines a key path wins
+        self._file_index: Dict[str, Dict[KeyPath, Any]] = {}
+        self._index: Dict[KeyPath, Any] = {}
+        for name, conf in self.configs.items():
+            flat: Dict[KeyPath, Any] = {}
+            _flatten(conf, (), flat)
+            self._file_index[name] = flat
+            for path, value in flat.items():
+                self._index.setdefault(path, value)
+
     def _load_dotenv(self, dotenv_file: str) -> None:
-        env_path = find_dotenv(str(self.project_root / dotenv_file))
-        if env_path:
-            logger.info(f"Loading environment variables from {env_path}")
+        env_path = self.project_root / dotenv_file
+        if env_path.is_file():
+            from dotenv import load_dotenv
+
+            logger.debug(f"Loading environment variables from {env_path}")
             load_dotenv(env_path)
-            logger.success("Environment variables loaded from .env")
         else:
-            logger.warning(f"No .env file found at {self.project_root / dotenv_file}")
+            logger.debug(f"No .env file found at {env_path}")
 
     def get(self, *keys: str, file: Optional[str] = None, default: Any = None) -> Any:
-        logger.debug(
-            f"Getting config value: keys={keys}, file={file}, default={default}"
-        )
-        sources = [file] if file else self.configs.keys()
-        for src in sources:
-            conf = self.configs.get(src, {})
-            val = conf
-            for k in keys:
-                if isinstance(val, dict) and k in val:
-                    val = val[k]
-                else:
-                    val = None
-                    break
-            if val is not None:
-                logger.info(f"Found value for {keys} in {src}: {val}")
-                return val
-        logger.warning(f"Config value {keys} not found, returning default: {default}")
-        return default
+        index = self._file_index.get(file, {}) if file else self._index
+        val = index.get(keys)
+        if val is None:
+            logger.debug(f"Config value {keys} not found, returning default")
+            return default
+        logger.debug(f"Found config value for {keys}")
+        return val
 
     @staticmethod
     def get_env(key: str, default: Any = None) -> Optional[str]:
-        value = os.getenv(key, default)
-        if value is not None:
-            logger.info(f"Environment variable '{key}' found: {value}")
-        else:
-            logger.warning(
-                f"Environment variable '{key}' not found, using default: {default}"
-            )
+        # Never log the value: environment variables hold secrets
+        value = os.getenv(key)
+        if value is None:
+            logger.debug(f"Environment variable '{key}' not set, using default")
+            return default
+        logger.debug(f"Environment variable '{key}' found")
         return value
 
     def as_dict(self) -> Dict[str, dict]:
@@ -0,0 +1,234 @@
+"""
+Continuous backup: watch the units' sources and re-run only what changed.
+
+Every unit declares its `sources` in the registry. The daemon watches them
+with watchdog (FSEvents on macOS, inotify on Linux), maps each event to the
+units whose sources it touches (ignoring paths a unit's exclude rules leave
+out of its backup), and runs those units together once events
+have stopped arriving for `debounce` seconds, or at the latest `max_delay`
+seconds after the first one. Between batches nothing runs, and the units'
+own change detection keeps a batch to the work that is actually needed.
+"""
+
+import fnmatch
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from local_machine.log import logger
+
+if TYPE_CHECKING:
+    from local_machine.filters import PathFilter
+
+DEBOUNCE_SECONDS = 2.0
+MAX_DELAY_SECONDS = 30.0
+
+# Reading a source (which every backup does) must not trigger another run
+_WRITE_EVENTS = frozenset({"created", "modified", "deleted", "moved", "closed"})
+_GLOB_CHARS = frozenset("*?[")
+
+
+class _Source:
+    """
+    One registry source. A glob only matches entries directly in its
+    directory (e.g. `~/.*` is the dotfiles in the home directory, not
+    everything below it); a plain path matches itself and anything under it.
+    Paths the unit's `PathFilter` excludes (relative to the glob's directory
+    or the source directory) never match.
+    """
+
+    def __init__(
+        self, unit: str, path: str, path_filter: Optional["PathFilter"] = None
+    ):
+        self.unit = unit
+        self.path = path
+        self.glob = bool(_GLOB_CHARS & set(self.path))
+        self.parent, self.name = os.path.split(self.path)
+        self.path_filter = path_filter
+
+    def matches(self, path: str) -> bool:
+        if self.glob:
+            parent, name = os.path.split(path)
+            if parent != self.parent or not fnmatch.fnmatch(name, self.name):
+                return False
+            return not self._excluded(name)
+        if path == self.path:
+            return True
+        if not path.startswith(self.path + os.sep):
+            return False
+        return not self._excluded(os.path.relpath(path, self.path))
+
+    def _excluded(self, rel: str) -> bool:
+        if not self.path_filter:
+            return False
+        parts = rel.split(os.sep)
+        # An excluded directory excludes everything below it
+        for i in range(1, len(parts)):
+            if self.path_filter.excluded("/".join(parts[:i]), is_dir=True):
+                return True
+        return self.path_filter.excluded("/".join(parts))
+
+    def watch(self) -> Optional[Tuple[str, bool]]:
+        """(directory, recursive) to watch for this source, if it exists yet."""
+        if self.glob:
+            return (self.parent, False) if os.path.isdir(self.parent) else None
+        if os.path.isdir(self.path):
+            return self.path, True
+        # A file, or a directory that may be created later
+        parent = os.path.dirname(self.path)
+        return (parent, False) if os.path.isdir(parent) else None
+
+
+class Daemon:
+    """
+    Watch the sources of `specs` and call `run_batch(unit names)` for each
+    debounced batch of changes. Paths under `ignore` (the backup directory),
+    and paths excluded by a unit's entry in `filters`, never trigger a run.
+    """
+
+    def __init__(
+        self,
+        specs,
+        run_batch: Callable[[List[str]], None],
+        debounce: float = DEBOUNCE_SECONDS,
+        max_delay: float = MAX_DELAY_SECONDS,
+        ignore: Iterable[Path] = (),
+        filters: Optional[Dict[str, "PathFilter"]] = None,
+    ):
+        from local_machine.registry import expand_source
+
+        filters = filters or {}
+        self.sources = [
+            _Source(s.name, path, filters.get(s.name))
+            for s in specs
+            for path in map(expand_source, s.sources)
+            if path is not None
+        ]
+        self.order = [s.name for s in specs]
+        self.run_batch = run_batch
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.ignore = [os.path.normpath(os.path.expanduser(p)) for p in ignore]
+        self._pending: Set[str] = set()
+        self._first = self._last = 0.0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._observer = None
+        self._watched: Dict[str, bool] = {}
+
+    # -- events ------------------------------------------------------------
+
+    def affected(self, path: str) -> Set[str]:
+        path = os.path.normpath(path)
+        if any(path == p or path.startswith(p + os.sep) for p in self.ignore):
+            return set()
+        return {s.unit for s in self.sources if s.matches(path)}
+
+    def notify(self, *paths: str) -> None:
+        units = set()
+        for path in paths:
+            if path:
+                units |= self.affected(os.fsdecode(path))
+        if not units:
+            return
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first = now
+            self._pending |= units
+            self._last = now
+            self._cond.notify()
+
+    def dispatch(self, event) -> None:
+        """watchdog event handler entry point."""
+        if event.event_type in _WRITE_EVENTS:
+            self.notify(event.src_path, getattr(event, "dest_path", ""))
+
+    # -- watches -----------------------------------------------------------
+
+    def watches(self) -> Dict[str, bool]:
+        """Directories to watch, with recursive watches absorbing the rest."""
+        wanted: Dict[str, bool] = {}
+        for source in self.sources:
+            watch = source.watch()
+            if watch is not None:
+                path, recursive = watch
+                wanted[path] = wanted.get(path, False) or recursive
+        recursive_roots = [p for p, r in wanted.items() if r]
+        return {
+            path: recursive
+            for path, recursive in wanted.items()
+            if not any(
+                path != root and path.startswith(root + os.sep)
+                for root in recursive_roots
+            )
+        }
+
+    def refresh_watches(self) -> None:
+        """Watch sources that have appeared since the last refresh."""
+        for path, recursive in self.watches().items():
+            if self._watched.get(path) is None or (
+                recursive and not self._watched[path]
+            ):
+                try:
+                    self._observer.schedule(self, path, recursive=recursive)
+                except OSError as e:
+                    logger.warning(f"Cannot watch {path}: {e}")
+                    continue
+                self._watched[path] = recursive
+                logger.debug(f"Watching {path}{' recursively' if recursive else ''}")
+
+    # -- main loop ---------------------------------------------------------
+
+    def _next_batch(self) -> Optional[List[str]]:
+        """Block until a batch is due (or the daemon stops)."""
+        with self._cond:
+            while not self._stop.is_set():
+                if self._pending:
+                    now = time.monotonic()
+                    due = min(self._last + self.debounce, self._first + self.max_delay)
+                    if now >= due:
+                        batch = [u for u in self.order if u in self._pending]
+                        self._pending.clear()
+                        return batch
+                    self._cond.wait(due - now)
+                else:
+                    self._cond.wait(1.0)
+        return None
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+
+    def run(self, initial: bool = True) -> None:
+        """
+        Watch until `stop` (or Ctrl-C). With `initial`, all units run once
+        first so the backup starts out current.
+        """
+        from watchdog.observers import Observer
+
+        self._observer = Observer()
+        self.refresh_watches()
+        self._observer.start()
+        logger.info(
+            f"Watching {len(self._watched)} directories for "
+            f"{len(self.order)} units (debounce {self.debounce:g}s)"
+        )
+        try:
+            if initial:
+                self.run_batch(list(self.order))
+            while (batch := self._next_batch()) is not None:
+                logger.info(f"Changes detected, running: {', '.join(batch)}")
+                try:
+                    self.run_batch(batch)
+                except Exception as e:
+                    logger.error(f"Batch {batch} failed: {e}")
+                self.refresh_watches()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._observer.stop()
+            self._observer.join()
@@ -0,0 +1,201 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from local_machine.log import logger
+
+from local_machine import metrics
+from local_machine.fastcopy import hash_file, sidecar_path, write_sidecar
+
+STATE_FILE = "export_state.json"
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _file_name(schema: str, table: str) -> str:
+    # IMPORT DATABASE looks for data files directly in the export directory
+    return re.sub(r"[^\w.-]", "_", f"{schema}.{table}") + ".parquet"
+
+
+def _checkpoint(db: Path) -> None:
+    """Fold the WAL into the database file, if no other process holds it."""
+    import duckdb
+
+    try:
+        con = duckdb.connect(str(db))
+    except duckdb.Error as e:
+        logger.info(f"Not checkpointing {db} (in use?): {e}")
+        return
+    try:
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+
+
+def _db_stat(db: Path) -> List[Optional[List[int]]]:
+    """(size, mtime_ns) of the database file and its WAL (None if absent)."""
+    stats = []
+    for path in (db, Path(str(db) + ".wal")):
+        try:
+            st = os.stat(path)
+        except OSError:
+            stats.append(None)
+            continue
+        stats.append([st.st_size, st.st_mtime_ns])
+    return stats
+
+
+def _schema_sql(con) -> str:
+    """DDL for schemas, sequences, tables, views and indexes, in that order."""
+    schemas = con.execute(
+        "SELECT schema_name FROM duckdb_schemas() "
+        "WHERE NOT internal AND database_name = current_database()"
+    ).fetchall()
+    statements = [f"CREATE SCHEMA {_quote(s)};" for (s,) in schemas]
+    for function in ("sequences", "tables", "views", "indexes"):
+        rows = con.execute(
+            f"SELECT sql FROM duckdb_{function}() "
+            "WHERE database_name = current_database() AND sql IS NOT NULL"
+            + ("" if function == "indexes" else " AND NOT temporary")
+            + (" AND NOT internal" if function == "views" else "")
+        ).fetchall()
+        statements.extend(sql.rstrip().rstrip(";") + ";" for (sql,) in rows)
+    return "\n".join(statements) + "\n"
+
+
+def export_database(
+    db: Path,
+    dest_dir: Path,
+    workers: Optional[int] = None,
+    compression: str = "zstd",
+) -> List[Path]:
+    """
+    Export every table of the DuckDB database `db` to Parquet in `dest_dir`.
+
+    The database is checkpointed (when nobody else has it open) and then read
+    through a single read-only connection, so all tables come from the same
+    state. Tables are exported in parallel, one cursor per worker. A table is
+    only rewritten when its fingerprint (schema, row count, and the sum and
+    XOR of its row hashes) differs from the previous export. If the database
+    file and its WAL have the size and mtime the last export left them with,
+    nothing is opened or scanned at all. `schema.sql` and `load.sql` are
+    written so the directory can be restored with `IMPORT DATABASE`.
+    """
+    import duckdb
+
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    state_path = dest_dir / STATE_FILE
+    try:
+        state = json.loads(state_path.read_text())
+    except (OSError, ValueError):
+        state = {}
+    previous = state.get("tables", {})
+    exported = [dest_dir / name for name in state.get("files", [])]
+    if (
+        state.get("database") == _db_stat(db)
+        and (dest_dir / "load.sql").exists()
+        and all(path.exists() for path in exported)
+    ):
+        logger.info(f"DuckDB database {db} unchanged since the last export")
+        return exported
+
+    _checkpoint(db)
+    # After the checkpoint, which may itself rewrite the file
+    db_stat = _db_stat(db)
+    con = duckdb.connect(str(db), read_only=True)
+    try:
+        tables = con.execute(
+            "SELECT schema_name, table_name, sql FROM duckdb_tables() "
+            "WHERE NOT temporary AND database_name = current_database() "
+            "ORDER BY schema_name, table_name"
+        ).fetchall()
+
+        def export(table):
+            schema, name, create_sql = table
+            cur = con.cursor()
+            try:
+                qualified = f"{_quote(schema)}.{_quote(name)}"
+                # The XOR alone cancels out pairs of identical rows; the
+                # (HUGEINT, so never overflowing) sum does not
+                rows, xor, total = cur.execute(
+                    f"SELECT count(*), bit_xor(hash(t)), sum(hash(t)) "
+                    f"FROM {qualified} t"
+                ).fetchone()
+                fingerprint = [create_sql, rows, str(xor), str(total)]
+                file_name = _file_name(schema, name)
+                dest = dest_dir / file_name
+                key = f"{schema}.{name}"
+                if previous.get(key) == fingerprint and dest.exists():
+                    logger.debug(f"DuckDB table {key} unchanged, skipping")
+                    return key, fingerprint, dest, False
+                tmp = dest_dir / f".{file_name}.tmp"
+                literal = str(tmp).replace("'", "''")
+                cur.execute(
+                    f"COPY {qualified} TO '{literal}' "
+                    f"(FORMAT parquet, COMPRESSION {compression})"
+                )
+                os.replace(tmp, dest)
+                write_sidecar(dest, hash_file(dest))
+                metrics.record(bytes_written=dest.stat().st_size, files=1)
+                logger.info(f"Exported DuckDB table {key} ({rows} rows) to {dest}")
+                return key, fingerprint, dest, True
+            finally:
+                cur.close()
+
+        with ThreadPoolExecutor(
+            max_workers=workers or min(4, max(1, len(tables)))
+        ) as pool:
+            futures = [metrics.submit(pool, export, table) for table in tables]
+            results = [future.result() for future in futures]
+
+        (dest_dir / "schema.sql").write_text(_schema_sql(con))
+    finally:
+        con.close()
+
+    load = [
+        f"COPY {_quote(schema)}.{_quote(name)} FROM "
+        f"'{_file_name(schema, name)}' (FORMAT parquet);"
+        for schema, name, _ in tables
+    ]
+    (dest_dir / "load.sql").write_text("\n".join(load) + "\n")
+
+    current = {dest.name for _, _, dest, _ in results}
+    for stale in dest_dir.glob("*.parquet"):
+        if stale.name not in current:
+            stale.unlink()
+            sidecar_path(stale).unlink(missing_ok=True)
+    state = {
+        "database": db_stat,
+        "tables": {key: fingerprint for key, fingerprint, _, _ in results},
+        "files": [dest.name for _, _, dest, _ in results],
+    }
+    tmp = state_path.with_name(f".{STATE_FILE}.tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, state_path)
+
+    changed = sum(1 for *_, written in results if written)
+    logger.info(f"DuckDB export of {db}: {changed} of {len(results)} tables rewritten")
+    return [dest for _, _, dest, _ in results]
+
+
+def import_database(export_dir: Path, db: Path) -> Path:
+    """Recreate the database `db` from a directory written by `export_database`."""
+    import duckdb
+
+    db = Path(db)
+    db.parent.mkdir(parents=True, exist_ok=True)
+    literal = str(export_dir).replace("'", "''")
+    con = duckdb.connect(str(db))
+    try:
+        con.execute(f"IMPORT DATABASE '{literal}'")
+    finally:
+        con.close()
+    metrics.record(bytes_written=db.stat().st_size, files=1)
+    logger.info(f"Imported DuckDB export {export_dir} into {db}")
+    return db
@@ -0,0 +1,214 @@
+import errno
+import functools
+import hashlib
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from local_machine.log import logger
+
+from local_machine import metrics
+
+BUFFER_SIZE = 8 * 1024 * 1024
+# Largest count passed to one copy_file_range/sendfile call
+KERNEL_CHUNK = 1024 * 1024 * 1024
+SIDECAR_SUFFIX = ".sha256"
+FICLONE = 0x40049409  # Linux ioctl: reflink the whole file (btrfs, XFS, ...)
+
+# Errors meaning "this mechanism is not available here", not "the copy failed"
+_UNSUPPORTED = {
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.EPERM,
+}
+
+
+@dataclass
+class CopyResult:
+    path: Path
+    size: int
+    sha256: Optional[str]
+    method: str  # "skipped", "clone", "copy_file_range", "sendfile" or "chunked"
+
+
+def sidecar_path(path: Path) -> Path:
+    return Path(str(path) + SIDECAR_SUFFIX)
+
+
+def read_sidecar(path: Path) -> Optional[str]:
+    """The hex digest recorded next to `path`, or None."""
+    try:
+        return sidecar_path(path).read_text().split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def write_sidecar(path: Path, digest: str) -> None:
+    # Same format as `shasum -a 256`, so `shasum -c` can check it too
+    sidecar_path(path).write_text(f"{digest}  {Path(path).name}\n")
+
+
+def hash_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _clonefile():
+    """libc `clonefile` on macOS, else None; ctypes is loaded on first copy."""
+    if sys.platform != "darwin":
+        return None
+    import ctypes
+    import ctypes.util
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if not hasattr(libc, "clonefile"):
+        return None
+    clonefile = libc.clonefile
+    clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32]
+    return clonefile
+
+
+def _clone(src: Path, tmp: Path) -> bool:
+    """Copy-on-write clone of `src` to `tmp` (APFS clonefile or Linux FICLONE)."""
+    clonefile = _clonefile()
+    if clonefile is not None:
+        if clonefile(os.fsencode(src), os.fsencode(tmp), 0) == 0:
+            return True
+        import ctypes
+
+        err = ctypes.get_errno()
+        if err not in _UNSUPPORTED:
+            raise OSError(err, os.strerror(err), str(src))
+        return False
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    tmp.unlink(missing_ok=True)
+    return False
+
+
+def _kernel_copy(fsrc, fdst, size: int, method: str) -> bool:
+    """Copy with copy_file_range or sendfile; False if unsupported here."""
+    src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+    offset = 0
+    while offset < size:
+        count = min(KERNEL_CHUNK, size - offset)
+        try:
+            if method == "copy_file_range":
+                sent = os.copy_file_range(src_fd, dst_fd, count)
+            else:
+                sent = os.sendfile(dst_fd, src_fd, offset, count)
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED:
+                return False
+            raise
+        if sent == 0:
+            break
+        offset += sent
+    _check_size(fsrc, offset, size)
+    return True
+
+
+def _chunked_copy(fsrc, fdst, size: int, digest) -> None:
+    buf = bytearray(BUFFER_SIZE)
+    view = memoryview(buf)
+    copied = 0
+    while n := fsrc.readinto(buf):
+        digest.update(view[:n])
+        fdst.write(view[:n])
+        copied += n
+    _check_size(fsrc, copied, size)
+
+
+def _check_size(fsrc, copied: int, size: int) -> None:
+    # The source was truncated or grew while it was copied
+    if copied != size:
+        raise OSError(
+            errno.EIO, f"copied {copied} of {size} bytes, file changed", fsrc.name
+        )
+
+
+def _copy_data(src: Path, tmp: Path, size: int, digest, verify: bool) -> str:
+    """
+    Copy `src` to `tmp` with the fastest mechanism available; return its name.
+
+    With `verify` the data is copied through `digest` (the kernel-side copies
+    never pass through userspace, and hashing the result afterwards would read
+    it a second time); a clone is not hashed here.
+    """
+    if _clone(src, tmp):
+        return "clone"
+    with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+        if sys.platform.startswith("linux") and size and not verify:
+            for method in ("copy_file_range", "sendfile"):
+                if hasattr(os, method) and _kernel_copy(fsrc, fdst, size, method):
+                    return method
+        _chunked_copy(fsrc, fdst, size, digest)
+    return "chunked"
+
+
+def copy_file(src: Path, dest: Path, verify: bool = True) -> CopyResult:
+    """
+    Copy `src` to `dest` atomically, preserving mode and timestamps.
+
+    Uses a copy-on-write clone where the filesystem supports it, then
+    `copy_file_range`/`sendfile`, then a large-buffer copy; a copy that does
+    not end up `src`'s size raises OSError. The copy is written to a
+    temporary file and renamed into place. With `verify`, the SHA-256 of the
+    data is computed while it is copied (so the kernel-side copies are not
+    used) and recorded in a `<dest>.sha256` sidecar, and the copy is skipped
+    when `dest` already has the same size and mtime and its recorded hash is
+    that of `src`. Without it, the same size and mtime are enough.
+    """
+    src, dest = Path(src), Path(dest)
+    if dest.is_dir():
+        dest = dest / src.name
+    st = os.stat(src)
+    try:
+        dst = os.stat(dest)
+        same = dst.st_size == st.st_size and dst.st_mtime_ns == st.st_mtime_ns
+    except OSError:
+        same = False
+    recorded = read_sidecar(dest) if same and verify else None
+    if same and (not verify or recorded and hash_file(src) == recorded):
+        logger.debug(f"{dest} is up to date, not copying")
+        metrics.record(bytes_read=st.st_size if verify else 0, files=1)
+        return CopyResult(dest, st.st_size, recorded, "skipped")
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+    digest = hashlib.sha256()
+    try:
+        method = _copy_data(src, tmp, st.st_size, digest, verify)
+        os.chmod(tmp, st.st_mode & 0o7777)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        sha = None
+        if verify:
+            # A clone shares its blocks with `src`; reading it is the only read
+            sha = hash_file(tmp) if method == "clone" else digest.hexdigest()
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+    if sha is not None:
+        write_sidecar(dest, sha)
+    else:
+        sidecar_path(dest).unlink(missing_ok=True)
+    logger.debug(f"Copied {src} to {dest} ({method}, {st.st_size} bytes)")
+    metrics.record(bytes_read=st.st_size, bytes_written=st.st_size, files=1)
+    return CopyResult(dest, st.st_size, sha, method)
@@ -0,0 +1,207 @@
+"""
+Include/exclude rules for the directories a unit archives.
+
+Rules are gitignore-style patterns, relative to the archived directory:
+
+    logs/            a directory named `logs` anywhere, and everything in it
+    *.pyc            files (or directories) matching the glob at any depth
+    /cache           only `cache` directly in the archived directory
+    sso/cache/       a path: anchored, like any pattern containing a "/"
+    **/tmp/**        `**` spans any number of directories
+    !config.json     re-include something an earlier rule excluded
+
+The last matching rule wins, as in git. All of a unit's rules are compiled
+into one regular expression, tried in reverse order, so matching a path is
+a single `fullmatch`. Excluded directories are pruned by `PathFilter.walk`
+and never descended into, so (as in git) nothing below them can be
+re-included. `include` patterns, if any, keep only the files that match one
+of them (or lie in a directory that does), and `max_file_size` skips files
+over that size.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from local_machine.log import logger
+
+_SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "K": 1024,
+    "KB": 1024,
+    "M": 1024**2,
+    "MB": 1024**2,
+    "G": 1024**3,
+    "GB": 1024**3,
+}
+
+
+def parse_size(value: Union[int, str, None]) -> Optional[int]:
+    """Bytes for a size given as a number or a string such as "10MB"."""
+    if value is None or isinstance(value, int):
+        return value
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*", str(value), re.IGNORECASE)
+    if m is None:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(m[1]) * _SIZE_UNITS[m[2].upper()])
+
+
+def _rules(patterns: Iterable[str]) -> List[str]:
+    return [p.strip() for p in patterns if p.strip() and not p.startswith("#")]
+
+
+def translate(pattern: str) -> Tuple[str, bool]:
+    """A regex for one gitignore-style pattern, and whether it only matches directories."""
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[" and (end := pattern.find("]", i + 2)) != -1:
+            body = pattern[i + 1 : end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+            continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    regex = "".join(out)
+    return (regex if anchored else "(?:.*/)?" + regex), dir_only
+
+
+class PathFilter:
+    def __init__(
+        self,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        max_file_size: Union[int, str, None] = None,
+    ):
+        self.include = _rules(include)
+        self.exclude = _rules(exclude)
+        self.max_file_size = parse_size(max_file_size)
+
+        # One named group per exclude rule, the last rule first, so the
+        # group that matches is the rule that decides
+        file_groups, dir_groups = [], []
+        self._negated = {}
+        for k in reversed(range(len(self.exclude))):
+            rule = self.exclude[k]
+            negated = rule.startswith("!")
+            regex, dir_only = translate(rule[1:] if negated else rule)
+            group = f"(?P<r{k}>{regex})"
+            self._negated[f"r{k}"] = negated
+            dir_groups.append(group)
+            if not dir_only:
+                file_groups.append(group)
+        self._files = re.compile("|".join(file_groups)) if file_groups else None
+        self._dirs = re.compile("|".join(dir_groups)) if dir_groups else None
+        self._include = (
+            re.compile("|".join(f"(?:{translate(p)[0]})(?:/.*)?" for p in self.include))
+            if self.include
+            else None
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude or self.max_file_size is not None)
+
+    def __repr__(self) -> str:
+        return (
+            f"PathFilter(include={self.include}, exclude={self.exclude}, "
+            f"max_file_size={self.max_file_size})"
+        )
+
+    def excluded(self, rel: str, is_dir: bool = False) -> bool:
+        """Whether the exclude rules drop `rel` (a "/"-separated relative path)."""
+        regex = self._dirs if is_dir else self._files
+        if regex is None:
+            return False
+        m = regex.fullmatch(rel)
+        return m is not None and not self._negated[m.lastgroup]
+
+    def wants(self, rel: str, size: int = 0) -> bool:
+        """Whether a file at `rel` of `size` bytes is kept."""
+        if self.excluded(rel):
+            return False
+        if self._include is not None and self._include.fullmatch(rel) is None:
+            return False
+        if self.max_file_size is not None and size > self.max_file_size:
+            logger.debug(
+                f"Skipping {rel}: {size} bytes is over the "
+                f"{self.max_file_size} byte limit"
+            )
+            return False
+        return True
+
+    def scan(
+        self, root: Union[str, Path], empty_dirs: bool = False
+    ) -> Iterator[Tuple[os.DirEntry, str]]:
+        """
+        (entry, relative path) of every kept regular file under `root`,
+        sorted by path. Excluded directories are not descended into and
+        symlinks are not followed. With `empty_dirs`, a directory below
+        `root` that holds nothing kept is yielded too, its relative path
+        ending in "/", so an archive can recreate it.
+        """
+        stack = [(os.fspath(root), "", None)]
+        pruned = 0
+        while stack:
+            path, prefix, dir_entry = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                logger.debug(f"Cannot scan {path}: {e}")
+                continue
+            subdirs = []
+            kept = False
+            for entry in entries:
+                rel = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.excluded(rel, is_dir=True):
+                            pruned += 1
+                        else:
+                            subdirs.append((entry.path, rel + "/", entry))
+                    elif entry.is_file(follow_symlinks=False) and self.wants(
+                        rel, entry.stat(follow_symlinks=False).st_size
+                    ):
+                        kept = True
+                        yield entry, rel
+                except OSError:
+                    continue
+            if empty_dirs and dir_entry and not (kept or subdirs):
+                if self._include is None or self._include.fullmatch(prefix[:-1]):
+                    yield dir_entry, prefix
+            stack.extend(reversed(subdirs))
+        if pruned:
+            logger.debug(f"Pruned {pruned} excluded directories under {root}")
+
+    def walk(
+        self, root: Union[str, Path], empty_dirs: bool = False
+    ) -> Iterator[Tuple[Path, str]]:
+        """(path, archive name) pairs for `scan`, as archives and the store take them."""
+        for entry, rel in self.scan(root, empty_dirs):
+            yield Path(entry.path), rel
@@ -0,0 +1,183 @@
+"""
+Background jobs for the Streamlit app.
+
+A `JobManager` runs backups on a small thread pool so the script thread is
+never blocked. It outlives reruns (the app holds it in a cached resource),
+so a rerun sees the jobs an earlier run started. Each job is measured like a
+CLI unit: its live `UnitMetrics` counters (bytes and files processed so far)
+are the job's progress. Submitting a key that is already queued or running
+returns the existing job instead of starting a second one, and a job can be
+cancelled at its next `cancel.checkpoint()`.
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from local_machine.log import logger
+
+from local_machine.cancel import Cancelled, cancellable
+from local_machine.metrics import UnitMetrics, measure
+from local_machine.results import Failure, failed
+
+DEFAULT_WORKERS = 4
+# Finished jobs kept for display; older ones are dropped
+DEFAULT_KEEP = 50
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = (
+    "queued",
+    "running",
+    "done",
+    "failed",
+    "cancelled",
+)
+FINISHED = frozenset({DONE, FAILED, CANCELLED})
+
+
+def _failure_text(result: Any) -> str:
+    """The `Failure` strings inside a failed result, joined for display."""
+    if isinstance(result, Failure):
+        return result
+    if isinstance(result, dict):
+        result = list(result.values())
+    return "; ".join(_failure_text(item) for item in result if failed(item))
+
+
+@dataclass
+class Job:
+    id: int
+    key: str
+    label: str
+    status: str = QUEUED
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Any = None
+    error: str = ""
+    metrics: Optional[UnitMetrics] = None
+    cancel_event: threading.Event = field(
+        default_factory=threading.Event, repr=False, compare=False
+    )
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def progress(self) -> dict:
+        """A snapshot of the job for display."""
+        m = self.metrics
+        return {
+            "job": self.label,
+            "status": self.status,
+            "files": m.files if m else 0,
+            "bytes_read": m.bytes_read if m else 0,
+            "bytes_written": m.bytes_written if m else 0,
+            "elapsed_s": round(self.elapsed, 1),
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, keep: int = DEFAULT_KEEP):
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="backup-job"
+        )
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Job] = {}
+        # key -> the queued or running job for it
+        self._active: Dict[str, Job] = {}
+        self._futures: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self, key: str, fn: Callable[..., Any], *args, label: Optional[str] = None
+    ) -> Job:
+        """
+        Run `fn(*args)` in the background as job `key`, or return the job
+        already queued or running for `key`.
+        """
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                logger.debug(f"Job {key} already {job.status}, not resubmitting")
+                return job
+            job = Job(next(self._ids), key, label or key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._futures[job.id] = self._pool.submit(self._run, job, fn, args)
+            self._prune()
+        logger.info(f"Queued job {job.id}: {job.label}")
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args) -> None:
+        with self._lock:
+            if job.cancel_event.is_set():
+                self._finish(job, CANCELLED)
+                return
+            job.status = RUNNING
+            job.started = time.time()
+        status = DONE
+        try:
+            with cancellable(job.cancel_event), measure(job.key) as job.metrics:
+                job.result = fn(*args)
+            # Backups return expected failures (see local_machine.results)
+            if failed(job.result):
+                status, job.error = FAILED, _failure_text(job.result)
+                job.metrics.ok = False
+        except Cancelled:
+            status = CANCELLED
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.label}) failed")
+            status, job.error = FAILED, str(e)
+        with self._lock:
+            self._finish(job, status)
+        logger.info(f"Job {job.id} ({job.label}) {status} in {job.elapsed:.1f}s")
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished = time.time()
+        self._futures.pop(job.id, None)
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.done]
+        for job in finished[: max(len(finished) - self.keep, 0)]:
+            del self._jobs[job.id]
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a job: a queued job never starts, a running one stops at its
+        next checkpoint. Returns False if the job has already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.cancel_event.set()
+            future = self._futures.get(job_id)
+            if job.status == QUEUED and future is not None and future.cancel():
+                self._finish(job, CANCELLED)
+        logger.info(f"Cancelling job {job_id} ({job.label})")
+        return True
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        """All kept jobs, newest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.id, reverse=True)
+
+    def active(self) -> List[Job]:
+        with self._lock:
+            return list(self._active.values())
@@ -0,0 +1,108 @@
+"""
+The package logger, loaded on first use.
+
+Importing loguru (which pulls in asyncio) costs more than the rest of a quick
+CLI invocation such as `local-machine ssh`, so modules log through this proxy
+instead of importing loguru directly. Sinks set up with `configure` or
+`add_sink` before anything is logged are attached when loguru is loaded, and
+messages below every sink's level are dropped without loading it at all.
+Process-pool workers start from a clean interpreter, so `settings` captures
+the calls that set up the file and stderr sinks and `replay` repeats them in
+a worker (see `scheduler.process_pool`).
+"""
+
+import os
+import sys
+import threading
+
+_lock = threading.Lock()
+_pending = []
+_logger = None
+
+_LEVELS = {
+    "trace": 5,
+    "debug": 10,
+    "info": 20,
+    "success": 25,
+    "warning": 30,
+    "error": 40,
+    "exception": 40,
+    "critical": 50,
+}
+# Lowest level any sink accepts; loguru's default stderr sink takes DEBUG
+_min_level = _LEVELS["debug"]
+# (function name, args, kwargs) of the `configure`/`add_sink` calls a worker
+# process can repeat: sinks given as paths (callables and streams stay local)
+_settings = []
+
+
+def _load():
+    global _logger
+    with _lock:
+        if _logger is None:
+            from loguru import logger
+
+            for apply in _pending:
+                apply(logger)
+            _pending.clear()
+            _logger = logger
+    return _logger
+
+
+def _discard(*args, **kwargs) -> None:
+    pass
+
+
+class _LazyLogger:
+    def __getattr__(self, name):
+        if _logger is None and _LEVELS.get(name, _min_level) < _min_level:
+            return _discard
+        return getattr(_logger or _load(), name)
+
+
+logger = _LazyLogger()
+
+
+def _defer(apply, level: int, replace: bool = False) -> None:
+    global _min_level
+    with _lock:
+        _min_level = level if replace else min(_min_level, level)
+        if _logger is None:
+            _pending.append(apply)
+            return
+    apply(_logger)
+
+
+def add_sink(*args, **kwargs) -> None:
+    """`logger.add`, deferred until the first message is logged."""
+    level = _LEVELS[str(kwargs.get("level", "DEBUG")).lower()]
+    if args and isinstance(args[0], (str, os.PathLike)):
+        _settings.append(("add_sink", args, kwargs))
+    _defer(lambda logger: logger.add(*args, **kwargs), level)
+
+
+def configure(level: str = "INFO", file=None, **file_kwargs) -> None:
+    """
+    Replace loguru's default DEBUG stderr sink with one at `level`, plus
+    `file` (if given) at the same level.
+    """
+
+    def apply(logger):
+        logger.remove()
+        logger.add(sys.stderr, level=level)
+        if file is not None:
+            logger.add(file, level=level, **file_kwargs)
+
+    _settings[:] = [("configure", (level, file), file_kwargs)]
+    _defer(apply, _LEVELS[level.lower()], replace=True)
+
+
+def settings() -> list:
+    """The sink set-up of this process, for `replay` in another one."""
+    return list(_settings)
+
+
+def replay(calls: list) -> None:
+    """Repeat another process's `settings()` here (a process-pool initializer)."""
+    for name, args, kwargs in calls:
+        globals()[name](*args, **kwargs)
@@ -0,0 +1,188 @@
+import functools
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from local_machine.log import logger
+
+from local_machine.results import failed
+
+if TYPE_CHECKING:
+    from local_machine.filters import PathFilter
+
+MANIFEST_DIR = ".manifests"
+
+# path -> [size, mtime_ns, inode, sha256 or None], or None if the path is missing
+State = Dict[str, Optional[list]]
+
+
+def file_hash(path: Path, block_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ChangeManifest:
+    """
+    Persisted state of a backup unit's sources from its last successful run.
+
+    Each source file is recorded as (size, mtime_ns, inode) and, with
+    `hash_files`, a SHA-256. The hash is only compared when the stat
+    fingerprint differs but the size does not, so with `hash_files` a `touch`
+    without a content change still counts as unchanged.
+    """
+
+    def __init__(self, path: Path, hash_files: bool = False):
+        self.path = Path(path)
+        self.hash_files = hash_files
+
+    @classmethod
+    def for_unit(cls, backup_dir: Path, unit: str, **kwargs) -> "ChangeManifest":
+        return cls(Path(backup_dir) / MANIFEST_DIR / f"{unit}.json", **kwargs)
+
+    def load(self) -> Optional[dict]:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _entry(st: os.stat_result) -> list:
+        return [st.st_size, st.st_mtime_ns, st.st_ino, None]
+
+    def _walk(self, root: Path, state: State) -> None:
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        self._walk(Path(entry.path), state)
+                    elif entry.is_file(follow_symlinks=False):
+                        state[entry.path] = self._entry(
+                            entry.stat(follow_symlinks=False)
+                        )
+        except OSError as e:
+            logger.debug(f"Cannot scan {root}: {e}")
+
+    def state(
+        self,
+        sources: Iterable[Path],
+        recursive: bool = True,
+        path_filter: Optional["PathFilter"] = None,
+    ) -> State:
+        """
+        Stat every source; directories are walked unless `recursive` is False.
+        A `path_filter` limits the walk to the files the unit would archive, so
+        changes to excluded files (e.g. logs) do not trigger a backup.
+        """
+        state: State = {}
+        for src in sources:
+            src = Path(src)
+            try:
+                st = src.stat()
+            except OSError:
+                state[str(src)] = None
+                continue
+            if recursive and src.is_dir() and path_filter:
+                for entry, _ in path_filter.scan(src):
+                    state[entry.path] = self._entry(entry.stat(follow_symlinks=False))
+            elif recursive and src.is_dir():
+                self._walk(src, state)
+            else:
+                state[str(src)] = self._entry(st)
+        return state
+
+    def _same(self, path: str, old: Optional[list], new: Optional[list]) -> bool:
+        if old is None or new is None:
+            return old is new
+        if old[:3] == new[:3]:
+            new[3] = old[3]
+            return True
+        if not self.hash_files or old[0] != new[0] or old[3] is None:
+            return False
+        new[3] = file_hash(Path(path))
+        return new[3] == old[3]
+
+    def unchanged(self, state: State) -> Optional[dict]:
+        """Return the previous record if nothing changed since the last run."""
+        previous = self.load()
+        if not previous:
+            return None
+        old_state = previous.get("sources", {})
+        if old_state.keys() != state.keys():
+            return None
+        if not all(self._same(p, old_state[p], state[p]) for p in state):
+            return None
+        outputs = previous.get("outputs", [])
+        if not all(Path(o).exists() for o in outputs if os.path.isabs(o)):
+            return None
+        return previous
+
+    def record(self, state: State, outputs: List[str], scalar: bool = False) -> None:
+        if self.hash_files:
+            for path, entry in state.items():
+                if entry is not None and entry[3] is None:
+                    entry[3] = file_hash(Path(path))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(
+            json.dumps({"sources": state, "outputs": outputs, "scalar": scalar})
+        )
+        os.replace(tmp, self.path)
+
+
+def skip_if_unchanged(unit: str):
+    """
+    Decorate a backup class's `backup` method with change detection.
+
+    The class must provide `backup_dir`, `force` and a `sources()` method, and
+    may set `recursive_sources`/`hash_sources`, a `path_filter` and a `variant`
+    name. If no source changed since the
+    last successful run, the previous outputs are returned without doing any
+    work. Failed results (see `local_machine.results`) are never recorded.
+    With `hash_sources`, a source whose stat changed but whose content did not
+    (a `touch`, a save without edits) counts as unchanged, and its new stat
+    is recorded so it is not hashed again next time.
+    """
+
+    def decorate(backup):
+        @functools.wraps(backup)
+        def wrapper(self, *args, **kwargs):
+            # Chunk-store, per-codec and other output variants (e.g. a
+            # DuckDB export) are tracked separately
+            codec = getattr(self, "codec", "deflate")
+            variant = getattr(self, "variant", None)
+            if getattr(self, "store", None):
+                variant = "store"
+            elif codec != "deflate":
+                variant = codec
+            name = f"{unit}.{variant}" if variant else unit
+            manifest = ChangeManifest.for_unit(
+                self.backup_dir, name, hash_files=getattr(self, "hash_sources", False)
+            )
+            state = manifest.state(
+                self.sources(),
+                recursive=getattr(self, "recursive_sources", True),
+                path_filter=getattr(self, "path_filter", None),
+            )
+            if not self.force:
+                previous = manifest.unchanged(state)
+                if previous is not None:
+                    outputs = previous["outputs"]
+                    logger.info(f"{unit}: sources unchanged, keeping {outputs}")
+                    if previous["sources"] != state:
+                        manifest.record(state, outputs, scalar=previous.get("scalar"))
+                    return outputs[0] if previous.get("scalar") else outputs
+            result = backup(self, *args, **kwargs)
+            scalar = not isinstance(result, list)
+            if not failed(result):
+                outputs = [str(result)] if scalar else [str(o) for o in result]
+                manifest.record(state, outputs, scalar=scalar)
+            return result
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,203 @@
+import contextlib
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+REPORTS_DIR = "reports"
+PROM_FILE = "local_machine.prom"
+# Run reports kept in REPORTS_DIR; older ones are deleted
+REPORTS_KEEP = 100
+
+_PROM_SAMPLE = re.compile(r'(local_machine_unit_\w+)\{unit="([^"]*)"\} (\S+)')
+
+
+@dataclass
+class UnitMetrics:
+    unit: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    files: int = 0
+    subprocesses: int = 0
+    ok: bool = True
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def as_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+
+    def __getstate__(self):
+        # Crosses the process-pool boundary inside a UnitResult
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+_current: contextvars.ContextVar[Optional[UnitMetrics]] = contextvars.ContextVar(
+    "unit_metrics", default=None
+)
+
+
+def record(
+    bytes_read: int = 0, bytes_written: int = 0, files: int = 0, subprocesses: int = 0
+) -> None:
+    """Add to the counters of the unit being measured in this context, if any."""
+    m = _current.get()
+    if m is None:
+        return
+    with m._lock:
+        m.bytes_read += bytes_read
+        m.bytes_written += bytes_written
+        m.files += files
+        m.subprocesses += subprocesses
+
+
+def submit(pool, fn, *args, **kwargs):
+    """`pool.submit` that keeps the caller's metrics context in the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+@contextlib.contextmanager
+def measure(unit: str, process_cpu: bool = False):
+    """
+    Measure the enclosed block as `unit`, yielding its `UnitMetrics`.
+
+    CPU time is the calling thread's, or the whole process's with
+    `process_cpu` (for a pool worker process that runs one unit at a time,
+    so its helper threads are counted too). Byte, file and subprocess counts
+    are reported by the code doing the work via `record`.
+    """
+    m = UnitMetrics(unit)
+    clock = time.process_time if process_cpu else time.thread_time
+    token = _current.set(m)
+    wall, cpu = time.perf_counter(), clock()
+    try:
+        yield m
+    except BaseException:
+        m.ok = False
+        raise
+    finally:
+        m.wall_seconds = time.perf_counter() - wall
+        m.cpu_seconds = clock() - cpu
+        _current.reset(token)
+
+
+def _size(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return str(n)
+
+
+def format_table(metrics: Iterable[UnitMetrics]) -> str:
+    metrics = sorted(metrics, key=lambda m: m.wall_seconds, reverse=True)
+    width = max((len(m.unit) for m in metrics), default=4)
+    lines = [
+        f"{'unit':<{width}}  {'wall s':>7}  {'cpu s':>7}  {'read':>8}  "
+        f"{'written':>8}  {'files':>6}  {'procs':>5}  status"
+    ]
+    for m in metrics:
+        lines.append(
+            f"{m.unit:<{width}}  {m.wall_seconds:>7.2f}  {m.cpu_seconds:>7.2f}  "
+            f"{_size(m.bytes_read):>8}  {_size(m.bytes_written):>8}  "
+            f"{m.files:>6}  {m.subprocesses:>5}  {'ok' if m.ok else 'error'}"
+        )
+    return "\n".join(lines)
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def read_prometheus(path: Path) -> Dict[str, Dict[str, str]]:
+    """unit -> {metric: value} of the per-unit samples in a textfile written earlier."""
+    samples: Dict[str, Dict[str, str]] = {}
+    try:
+        text = path.read_text()
+    except OSError:
+        return samples
+    for line in text.splitlines():
+        m = _PROM_SAMPLE.fullmatch(line)
+        if m:
+            samples.setdefault(m[2], {})[m[1]] = m[3]
+    return samples
+
+
+def prometheus_text(
+    metrics: List[UnitMetrics],
+    finished: float,
+    previous: Optional[Dict[str, Dict[str, str]]] = None,
+) -> str:
+    """
+    The textfile for `metrics`, keeping the `previous` samples (see
+    `read_prometheus`) of units that did not run this time.
+    """
+    series = [
+        ("wall_seconds", "Wall-clock time of the unit's last run", "wall_seconds"),
+        ("cpu_seconds", "CPU time of the unit's last run", "cpu_seconds"),
+        ("read_bytes", "Bytes read by the unit's last run", "bytes_read"),
+        ("written_bytes", "Bytes written by the unit's last run", "bytes_written"),
+        ("files", "Files processed by the unit's last run", "files"),
+        ("subprocesses", "Subprocesses started by the unit's last run", "subprocesses"),
+        ("success", "1 if the unit's last run succeeded", "ok"),
+    ]
+    current = {m.unit: m for m in metrics}
+    kept = {u: s for u, s in (previous or {}).items() if u not in current}
+    lines = []
+    for name, help_text, attr in series:
+        metric = f"local_machine_unit_{name}"
+        lines += [f"# HELP {metric} {help_text}.", f"# TYPE {metric} gauge"]
+        values = {u: s[metric] for u, s in kept.items() if metric in s}
+        values.update((u, f"{float(getattr(m, attr)):g}") for u, m in current.items())
+        for unit in sorted(values):
+            lines.append(f'{metric}{{unit="{unit}"}} {values[unit]}')
+    lines += [
+        "# HELP local_machine_last_run_timestamp_seconds End of the last backup run.",
+        "# TYPE local_machine_last_run_timestamp_seconds gauge",
+        f"local_machine_last_run_timestamp_seconds {finished:.3f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(backup_dir: Path, metrics: List[UnitMetrics]) -> Path:
+    """
+    Write a JSON run report to `backup_dir/reports/` (keeping the newest
+    `REPORTS_KEEP`) and update the Prometheus textfile-collector file
+    `backup_dir/local_machine.prom`: units in `metrics` get their new
+    samples, other units keep the ones from their last run. Returns the JSON
+    report path.
+    """
+    backup_dir = Path(backup_dir)
+    finished = time.time()
+    report = {
+        "finished": datetime.fromtimestamp(finished).isoformat(),
+        "units": [m.as_dict() for m in metrics],
+        "totals": {
+            key: sum(getattr(m, key) for m in metrics)
+            for key in ("bytes_read", "bytes_written", "files", "subprocesses")
+        },
+    }
+    # Down to the microsecond: daemon batches can finish within a second
+    stamp = datetime.fromtimestamp(finished).strftime("%Y%m%d_%H%M%S_%f")
+    path = backup_dir / REPORTS_DIR / f"run_{stamp}.json"
+    _atomic_write(path, json.dumps(report, indent=2))
+    # The timestamped names sort oldest first
+    for old in sorted(path.parent.glob("run_*.json"))[:-REPORTS_KEEP]:
+        old.unlink(missing_ok=True)
+    prom = backup_dir / PROM_FILE
+    _atomic_write(prom, prometheus_text(metrics, finished, read_prometheus(prom)))
+    return path
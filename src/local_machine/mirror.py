@@ -0,0 +1,347 @@
+"""
+Mirror the backup directory to a second location, rsync style.
+
+A file whose size and mtime match what the last run recorded (in a state
+file under the backup directory's `.manifests`) is skipped without reading
+either copy. A changed file is patched in place, like rsync's `--inplace`:
+it is compared with the mirror's copy in aligned, fixed-size blocks (by
+digest), and only the blocks that differ are written. The file keeps its
+inode, so sync clients (iCloud, Dropbox) see a modified file rather than a
+new one. New files are written whole. Block digests of the mirror's files
+are kept in the state file, so the mirror side is not read again while it
+is unchanged.
+
+Unlike rsync there is no rolling checksum: content that moved (bytes
+inserted or removed earlier in the file) is at a new offset, so an in-place
+patch has to write it again anyway, and it is simply found to differ.
+
+Deleting extra files (`delete=True`) needs the marker file `MARKER` in the
+mirror, which is only created in a directory that was empty at the first
+mirror run, so a mistyped target is never cleaned out.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from math import isqrt
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from local_machine.log import logger
+
+from local_machine import cancel, metrics
+from local_machine.manifest import MANIFEST_DIR
+
+MIN_BLOCK = 2 * 1024
+MAX_BLOCK = 128 * 1024
+STATE_VERSION = 2
+# Marks a directory created by (or emptied for) a mirror
+MARKER = ".local-machine-mirror"
+
+# A block signature list: the digest of each aligned block, the last one
+# possibly short
+Signature = List[str]
+
+
+@dataclass
+class MirrorResult:
+    path: str
+    action: str  # "unchanged", "copied", "delta", "deleted" or "failed"
+    size: int = 0
+    written: int = 0  # bytes written to the mirror
+    detail: str = ""
+
+
+def block_size(size: int) -> int:
+    """About the square root of the file size, as a power of two."""
+    return min(MAX_BLOCK, max(MIN_BLOCK, 1 << isqrt(size).bit_length()))
+
+
+def _strong(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _map(f):
+    """A read-only mmap of the open file `f`, or b"" if it is empty."""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def signature(data, size: int) -> Signature:
+    """Block digests of `data` (bytes or mmap) in `size` blocks."""
+    view = memoryview(data)
+    return [_strong(view[i : i + size]) for i in range(0, len(data), size)]
+
+
+def changed_ranges(
+    sig: Signature, basis: Signature, size: int, length: int
+) -> List[Tuple[int, int]]:
+    """
+    (offset, length) ranges of a `length`-byte file with signature `sig`
+    whose blocks differ from the basis file's, with adjacent ranges merged.
+    """
+    ranges: List[Tuple[int, int]] = []
+    for index, digest in enumerate(sig):
+        if index < len(basis) and basis[index] == digest:
+            continue
+        offset = index * size
+        count = min(size, length - offset)
+        if ranges and sum(ranges[-1]) == offset:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + count)
+        else:
+            ranges.append((offset, count))
+    return ranges
+
+
+class Mirror:
+    """
+    Mirror `src` (a backup directory) into `dest`. See the module docstring;
+    `run` does one pass and returns a `MirrorResult` per file.
+    """
+
+    def __init__(
+        self,
+        src: Path,
+        dest: Path,
+        delete: bool = False,
+        workers: Optional[int] = None,
+        state_path: Optional[Path] = None,
+    ):
+        self.src = Path(src).resolve()
+        self.dest = Path(dest).resolve()
+        if self.dest == self.src or self.src in self.dest.parents:
+            raise ValueError(f"Mirror target {self.dest} is inside {self.src}")
+        self.delete = delete
+        self.workers = workers or min(8, (os.cpu_count() or 1) + 4)
+        key = hashlib.sha1(str(self.dest).encode()).hexdigest()[:12]
+        self.state_path = Path(
+            state_path or self.src / MANIFEST_DIR / f"mirror_{key}.json"
+        )
+        self.state: Dict[str, dict] = {}
+
+    # -- state -------------------------------------------------------------
+
+    def load_state(self) -> None:
+        try:
+            data = json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        if data.get("version") != STATE_VERSION or data.get("dest") != str(self.dest):
+            data = {}
+        self.state = data.get("files", {})
+
+    def save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(f".{self.state_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(
+            json.dumps(
+                {"version": STATE_VERSION, "dest": str(self.dest), "files": self.state}
+            )
+        )
+        os.replace(tmp, self.state_path)
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[List[int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    # -- walking -----------------------------------------------------------
+
+    def files(self) -> List[str]:
+        """Relative paths of the files to mirror, skipping local bookkeeping."""
+        found = []
+        for root, dirs, names in os.walk(self.src):
+            if Path(root) == self.src:
+                dirs[:] = [d for d in dirs if d != MANIFEST_DIR]
+            dirs.sort()
+            for name in sorted(names):
+                if name.startswith(".") and name.endswith(".tmp"):
+                    continue
+                path = Path(root) / name
+                if path.is_file() and not path.is_symlink():
+                    found.append(path.relative_to(self.src).as_posix())
+        return found
+
+    def _basis_signature(self, rel: str, f, size: int) -> Signature:
+        """
+        Signature of the mirror's `rel`, open as `f`, from the state file
+        while that is still valid.
+        """
+        entry = self.state.get(rel)
+        st = os.fstat(f.fileno())
+        if (
+            entry
+            and entry["dest"] == [st.st_size, st.st_mtime_ns]
+            and entry["block"] == size
+        ):
+            return entry["sig"]
+        data = _map(f)
+        try:
+            metrics.record(bytes_read=len(data))
+            return signature(data, size)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    # -- one file ----------------------------------------------------------
+
+    def sync(self, rel: str) -> Tuple[MirrorResult, Optional[dict]]:
+        cancel.checkpoint()
+        src = self.src / rel
+        target = self.dest / rel
+        st = os.stat(src)
+        src_stat = [st.st_size, st.st_mtime_ns]
+        entry = self.state.get(rel)
+        dest_stat = self._stat(target)
+        if dest_stat == src_stat and (entry is None or entry["src"] == src_stat):
+            # Same size and mtime on both sides: rsync's quick check
+            if entry is None:
+                entry = {"src": src_stat, "dest": dest_stat, "block": 0, "sig": []}
+            return MirrorResult(rel, "unchanged", st.st_size), entry
+
+        size = block_size(st.st_size)
+        with open(src, "rb") as f:
+            data = _map(f)
+        try:
+            metrics.record(bytes_read=len(data), files=1)
+            basis = []
+            if dest_stat is not None:
+                with open(target, "rb") as f:
+                    basis = self._basis_signature(rel, f, size)
+            new_sig = signature(data, size)
+            if basis:
+                ranges = changed_ranges(new_sig, basis, size, len(data))
+                written = self._patch(target, data, ranges, st)
+            else:
+                written = self._copy(target, data, st)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        metrics.record(bytes_written=written)
+        entry = {
+            "src": src_stat,
+            "dest": self._stat(target),
+            "block": size,
+            "sig": new_sig,
+        }
+        action = "delta" if basis else "copied"
+        return MirrorResult(rel, action, st.st_size, written), entry
+
+    @staticmethod
+    def _finish(path, st: os.stat_result) -> None:
+        os.chmod(path, st.st_mode & 0o7777)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    def _copy(self, target: Path, data, st: os.stat_result) -> int:
+        """Write `data` as a new `target`, atomically."""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "wb") as out:
+                out.write(data)
+            self._finish(tmp, st)
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return len(data)
+
+    def _patch(self, target: Path, data, ranges, st: os.stat_result) -> int:
+        """
+        Rewrite `target` in place to hold `data`, writing only `ranges` and
+        leaving the other blocks alone. Returns the bytes written. An
+        interrupted patch leaves a new mtime on `target`, so the next run
+        patches it again.
+        """
+        written = 0
+        with open(target, "r+b") as out:
+            for offset, length in ranges:
+                out.seek(offset)
+                out.write(data[offset : offset + length])
+                written += length
+            out.truncate(len(data))
+        self._finish(target, st)
+        return written
+
+    # -- a whole pass ------------------------------------------------------
+
+    def run(self) -> List[MirrorResult]:
+        self.load_state()
+        self.dest.mkdir(parents=True, exist_ok=True)
+        # Before anything is written, so only a directory that was empty is
+        # marked
+        self._mark()
+        files = self.files()
+        results: List[MirrorResult] = []
+        state: Dict[str, dict] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {rel: metrics.submit(pool, self.sync, rel) for rel in files}
+            for rel, future in futures.items():
+                try:
+                    result, entry = future.result()
+                except OSError as e:
+                    logger.error(f"Mirroring {rel} failed: {e}")
+                    results.append(MirrorResult(rel, "failed", detail=str(e)))
+                    continue
+                results.append(result)
+                state[rel] = entry
+        if self.delete:
+            results.extend(self._delete_extra(set(files)))
+        self.state = state
+        self.save_state()
+
+        total = sum(r.size for r in results)
+        written = sum(r.written for r in results)
+        logger.info(
+            f"Mirrored {self.src} to {self.dest}: {len(results)} files, "
+            f"{written} of {total} bytes written"
+        )
+        return results
+
+    def _mark(self) -> bool:
+        """
+        Whether `dest` is a mirror's: it holds `MARKER`, or is empty and
+        gets it now.
+        """
+        marker = self.dest / MARKER
+        if marker.exists():
+            return True
+        if any(self.dest.iterdir()):
+            return False
+        marker.write_text(json.dumps({"src": str(self.src)}) + "\n")
+        return True
+
+    def _delete_extra(self, keep) -> List[MirrorResult]:
+        if not (self.dest / MARKER).exists():
+            error = (
+                f"{self.dest} was not created by a mirror (no {MARKER}), "
+                "so nothing was deleted"
+            )
+            logger.error(error)
+            return [MirrorResult(".", "failed", detail=error)]
+        removed = []
+        for root, dirs, names in os.walk(self.dest, topdown=False):
+            for name in names:
+                path = Path(root) / name
+                rel = path.relative_to(self.dest).as_posix()
+                if rel not in keep and rel != MARKER:
+                    path.unlink()
+                    removed.append(MirrorResult(rel, "deleted"))
+            if Path(root) != self.dest:
+                try:
+                    os.rmdir(root)  # only succeeds once it is empty
+                except OSError:
+                    pass
+        return removed
+
+
+def mirror(
+    src: Path, dest: Path, delete: bool = False, workers: Optional[int] = None
+) -> List[MirrorResult]:
+    return Mirror(src, dest, delete=delete, workers=workers).run()
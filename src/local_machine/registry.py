@@ -0,0 +1,428 @@
+"""
+The registry of backup and listing units.
+
+Every unit is declared once, as a `UnitSpec`: the CLI's actions, the app's
+tabs and the scheduler's ordering are all derived from it. Units can also be
+declared, or the built-in ones adjusted, in the `[units.<name>]` tables of
+`conf/app_config.toml`, e.g.
+
+    [units.brew]
+    cost = 20
+
+    [units.fonts]
+    tab = "Fonts"
+    run = "my_backups:fonts_unit"
+    sources = ["~/Library/Fonts"]
+
+Code is referenced as "module:attribute" strings and imported only when a
+unit runs. A unit's `sources` are the single list of what it reads: its
+backup class, its change detection, the daemon and the app all take them
+from here.
+"""
+
+import glob
+import importlib
+import os
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from local_machine.filters import PathFilter
+
+
+@dataclass(frozen=True)
+class UnitSpec:
+    """
+    A backup or listing unit.
+
+    `run` takes a `RunContext` and returns the lines to print; `make` (if
+    set) builds the unit's backup/listing object from the same context for
+    the app. `sources` are the paths the unit reads (`~` is the home
+    directory, `$VAR` an environment variable; a source naming an unset
+    variable is skipped, and a glob matches entries of one directory) and
+    `outputs` the names it writes under the backup directory.
+    `cost` is a rough relative run time: the most expensive ready units start
+    first. `deps` name units that must finish first when both are selected.
+    `tools` are external commands the unit runs, resolved once up front.
+    `include`/`exclude` are gitignore-style rules for the directories the
+    unit archives, and `max_file_size` (bytes, or e.g. "10MB") skips bigger
+    files; see `local_machine.filters`. Rules set in the config replace the
+    built-in ones. `--daemon` watches the sources of every selected unit that
+    writes outputs, except units with `daemon` off, which it only watches
+    when they are named explicitly.
+    """
+
+    name: str
+    run: str
+    tab: Optional[str] = None
+    make: Optional[str] = None
+    sources: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    cost: float = 1.0
+    deps: Tuple[str, ...] = ()
+    tools: Tuple[str, ...] = ()
+    cpu_bound: bool = False
+    in_all: bool = True
+    include: Tuple[str, ...] = ()
+    exclude: Tuple[str, ...] = ()
+    max_file_size: Optional[Union[int, str]] = None
+    daemon: bool = True
+
+
+def _unit(name: str, **kwargs) -> UnitSpec:
+    kwargs.setdefault("run", f"local_machine.units:{name}_unit")
+    kwargs.setdefault("make", f"local_machine.units:make_{name}")
+    return UnitSpec(name, **kwargs)
+
+
+# Backup units that write into the backup directory; verify runs after them
+_WRITERS = (
+    "dotfiles",
+    "brew",
+    "vscode",
+    "pipx",
+    "uv",
+    "r",
+    "git",
+    "terminal",
+    "cloud",
+    "duckdb",
+)
+
+_GLOB_CHARS = frozenset("*?[")
+
+# Regenerable files no directory backup needs
+_BULK = ("__pycache__/", "*.pyc", ".DS_Store")
+
+# Home-directory dotfiles that are state rather than configuration: shell and
+# REPL histories, editor state and caches. They change constantly and would
+# keep the daemon busy for nothing.
+_DOTFILE_STATE = (
+    "*history*",
+    ".viminfo",
+    ".lesshst",
+    ".zcompdump*",
+    ".wget-hsts",
+    ".CFUserTextEncoding",
+    ".*.swp",
+    ".DS_Store",
+)
+
+BUILTIN_UNITS: List[UnitSpec] = [
+    _unit(
+        "dotfiles",
+        tab="Dotfiles",
+        sources=("~/.*",),
+        outputs=("dotfiles_backup_*",),
+        cost=2,
+        cpu_bound=True,
+        exclude=_DOTFILE_STATE,
+    ),
+    _unit(
+        "brew",
+        tab="Homebrew",
+        # Installs and uninstalls show up here; another prefix (a custom
+        # HOMEBREW_PREFIX) can be set in the config
+        sources=(
+            "/opt/homebrew/Cellar",
+            "/opt/homebrew/Caskroom",
+            "/opt/homebrew/Library/Taps",
+            "/usr/local/Cellar",
+            "/usr/local/Caskroom",
+            "/usr/local/Homebrew/Library/Taps",
+        ),
+        outputs=("Brewfile",),
+        cost=10,
+        tools=("brew",),
+    ),
+    _unit("ssh", tab="SSH Keys", sources=("~/.ssh",), cost=0.1),
+    _unit(
+        "macos",
+        tab="macOS Info",
+        sources=("/Applications",),
+        cost=3,
+        tools=("date", "sw_vers"),
+    ),
+    _unit(
+        "vscode",
+        tab="VS Code",
+        # Only the extension list is backed up, not the settings
+        sources=("~/.vscode/extensions", "~/.vscode/extensions/extensions.json"),
+        outputs=("vscode_extensions.txt",),
+        cost=2,
+        tools=("code",),
+    ),
+    _unit("crontab", tab="Crontab", cost=0.5, tools=("crontab",)),
+    _unit(
+        "launchagents",
+        tab="LaunchAgents",
+        sources=("~/Library/LaunchAgents",),
+        cost=0.1,
+    ),
+    _unit(
+        "pipx",
+        tab="Python tools",
+        sources=(
+            "$PIPX_HOME/venvs",
+            "~/.local/pipx/venvs",
+            "~/.local/share/pipx/venvs",
+        ),
+        outputs=("pipx_tools.txt",),
+        cost=2,
+        tools=("pipx",),
+    ),
+    _unit(
+        "uv",
+        tab="Python tools",
+        sources=("$UV_TOOL_DIR", "~/.local/share/uv/tools"),
+        outputs=("uv_tools.txt",),
+        cost=1,
+        tools=("uv",),
+    ),
+    _unit(
+        "r",
+        tab="R",
+        sources=(
+            "~/.Rprofile",
+            "~/.Renviron",
+            "~/.config/rstudio",
+            "~/.rstudio-desktop",
+        ),
+        outputs=(
+            ".Rprofile",
+            ".Renviron",
+            "rstudio_backup.*",
+            ".rstudio-desktop_backup.*",
+        ),
+        cost=1,
+        cpu_bound=True,
+        exclude=_BULK + ("log/", "logs/", "*.log"),
+    ),
+    _unit(
+        "git",
+        tab="Git",
+        sources=("~/.gitconfig", "~/.gitignore_global"),
+        outputs=(".gitconfig", ".gitignore_global"),
+        cost=0.2,
+    ),
+    _unit(
+        "terminal",
+        tab="Terminal",
+        sources=(
+            "~/.warp",
+            "~/Library/Preferences/com.apple.Terminal.plist",
+            "~/Library/Preferences/com.googlecode.iterm2.plist",
+        ),
+        outputs=(
+            "warp_config.*",
+            "com.apple.Terminal.plist",
+            "com.googlecode.iterm2.plist",
+        ),
+        cost=1,
+        cpu_bound=True,
+        exclude=_BULK + ("logs/", "*.log"),
+    ),
+    _unit(
+        "cloud",
+        tab="Cloud CLIs",
+        sources=(
+            "~/.aws",
+            "~/.config/gcloud",
+            "~/.azure",
+            "~/.railway",
+            "~/.config/render",
+        ),
+        outputs=(
+            "aws_config.*",
+            "gcloud_config.*",
+            "azure_config.*",
+            "railway_config.*",
+            "render_config.*",
+        ),
+        cost=4,
+        cpu_bound=True,
+        # Logs, caches and cached access tokens are rebuilt by the CLIs;
+        # credentials and configuration are kept
+        exclude=_BULK
+        + (
+            "logs/",
+            "*.log",
+            "cache/",
+            "access_tokens.db",
+            "telemetry/",
+            "commands/",
+        ),
+        max_file_size="10MB",
+    ),
+    _unit(
+        "duckdb",
+        tab="DuckDB",
+        sources=("~/duckdb.db", "~/duckdb.db.wal"),
+        outputs=("duckdb.db", "duckdb_export"),
+        cost=2,
+    ),
+    _unit(
+        "secrets",
+        tab="Secrets",
+        sources=("~/code/github",),
+        outputs=("secrets_index.sqlite",),
+        cost=3,
+        # Every source edit under the code tree would rescan it
+        daemon=False,
+    ),
+    UnitSpec(
+        "verify",
+        run="local_machine.units:verify_unit",
+        cost=5,
+        deps=_WRITERS,
+        in_all=False,
+    ),
+    # A second copy of the backup directory, made after everything is written
+    UnitSpec(
+        "mirror",
+        run="local_machine.units:mirror_unit",
+        cost=2,
+        deps=_WRITERS + ("secrets",),
+        in_all=False,
+    ),
+    UnitSpec(
+        "restore",
+        run="local_machine.units:restore_unit",
+        cost=10,
+        tools=("brew", "code", "uv", "pipx"),
+        in_all=False,
+    ),
+]
+
+_TUPLE_FIELDS = {f.name for f in fields(UnitSpec) if f.type == Tuple[str, ...]}
+_FIELDS = {f.name for f in fields(UnitSpec)} - {"name"}
+
+
+def _from_config(name: str, table: dict, base: Optional[UnitSpec]) -> UnitSpec:
+    unknown = set(table) - _FIELDS
+    if unknown:
+        raise ValueError(f"Unknown keys for unit {name!r}: {sorted(unknown)}")
+    values = {k: tuple(v) if k in _TUPLE_FIELDS else v for k, v in table.items()}
+    if base is not None:
+        return replace(base, **values)
+    if "run" not in values:
+        raise ValueError(f"Unit {name!r} needs a 'run' reference")
+    return UnitSpec(name, **values)
+
+
+def load_registry(config=None) -> Dict[str, UnitSpec]:
+    """
+    The built-in units, updated and extended by the `[units]` tables of a
+    `ProjectConfig` (if given), keyed by name in declaration order.
+    """
+    registry = {spec.name: spec for spec in BUILTIN_UNITS}
+    tables = config.get("units", default={}) if config is not None else {}
+    for name, table in tables.items():
+        registry[name] = _from_config(name, table, registry.get(name))
+    for spec in registry.values():
+        missing = [d for d in spec.deps if d not in registry]
+        if missing:
+            raise ValueError(f"Unit {spec.name!r} depends on unknown units {missing}")
+    return registry
+
+
+def unit_filters(registry: Dict[str, UnitSpec]) -> Dict[str, "PathFilter"]:
+    """Each unit's include/exclude rules, compiled once, for units that have any."""
+    from local_machine.filters import PathFilter
+
+    filters = {}
+    for spec in registry.values():
+        path_filter = PathFilter(spec.include, spec.exclude, spec.max_file_size)
+        if path_filter:
+            filters[spec.name] = path_filter
+    return filters
+
+
+def unit_sources(registry: Dict[str, UnitSpec]) -> Dict[str, Tuple[str, ...]]:
+    """Each unit's sources, for units that declare any."""
+    return {spec.name: spec.sources for spec in registry.values() if spec.sources}
+
+
+def builtin_sources(name: str) -> Tuple[str, ...]:
+    """The sources the built-in unit `name` declares."""
+    return next(spec.sources for spec in BUILTIN_UNITS if spec.name == name)
+
+
+def expand_source(source: str) -> Optional[str]:
+    """`source` with `~` and `$VAR`s expanded, or None if a variable is unset."""
+    path = os.path.expandvars(os.path.expanduser(source))
+    return None if "$" in path else os.path.normpath(path)
+
+
+def source_paths(sources: Iterable[str]) -> List[Path]:
+    """The paths `sources` name, in order: globs matched, duplicates dropped."""
+    paths: Dict[Path, None] = {}
+    for source in sources:
+        path = expand_source(source)
+        if path is None:
+            continue
+        if _GLOB_CHARS & set(path):
+            paths.update((Path(p), None) for p in sorted(glob.glob(path)))
+        else:
+            paths[Path(path)] = None
+    return list(paths)
+
+
+def resolve(ref: str):
+    """Import the object named by a "module:attribute" reference."""
+    module, _, attr = ref.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def tabs(registry: Dict[str, UnitSpec]) -> List[str]:
+    """App tab labels in declaration order; several units may share a tab."""
+    return list(dict.fromkeys(s.tab for s in registry.values() if s.tab))
+
+
+def tab_units(registry: Dict[str, UnitSpec], tab: str) -> List[UnitSpec]:
+    return [s for s in registry.values() if s.tab == tab]
+
+
+def select(registry: Dict[str, UnitSpec], names: Iterable[str]) -> List[UnitSpec]:
+    """The named units ("all" expands to every unit in `all`), deduplicated."""
+    selected: Dict[str, UnitSpec] = {}
+    for name in names:
+        if name == "all":
+            selected.update((s.name, s) for s in registry.values() if s.in_all)
+        else:
+            selected[name] = registry[name]
+    return list(selected.values())
+
+
+def prepare(ctx, specs: Iterable[UnitSpec]) -> None:
+    """
+    Setup shared by the selected units, done once before any of them runs:
+    create the backup directory (unless this is a dry run) and resolve every
+    tool the units will run on `PATH`.
+    """
+    from local_machine.runner import which
+
+    specs = list(specs)
+    if not ctx.dry_run and any(s.outputs for s in specs):
+        ctx.backup_dir.mkdir(parents=True, exist_ok=True)
+    for tool in dict.fromkeys(t for s in specs for t in s.tools):
+        which(tool)
+
+
+def build_units(specs: Iterable[UnitSpec], ctx) -> list:
+    """Scheduler units for `specs`, each calling its `run` with `ctx`."""
+    from functools import partial
+
+    from local_machine.scheduler import Unit
+
+    return [
+        Unit(
+            spec.name,
+            partial(resolve(spec.run), ctx),
+            spec.cpu_bound,
+            cost=spec.cost,
+            deps=spec.deps,
+        )
+        for spec in specs
+    ]
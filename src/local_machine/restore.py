@@ -0,0 +1,557 @@
+"""
+Restore a machine from a backup directory.
+
+Files come back from the newest archive (.zip, .tar.xz, .tar.zst) or chunk
+store snapshot of each artifact, extracted in parallel. A target file that
+already has the backed-up size and mtime, or failing that the same content,
+is left alone, so re-running a restore only writes what differs. The
+Brewfile, VS Code extensions and uv/pipx tool lists are replayed as
+installs running concurrently with the extraction, a bounded number at a
+time.
+"""
+
+import fnmatch
+import hashlib
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from local_machine.log import logger
+
+from local_machine import cancel, metrics
+from local_machine.archive import EXTENSIONS
+from local_machine.fastcopy import copy_file, hash_file, read_sidecar
+from local_machine.store import ChunkStore
+from local_machine.utils import (
+    PIPX_TOOLS_FILE,
+    UV_TOOLS_FILE,
+    VSCODE_EXTENSIONS_FILE,
+    PipxList,
+    UVToolList,
+    VSCodeExtensions,
+    parse_pipx_tools,
+    parse_uv_tools,
+    read_list,
+)
+
+READ_SIZE = 1024 * 1024
+# Zip members are extracted in batches of roughly this many compressed bytes,
+# each batch by one worker with its own handle on the archive
+ZIP_BATCH_BYTES = 16 * 1024 * 1024
+DEFAULT_INSTALL_JOBS = 4
+# Installing a whole Brewfile can take a long time
+INSTALL_TIMEOUT = 60 * 60.0
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """
+    Something a backup unit wrote. `name` is a file in the backup directory,
+    or with `archive` the base name of an archive or snapshot (`timestamped`
+    ones carry a _YYYYmmdd_HHMMSS suffix). `target` is where it is restored,
+    relative to the restore root (the home directory); an archive is
+    extracted into it.
+    """
+
+    category: str
+    name: str
+    target: str
+    archive: bool = False
+    timestamped: bool = False
+
+
+ARTIFACTS = [
+    Artifact("dotfiles", "dotfiles_backup", "", archive=True, timestamped=True),
+    Artifact("r", ".Rprofile", ".Rprofile"),
+    Artifact("r", ".Renviron", ".Renviron"),
+    Artifact("r", "rstudio_backup", ".config/rstudio", archive=True),
+    Artifact("r", ".rstudio-desktop_backup", ".rstudio-desktop", archive=True),
+    Artifact("git", ".gitconfig", ".gitconfig"),
+    Artifact("git", ".gitignore_global", ".gitignore_global"),
+    Artifact("terminal", "warp_config", ".warp", archive=True),
+    Artifact(
+        "terminal",
+        "com.apple.Terminal.plist",
+        "Library/Preferences/com.apple.Terminal.plist",
+    ),
+    Artifact(
+        "terminal",
+        "com.googlecode.iterm2.plist",
+        "Library/Preferences/com.googlecode.iterm2.plist",
+    ),
+    Artifact("cloud", "aws_config", ".aws", archive=True),
+    Artifact("cloud", "gcloud_config", ".config/gcloud", archive=True),
+    Artifact("cloud", "azure_config", ".azure", archive=True),
+    Artifact("cloud", "railway_config", ".railway", archive=True),
+    Artifact("cloud", "render_config", ".config/render", archive=True),
+    Artifact("duckdb", "duckdb.db", "duckdb.db"),
+]
+DUCKDB_EXPORT_DIR = "duckdb_export"
+
+INSTALL_CATEGORIES = ("brew", "vscode", "uv", "pipx")
+CATEGORIES = tuple(dict.fromkeys(a.category for a in ARTIFACTS)) + INSTALL_CATEGORIES
+
+
+@dataclass
+class RestoreResult:
+    category: str
+    path: str
+    action: str  # "restored", "unchanged", "installed", "failed" or "planned"
+    detail: str = ""
+
+
+# -- finding artifacts -------------------------------------------------------
+
+
+def _archive_candidates(backup_dir: Path, store: Optional[ChunkStore], artifact):
+    """(mtime, kind, path) for every archive or snapshot of `artifact`."""
+    suffix = "_*" if artifact.timestamped else ""
+    for ext in dict.fromkeys(EXTENSIONS.values()):
+        for path in backup_dir.glob(f"{artifact.name}{suffix}{ext}"):
+            yield path.stat().st_mtime, ext.lstrip("."), path
+    if store is not None:
+        for path in store.list_snapshots(artifact.name):
+            yield path.stat().st_mtime, "snapshot", path
+
+
+def _store(backup_dir: Path) -> Optional[ChunkStore]:
+    root = Path(backup_dir) / "store"
+    return ChunkStore(root) if root.is_dir() else None
+
+
+def find_artifacts(
+    backup_dir: Path, categories: Optional[Iterable[str]] = None
+) -> List[Tuple[Artifact, str, Path]]:
+    """
+    (artifact, kind, path) for the newest copy of every artifact present in
+    `backup_dir`; kind is "file", "snapshot" or an archive extension.
+    """
+    backup_dir = Path(backup_dir)
+    wanted = set(categories) if categories else None
+    store = _store(backup_dir)
+    found = []
+    for artifact in ARTIFACTS:
+        if wanted is not None and artifact.category not in wanted:
+            continue
+        if not artifact.archive:
+            path = backup_dir / artifact.name
+            if path.is_file():
+                found.append((artifact, "file", path))
+            continue
+        candidates = sorted(_archive_candidates(backup_dir, store, artifact))
+        if candidates:
+            _, kind, path = candidates[-1]
+            found.append((artifact, kind, path))
+    return found
+
+
+# -- extraction --------------------------------------------------------------
+
+
+class _Restorer:
+    """Shared state of one restore run: where files go and which ones."""
+
+    def __init__(self, root: Path, patterns, dry_run: bool):
+        self.root = Path(root)
+        self.patterns = list(patterns or [])
+        self.dry_run = dry_run
+        # Targets restored from their own file artifact; archives that also
+        # hold them (e.g. .gitconfig among the dotfiles) leave them alone
+        self.claimed = set()
+
+    def target(self, artifact: Artifact, member: str = "") -> Optional[Path]:
+        """
+        Where `member` of `artifact` goes, or None if it is filtered out.
+        Names that would escape the restore root are refused.
+        """
+        rel = PurePosixPath(artifact.target, member)
+        if rel.is_absolute() or ".." in rel.parts or not rel.parts:
+            raise ValueError(f"Refusing to restore outside {self.root}: {rel}")
+        rel_str = rel.as_posix()
+        if member and rel_str in self.claimed:
+            return None
+        if self.patterns and not any(
+            fnmatch.fnmatch(rel_str, p) for p in self.patterns
+        ):
+            return None
+        return self.root / rel
+
+    def result(self, artifact, target, action, detail=""):
+        return RestoreResult(artifact.category, str(target), action, detail)
+
+    @staticmethod
+    def _unchanged(target: Path, size: int, mtime_ns: int, tolerance_ns, same):
+        """
+        True if `target` already holds the backed-up file: same size and mtime
+        (within the archive format's resolution), or same size and `same()`.
+        """
+        try:
+            st = os.stat(target)
+        except OSError:
+            return False
+        if st.st_size != size:
+            return False
+        if abs(st.st_mtime_ns - mtime_ns) <= tolerance_ns:
+            return True
+        return same()
+
+    # Each restore_* returns the results for one work item
+
+    def restore_file(self, artifact, path: Path) -> List[RestoreResult]:
+        target = self.target(artifact)
+        if target is None:
+            return []
+        st = path.stat()
+        recorded = read_sidecar(path)
+        if self._unchanged(
+            target,
+            st.st_size,
+            st.st_mtime_ns,
+            0,
+            lambda: hash_file(target) == (recorded or hash_file(path)),
+        ):
+            return [self.result(artifact, target, "unchanged")]
+        if self.dry_run:
+            return [self.result(artifact, target, "planned")]
+        copy_file(path, target, verify=False)
+        return [self.result(artifact, target, "restored")]
+
+    def zip_batches(self, artifact, path: Path):
+        """Split a zip's wanted members into batches of work."""
+        with zipfile.ZipFile(path) as zf:
+            batch, size = [], 0
+            for info in zf.infolist():
+                target = self.target(artifact, info.filename)
+                if target is None:
+                    continue
+                batch.append((info, target))
+                size += info.compress_size
+                if size >= ZIP_BATCH_BYTES:
+                    yield batch
+                    batch, size = [], 0
+            if batch:
+                yield batch
+
+    def restore_zip(self, artifact, path: Path, batch) -> List[RestoreResult]:
+        results = []
+        with zipfile.ZipFile(path) as zf:
+            for info, target in batch:
+                # Archives list directories that hold no files; others are
+                # created along with their files
+                if info.is_dir():
+                    if not self.dry_run:
+                        target.mkdir(parents=True, exist_ok=True)
+                    continue
+                mtime_ns = int(time.mktime(info.date_time + (0, 0, -1))) * 10**9
+                # Zip timestamps are local time with two-second resolution
+                if self._unchanged(
+                    target,
+                    info.file_size,
+                    mtime_ns,
+                    2 * 10**9,
+                    lambda: _crc32(target) == info.CRC,
+                ):
+                    results.append(self.result(artifact, target, "unchanged"))
+                    continue
+                if self.dry_run:
+                    results.append(self.result(artifact, target, "planned"))
+                    continue
+                mode = (info.external_attr >> 16) & 0o7777 or 0o644
+                with zf.open(info) as member:
+                    _write(member, target, mode, mtime_ns)
+                results.append(self.result(artifact, target, "restored"))
+        return results
+
+    def restore_tar(self, artifact, path: Path) -> List[RestoreResult]:
+        """Tar streams can only be read in order: one worker per archive."""
+        results = []
+        with tarfile.open(path, "r|*") as tar:
+            for member in tar:
+                if not (member.isfile() or member.isdir()):
+                    continue
+                target = self.target(artifact, member.name)
+                if target is None:
+                    continue
+                if member.isdir():
+                    if not self.dry_run:
+                        target.mkdir(parents=True, exist_ok=True)
+                    continue
+                mtime_ns = int(member.mtime) * 10**9
+                # No checksum is stored, so content is only compared by
+                # extracting; a dry run goes by size and mtime alone
+                if self._unchanged(target, member.size, mtime_ns, 10**9, lambda: False):
+                    results.append(self.result(artifact, target, "unchanged"))
+                    continue
+                if self.dry_run:
+                    results.append(self.result(artifact, target, "planned"))
+                    continue
+                written = _write(
+                    tar.extractfile(member),
+                    target,
+                    member.mode & 0o7777,
+                    mtime_ns,
+                    compare=True,
+                )
+                results.append(
+                    self.result(
+                        artifact, target, "restored" if written else "unchanged"
+                    )
+                )
+        return results
+
+    def snapshot_entries(self, artifact, store: ChunkStore, manifest: Path):
+        for entry in store.load_manifest(manifest)["files"]:
+            target = self.target(artifact, entry["path"])
+            if target is not None:
+                yield entry, target
+
+    def restore_entry(
+        self, artifact, store: ChunkStore, entry, target
+    ) -> List[RestoreResult]:
+        if self._unchanged(
+            target,
+            entry["size"],
+            entry["mtime_ns"],
+            0,
+            lambda: store.chunk_digests(target) == entry["chunks"],
+        ):
+            return [self.result(artifact, target, "unchanged")]
+        if self.dry_run:
+            return [self.result(artifact, target, "planned")]
+        store.write_entry(entry, target)
+        return [self.result(artifact, target, "restored")]
+
+    def restore_duckdb_export(self, artifact, export_dir: Path) -> List[RestoreResult]:
+        """Rebuild ~/duckdb.db from a Parquet export, unless it already exists."""
+        target = self.target(artifact)
+        if target is None:
+            return []
+        if target.exists():
+            return [
+                self.result(
+                    artifact, target, "unchanged", "exists; not importing over it"
+                )
+            ]
+        if self.dry_run:
+            return [self.result(artifact, target, "planned")]
+        from local_machine.duckdb_export import import_database
+
+        import_database(export_dir, target)
+        return [self.result(artifact, target, "restored")]
+
+
+def _crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while block := f.read(READ_SIZE):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+def _write(src, target: Path, mode: int, mtime_ns: int, compare=False) -> bool:
+    """
+    Stream `src` to `target` atomically. With `compare`, an existing target
+    with the same content is kept (and False returned).
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, "wb") as out:
+            while block := src.read(READ_SIZE):
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+        if compare and target.is_file() and target.stat().st_size == size:
+            if hash_file(target) == digest.hexdigest():
+                return False
+        os.chmod(tmp, mode)
+        os.utime(tmp, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    metrics.record(bytes_written=size, files=1)
+    return True
+
+
+def _extract_tasks(restorer: _Restorer, backup_dir: Path, categories):
+    """(fn, args) work items for every wanted file in the backup."""
+    store = _store(backup_dir)
+    tasks = []
+    found = find_artifacts(backup_dir, categories)
+    restorer.claimed.update(a.target for a, kind, _ in found if kind == "file")
+    for artifact, kind, path in found:
+        if kind == "file":
+            tasks.append((restorer.restore_file, (artifact, path)))
+        elif kind == "zip":
+            for batch in restorer.zip_batches(artifact, path):
+                tasks.append((restorer.restore_zip, (artifact, path, batch)))
+        elif kind == "snapshot":
+            for entry, target in restorer.snapshot_entries(artifact, store, path):
+                tasks.append((restorer.restore_entry, (artifact, store, entry, target)))
+        else:
+            tasks.append((restorer.restore_tar, (artifact, path)))
+    export_dir = backup_dir / DUCKDB_EXPORT_DIR
+    has_db = any(a.name == "duckdb.db" for a, _, _ in found)
+    wanted = not categories or "duckdb" in categories
+    if wanted and not has_db and (export_dir / "load.sql").is_file():
+        artifact = Artifact("duckdb", DUCKDB_EXPORT_DIR, "duckdb.db")
+        tasks.append((restorer.restore_duckdb_export, (artifact, export_dir)))
+    return tasks
+
+
+# -- installs ----------------------------------------------------------------
+
+
+def _missing(wanted: List[str], installed: List[str]) -> List[str]:
+    have = {name.lower() for name in installed}
+    return [name for name in wanted if name.lower() not in have]
+
+
+def install_calls(
+    backup_dir: Path, categories: Optional[Iterable[str]] = None
+) -> List[Tuple[str, str, Tuple[str, ...]]]:
+    """
+    (category, name, (tool, *args)) for every install the backup asks for.
+    Extensions and tools that are already installed are left out; `brew
+    bundle` skips installed formulae itself.
+    """
+    backup_dir = Path(backup_dir)
+    wanted = set(categories) if categories else set(INSTALL_CATEGORIES)
+    calls = []
+    brewfile = backup_dir / "Brewfile"
+    if "brew" in wanted and brewfile.is_file():
+        calls.append(
+            ("brew", "Brewfile", ("brew", "bundle", "install", "--file", str(brewfile)))
+        )
+    listers = [
+        (
+            "vscode",
+            VSCODE_EXTENSIONS_FILE,
+            lambda: [e.split("@")[0] for e in VSCodeExtensions().list_extensions()],
+            ("code", "--install-extension"),
+        ),
+        (
+            "uv",
+            UV_TOOLS_FILE,
+            lambda: parse_uv_tools(UVToolList().list_tools()),
+            ("uv", "tool", "install"),
+        ),
+        (
+            "pipx",
+            PIPX_TOOLS_FILE,
+            lambda: parse_pipx_tools(PipxList().list_tools()),
+            ("pipx", "install"),
+        ),
+    ]
+    for category, list_file, installed, command in listers:
+        if category not in wanted:
+            continue
+        names = read_list(backup_dir / list_file)
+        if names:
+            for name in _missing(names, installed()):
+                calls.append((category, name, command + (name,)))
+    return calls
+
+
+def _cancel_all(futures) -> None:
+    # Cancelling an install's future kills its subprocess
+    for future in futures:
+        future.cancel()
+    cancel.checkpoint()
+
+
+def restore_backup(
+    backup_dir: Path,
+    target: Optional[Path] = None,
+    categories: Optional[Iterable[str]] = None,
+    patterns: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+    install_jobs: Optional[int] = None,
+    dry_run: bool = False,
+    progress_callback: Optional[Callable[[float], None]] = None,
+) -> List[RestoreResult]:
+    """
+    Restore `backup_dir` into `target` (default: the home directory).
+
+    `categories` limits the restore to those units (see `CATEGORIES`) and
+    `patterns` to files whose path relative to `target` matches one of the
+    globs. Installs only run for categories named explicitly when patterns
+    are given. Extraction uses `workers` threads; at most `install_jobs`
+    installs run at once.
+    """
+    from local_machine.runner import ToolError, ToolRunner
+
+    backup_dir = Path(backup_dir)
+    categories = list(categories) if categories else None
+    unknown = set(categories or ()) - set(CATEGORIES)
+    if unknown:
+        raise ValueError(f"Unknown restore categories: {sorted(unknown)}")
+    restorer = _Restorer(target or Path.home(), patterns, dry_run)
+    results: List[RestoreResult] = []
+
+    calls = []
+    if categories or not restorer.patterns:
+        calls = install_calls(backup_dir, categories)
+    installs = []
+    if dry_run:
+        results.extend(
+            RestoreResult(category, name, "planned", " ".join(call))
+            for category, name, call in calls
+        )
+    elif calls:
+        # Installs run on the runner's event loop while files are extracted
+        runner = ToolRunner(max_concurrency=install_jobs or DEFAULT_INSTALL_JOBS)
+        installs = [
+            (category, name, runner.submit(*call, timeout=INSTALL_TIMEOUT))
+            for category, name, call in calls
+        ]
+
+    tasks = _extract_tasks(restorer, backup_dir, categories)
+    total = len(tasks) + len(installs)
+    done = 0
+    if tasks:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = {metrics.submit(pool, fn, *args): args[0] for fn, args in tasks}
+            for future in as_completed(futures):
+                if cancel.cancelled():
+                    _cancel_all(list(futures) + [f for _, _, f in installs])
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    artifact = futures[future]
+                    logger.error(f"Restoring {artifact.name} failed: {e}")
+                    results.append(
+                        RestoreResult(
+                            artifact.category, artifact.name, "failed", str(e)
+                        )
+                    )
+                done += 1
+                if progress_callback:
+                    progress_callback(done / total)
+
+    for category, name, future in installs:
+        if cancel.cancelled():
+            _cancel_all([f for _, _, f in installs])
+        try:
+            future.result()
+            results.append(RestoreResult(category, name, "installed"))
+        except ToolError as e:
+            logger.error(f"Installing {name} failed: {e.stderr}")
+            results.append(RestoreResult(category, name, "failed", e.stderr.strip()))
+        done += 1
+        if progress_callback:
+            progress_callback(done / total)
+
+    counts = {}
+    for r in results:
+        counts[r.action] = counts.get(r.action, 0) + 1
+    logger.info(f"Restore from {backup_dir} into {restorer.root}: {counts}")
+    return sorted(results, key=lambda r: (r.category, r.path))
@@ -0,0 +1,31 @@
+"""
+Failed results as data.
+
+Backup and listing methods report an expected failure (a tool that exits
+non-zero, a database that cannot be read) by returning a `Failure` rather
+than raising, so a unit can still print the rest of its output. A `Failure`
+is the same "Error: ..." string these methods have always returned, so it
+displays unchanged; `failed` finds one anywhere in a result (a list of
+outputs, a dict of fields) by its type, never by its text.
+"""
+
+from typing import Any
+
+
+class Failure(str):
+    """An "Error: ..." result."""
+
+
+def failure(detail: Any) -> Failure:
+    return Failure(f"Error: {detail}")
+
+
+def failed(result: Any) -> bool:
+    """Whether `result`, or anything in it, is a `Failure`."""
+    if isinstance(result, Failure):
+        return True
+    if isinstance(result, (list, tuple)):
+        return any(failed(item) for item in result)
+    if isinstance(result, dict):
+        return any(failed(value) for value in result.values())
+    return False
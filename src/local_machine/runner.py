@@ -0,0 +1,195 @@
+import functools
+import os
+import shutil
+import signal
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence
+
+from local_machine.log import logger
+
+from local_machine import cancel, metrics
+
+if TYPE_CHECKING:
+    import asyncio
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONCURRENCY = 8
+
+# Per-tool timeouts in seconds; a call can still override its own timeout.
+TOOL_TIMEOUTS: Dict[str, float] = {
+    "brew": 300.0,
+    "code": 30.0,
+    "uv": 30.0,
+    "pipx": 60.0,
+    "crontab": 10.0,
+    "sw_vers": 10.0,
+    "date": 5.0,
+}
+
+# Extra environment per tool, e.g. stop `brew` from auto-updating mid-probe.
+TOOL_ENV: Dict[str, Dict[str, str]] = {
+    "brew": {"HOMEBREW_NO_AUTO_UPDATE": "1", "HOMEBREW_NO_ENV_HINTS": "1"},
+}
+
+
+class ToolError(Exception):
+    def __init__(
+        self, message: str, stderr: str = "", returncode: Optional[int] = None
+    ):
+        super().__init__(message)
+        self.stderr = stderr or message
+        self.returncode = returncode
+
+
+class ToolNotFound(ToolError):
+    pass
+
+
+class ToolTimeout(ToolError):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def which(tool: str) -> Optional[str]:
+    """Resolve a tool on PATH once per process."""
+    path = shutil.which(tool)
+    if path is None:
+        logger.debug(f"Tool not found on PATH: {tool}")
+    return path
+
+
+class ToolRunner:
+    """
+    Runs external tools as asyncio subprocesses on a shared background loop.
+    asyncio is only imported once the first tool is run.
+
+    Every call gets a timeout (per tool, see `TOOL_TIMEOUTS`) and waits for
+    one of `max_concurrency` slots. `submit` returns a `concurrent.futures.Future`
+    that can be cancelled, which kills the subprocess. `run` blocks and is safe
+    to call from any thread (CLI workers, the Streamlit script thread, app
+    jobs, whose cancellation also kills the subprocess); `arun`
+    is the awaitable form for code already running in an event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeouts = dict(TOOL_TIMEOUTS, **(timeouts or {}))
+        self._loop: Optional["asyncio.AbstractEventLoop"] = None
+        self._semaphore: Optional["asyncio.Semaphore"] = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> "asyncio.AbstractEventLoop":
+        import asyncio
+
+        with self._lock:
+            # A forked child inherits `_loop` but not the thread running it
+            if self._loop is None or self._loop.is_closed() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="tool-runner", daemon=True
+                )
+                thread.start()
+                self._loop = loop
+                self._semaphore = None
+            return self._loop
+
+    async def _exec(self, tool: str, args: Sequence[str], timeout: float) -> str:
+        import asyncio
+
+        exe = which(tool)
+        if exe is None:
+            raise ToolNotFound(f"{tool}: command not found")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        env = dict(os.environ, **TOOL_ENV.get(tool, {}))
+        async with self._semaphore:
+            proc = await asyncio.create_subprocess_exec(
+                exe,
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+                # Own process group, so a timeout also kills grandchildren
+                # (e.g. the ruby process behind the `brew` shell wrapper).
+                start_new_session=True,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise ToolTimeout(
+                    f"{tool} {' '.join(args)} timed out after {timeout:g}s"
+                ) from None
+        out = stdout.decode(errors="replace")
+        err = stderr.decode(errors="replace")
+        if proc.returncode != 0:
+            raise ToolError(
+                f"{tool} {' '.join(args)} exited with {proc.returncode}",
+                stderr=err,
+                returncode=proc.returncode,
+            )
+        return out
+
+    def submit(self, tool: str, *args: str, timeout: Optional[float] = None) -> Future:
+        if timeout is None:
+            timeout = self.timeouts.get(tool, DEFAULT_TIMEOUT)
+        import asyncio
+
+        loop = self._ensure_loop()
+        metrics.record(subprocesses=1)
+        return asyncio.run_coroutine_threadsafe(self._exec(tool, args, timeout), loop)
+
+    def run(self, tool: str, *args: str, timeout: Optional[float] = None) -> str:
+        future = self.submit(tool, *args, timeout=timeout)
+        try:
+            if cancel.current() is None:
+                return future.result()
+            # Inside a cancellable job: wake up now and then to check for it
+            while True:
+                try:
+                    return future.result(timeout=cancel.POLL_SECONDS)
+                except FutureTimeout:
+                    cancel.checkpoint()
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def arun(self, tool: str, *args: str, timeout: Optional[float] = None) -> str:
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(tool, *args, timeout=timeout))
+
+    def run_many(self, calls: Iterable[Sequence[str]]) -> List[object]:
+        """
+        Run several `(tool, *args)` calls concurrently.
+
+        Returns stdout strings in call order; failures are returned as the
+        `ToolError` instance rather than raised.
+        """
+        futures = [self.submit(*call) for call in calls]
+        results: List[object] = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except ToolError as e:
+                results.append(e)
+        return results
+
+
+runner = ToolRunner()
+run_tool = runner.run
@@ -0,0 +1,229 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple
+
+from local_machine.log import logger
+
+from local_machine.metrics import UnitMetrics, format_table, measure
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+@dataclass
+class Unit:
+    """
+    A single piece of backup or listing work.
+
+    `fn` takes no arguments and returns the lines to print for the unit (a
+    `UnitOutput` if any of them report a failure). Units marked `cpu_bound`
+    (archiving) run in a process pool; everything else is dominated by
+    subprocess or disk waits and runs in a thread pool. The
+    callable of a CPU-bound unit must be picklable (e.g. a `functools.partial`
+    of a module-level function). `cost` is a relative run-time estimate and
+    `deps` names units that must finish first (if they are being run).
+    """
+
+    name: str
+    fn: Callable[[], List[str]]
+    cpu_bound: bool = False
+    cost: float = 1.0
+    deps: Tuple[str, ...] = ()
+
+
+@dataclass
+class UnitResult:
+    name: str
+    lines: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    metrics: Optional[UnitMetrics] = None
+    # Lines the unit flagged as failures (see `UnitOutput`)
+    failures: List[str] = field(default_factory=list)
+
+
+class UnitOutput(list):
+    """
+    The lines a unit prints, with the ones that report a failure flagged by
+    `fail`, so the scheduler never has to read the text.
+    """
+
+    def __init__(self, lines: Iterable[str] = ()):
+        super().__init__(lines)
+        self.failures: List[str] = []
+
+    def fail(self, line: str) -> None:
+        self.append(line)
+        self.failures.append(line)
+
+
+def _timed(
+    name: str, fn: Callable[[], List[str]], process_cpu: bool = False
+) -> UnitResult:
+    start = time.perf_counter()
+    try:
+        with measure(name, process_cpu=process_cpu) as metrics:
+            lines = fn()
+    except Exception as e:
+        logger.error(f"Unit {name} failed: {e!r}")
+        return UnitResult(
+            name,
+            elapsed=time.perf_counter() - start,
+            error=str(e),
+            metrics=metrics,
+        )
+    # Units report most failures in their output rather than by raising
+    failed = list(getattr(lines, "failures", ()))
+    if failed:
+        logger.warning(f"Unit {name} reported {len(failed)} failures")
+        metrics.ok = False
+    return UnitResult(
+        name, list(lines), time.perf_counter() - start, metrics=metrics, failures=failed
+    )
+
+
+def process_pool(max_workers: Optional[int] = None) -> "ProcessPoolExecutor":
+    """
+    A process pool that does not plain-fork the current process.
+
+    Tool probes run in threads at the same time, and a worker forked while a
+    thread is starting a subprocess inherits that subprocess's exec-status
+    pipe, which leaves the probe blocked until the worker exits. forkserver
+    (or spawn, where unavailable) starts workers from a clean process, so
+    each worker repeats this process's log set-up before its first task.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from local_machine import log
+
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(method),
+        initializer=log.replay,
+        initargs=(log.settings(),),
+    )
+
+
+def default_jobs() -> int:
+    # Most units wait on subprocesses or disk, so oversubscribe the CPUs the
+    # same way ThreadPoolExecutor does by default.
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def run_units(
+    units: Iterable[Unit],
+    jobs: Optional[int] = None,
+    on_result: Optional[Callable[[UnitResult], None]] = None,
+) -> List[UnitResult]:
+    """
+    Run units concurrently and return their results in submission order.
+
+    A unit starts once the units it depends on have finished (whether or not
+    they succeeded); among the units that are ready, the most expensive
+    start first, so long units are not left until the end. Units caught in
+    a dependency cycle are not run and get an error result.
+
+    `on_result` is called from the calling thread as each unit finishes, so
+    callers can print a unit's output as one block without interleaving.
+    With `jobs=1`, or a single unit, the units run serially in the calling
+    process, so a one-unit command starts no pool at all.
+    """
+    units = list(units)
+    jobs = jobs or default_jobs()
+    results: dict[str, UnitResult] = {}
+    names = {u.name for u in units}
+    blocked = {u.name: {d for d in u.deps if d in names} - {u.name} for u in units}
+    waiting = list(units)
+
+    def ready() -> List[Unit]:
+        # Stable sort: equal costs keep their submission order
+        now = sorted(
+            (u for u in waiting if not blocked[u.name]),
+            key=lambda u: u.cost,
+            reverse=True,
+        )
+        for u in now:
+            waiting.remove(u)
+        return now
+
+    def finish(result: UnitResult) -> None:
+        results[result.name] = result
+        for deps in blocked.values():
+            deps.discard(result.name)
+        if on_result:
+            on_result(result)
+
+    def fail_cycle() -> None:
+        for u in waiting:
+            error = f"dependency cycle through {sorted(blocked[u.name])}"
+            logger.error(f"Unit {u.name} not run: {error}")
+            finish(UnitResult(u.name, error=error))
+        waiting.clear()
+
+    if jobs <= 1 or len(units) <= 1:
+        # One unit at a time, so the process's CPU time is the unit's
+        while waiting:
+            now = [u for u in waiting if not blocked[u.name]]
+            if not now:
+                fail_cycle()
+                break
+            unit = max(now, key=lambda u: u.cost)
+            waiting.remove(unit)
+            finish(_timed(unit.name, unit.fn, True))
+        return [results[u.name] for u in units]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    threads = procs = None
+    executors: List[Executor] = []
+    futures: dict[Future, Unit] = {}
+    try:
+        while waiting or futures:
+            for u in ready():
+                if u.cpu_bound:
+                    if procs is None:
+                        cpu_total = sum(1 for x in units if x.cpu_bound)
+                        procs = process_pool(min(jobs, cpu_total, os.cpu_count() or 1))
+                        executors.append(procs)
+                    futures[procs.submit(_timed, u.name, u.fn, True)] = u
+                else:
+                    if threads is None:
+                        io_total = sum(1 for x in units if not x.cpu_bound)
+                        threads = ThreadPoolExecutor(
+                            max_workers=min(jobs, io_total), thread_name_prefix="unit"
+                        )
+                        executors.append(threads)
+                    futures[threads.submit(_timed, u.name, u.fn)] = u
+            if not futures:
+                fail_cycle()
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = futures.pop(future)
+                try:
+                    finish(future.result())
+                except Exception as e:
+                    # Only reached if the worker itself died (e.g. unpicklable result)
+                    logger.error(f"Unit {unit.name} failed: {e!r}")
+                    finish(UnitResult(unit.name, error=str(e)))
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return [results[u.name] for u in units]
+
+
+def format_summary(results: Iterable[UnitResult]) -> str:
+    results = list(results)
+    if results and all(r.metrics is not None for r in results):
+        return format_table(r.metrics for r in results)
+    width = max((len(r.name) for r in results), default=4)
+    lines = [f"{'unit':<{width}}  {'seconds':>8}  status"]
+    for r in sorted(results, key=lambda r: r.elapsed, reverse=True):
+        status = "error" if r.error or r.failures else "ok"
+        lines.append(f"{r.name:<{width}}  {r.elapsed:>8.2f}  {status}")
+    return "\n".join(lines)
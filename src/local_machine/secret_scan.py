@@ -0,0 +1,214 @@
+"""
+Content scanning for credentials embedded in ordinary files.
+
+Every detector pairs a regular expression with the literal strings any
+match of it must contain (its anchors). A file is first searched for the
+anchors alone with `mmap.find`, which runs at memory speed, and a detector's
+expression only runs over the lines holding one of its anchors. Clean files,
+the vast majority, never reach the regex engine. Files are read through
+`mmap`, so nothing is copied into Python objects unless an anchor is found.
+Binary files (a NUL byte near the start, or a known binary extension), empty
+files and files over the size cap are skipped. `scan_batch` is the
+process-pool worker: the caller walks the tree and hands out batches of
+paths as it goes, so large repositories are spread over all workers. Matched text is
+never recorded or logged, only where it is and which detector found it.
+"""
+
+import mmap
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from local_machine.log import logger
+
+DEFAULT_MAX_SCAN_SIZE = 5 * 1024 * 1024
+# A NUL byte in this much of the start of a file marks it as binary
+BINARY_SNIFF_BYTES = 8192
+# Files are sent to workers in batches of about this many files or bytes
+BATCH_FILES = 256
+BATCH_BYTES = 32 * 1024 * 1024
+
+# (detector, anchors, pattern): every match of the pattern contains one of
+# the anchors
+DETECTORS: Tuple[Tuple[str, Tuple[bytes, ...], bytes], ...] = (
+    (
+        "private_key",
+        (b"PRIVATE KEY",),
+        rb"-----BEGIN (?:[A-Z]+ )*PRIVATE KEY(?: BLOCK)?-----",
+    ),
+    (
+        "aws_access_key_id",
+        (b"AKIA", b"ASIA", b"ABIA", b"ACCA"),
+        rb"\b(?:AKIA|ASIA|ABIA|ACCA)[A-Z0-9]{16}\b",
+    ),
+    (
+        "aws_secret_access_key",
+        (b"ecret_access_key", b"ECRET_ACCESS_KEY", b"ecretAccessKey"),
+        rb"(?i:aws_?secret_?access_?key)[\"']?\s*[:=]\s*[\"']?[A-Za-z0-9/+=]{40}\b",
+    ),
+    (
+        "github_token",
+        (b"ghp_", b"gho_", b"ghu_", b"ghs_", b"ghr_", b"github_pat_"),
+        rb"\b(?:gh[pousr]_[A-Za-z0-9]{36,}|github_pat_\w{60,})",
+    ),
+    (
+        "slack_token",
+        (b"xoxa-", b"xoxb-", b"xoxp-", b"xoxo-", b"xoxs-", b"xoxr-"),
+        rb"\bxox[abposr]-[A-Za-z0-9-]{10,}",
+    ),
+    ("google_api_key", (b"AIza",), rb"\bAIza[0-9A-Za-z_-]{35}"),
+    ("stripe_key", (b"k_live_",), rb"\b[rs]k_live_[0-9A-Za-z]{24,}"),
+    (
+        "openai_anthropic_key",
+        (b"sk-",),
+        rb"\bsk-(?:proj-|ant-[a-z0-9]+-)?[A-Za-z0-9_-]{32,}",
+    ),
+    (
+        "jwt",
+        (b"eyJ",),
+        rb"\beyJ[A-Za-z0-9_-]{10,}\.eyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}",
+    ),
+    (
+        # Only keys that name a credential outright: bare "secret" or "token"
+        # are everywhere in code and would put the regex engine back on most
+        # lines of most files
+        "password_assignment",
+        (
+            b"assw",
+            b"ASSW",
+            b"ecret_key",
+            b"ECRET_KEY",
+            b"pi_key",
+            b"PI_KEY",
+            b"piKey",
+            b"pikey",
+            b"APIKEY",
+            b"ccess_token",
+            b"CCESS_TOKEN",
+            b"ccessToken",
+            b"uth_token",
+            b"UTH_TOKEN",
+            b"uthToken",
+        ),
+        rb"(?i:(?:password|passwd|secret_?key|api_?key|access_?token|auth_?token))"
+        rb"[\"']?\s*[:=]\s*[\"'][^\"'\s]{8,}[\"']",
+    ),
+)
+
+# anchor -> the compiled patterns of the detectors it belongs to
+_ANCHORS: Dict[bytes, List[Tuple[str, "re.Pattern[bytes]"]]] = {}
+for _name, _anchors, _pattern in DETECTORS:
+    _compiled = re.compile(_pattern)
+    for _anchor in _anchors:
+        _ANCHORS.setdefault(_anchor, []).append((_name, _compiled))
+
+# Never worth opening
+BINARY_SUFFIXES = frozenset(
+    ".png .jpg .jpeg .gif .ico .pdf .zip .gz .tgz .bz2 .xz .zst .7z .jar .whl "
+    ".so .dylib .dll .exe .o .a .pyc .class .woff .woff2 .ttf .otf .mp3 .mp4 "
+    ".mov .wav .parquet .db .sqlite .duckdb .npy .npz .pkl .h5".split()
+)
+
+
+def content_record(path: str, st: os.stat_result, line: Optional[int], detector: str):
+    # The `secret_record` fields, plus where the credential is and what it is
+    return {
+        "path": path,
+        "size_bytes": st.st_size,
+        "last_modified": datetime.fromtimestamp(st.st_mtime).isoformat(),
+        "line": line,
+        "detector": detector,
+    }
+
+
+def wanted(name: str, size: int, max_size: int) -> bool:
+    """Whether a file is worth reading, from its directory entry alone."""
+    if size == 0 or size > max_size:
+        return False
+    return os.path.splitext(name)[1].lower() not in BINARY_SUFFIXES
+
+
+def _line_bounds(mm: mmap.mmap, pos: int) -> Tuple[int, int]:
+    end = mm.find(b"\n", pos)
+    return mm.rfind(b"\n", 0, pos) + 1, len(mm) if end == -1 else end
+
+
+def scan_mapped(mm: mmap.mmap) -> List[Tuple[int, str]]:
+    """(line, detector) of every match in `mm`, in file order."""
+    # line start offset -> (line end, detectors to run over it)
+    candidates: Dict[int, Tuple[int, set]] = {}
+    for anchor, detectors in _ANCHORS.items():
+        pos = mm.find(anchor)
+        while pos != -1:
+            start, end = _line_bounds(mm, pos)
+            candidates.setdefault(start, (end, set()))[1].update(detectors)
+            pos = mm.find(anchor, end)
+    hits = []
+    for start in sorted(candidates):
+        end, detectors = candidates[start]
+        matched = {name for name, p in detectors if p.search(mm, start, end)}
+        hits.extend((start, name) for name in sorted(matched))
+    # Lines are only counted up to a hit, so clean files cost nothing more
+    found, line, pos = [], 1, 0
+    for start, name in hits:
+        line += mm[pos:start].count(b"\n")
+        pos = start
+        found.append((line, name))
+    return found
+
+
+def scan_file(path: str) -> Tuple[List[dict], int]:
+    """
+    One record per line and detector that matches in `path`, and the bytes
+    searched (0 for empty and binary files, which are not searched).
+    """
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return [], 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b"\0", 0, BINARY_SNIFF_BYTES) != -1:
+                return [], 0
+            found = scan_mapped(mm)
+        return [
+            content_record(path, st, line, name) for line, name in found
+        ], st.st_size
+
+
+def scan_batch(paths: List[str]) -> Tuple[List[dict], int]:
+    """The records found in `paths`, and the bytes of the files searched."""
+    # Process-pool worker: must stay a picklable module-level function
+    records = []
+    bytes_read = 0
+    for path in paths:
+        try:
+            found, size = scan_file(path)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Cannot scan {path}: {e}")
+            continue
+        records.extend(found)
+        bytes_read += size
+    return records, bytes_read
+
+
+def batches(entries: Iterable[os.DirEntry], max_size: int) -> Iterator[List[str]]:
+    """Paths of the regular files worth scanning, in worker batches, as they come."""
+    batch: List[str] = []
+    batch_bytes = 0
+    for entry in entries:
+        try:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+        if not wanted(entry.name, size, max_size):
+            continue
+        batch.append(entry.path)
+        batch_bytes += size
+        if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
@@ -0,0 +1,245 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from local_machine.log import logger
+
+from local_machine import cancel
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL,
+    secrets TEXT NOT NULL
+);
+"""
+
+
+class SecretsIndex:
+    """
+    On-disk SQLite index of directory mtimes and the secret files in them.
+
+    A directory's mtime only changes when entries are added, removed or
+    renamed in it, so an unchanged mtime means its cached subdirectory and
+    secret-file names are still valid and it does not need to be listed again.
+    Secret files themselves are always re-stat'ed so size and modification
+    time stay current.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.added: List[str] = []
+        self.removed: List[str] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.path)
+        con.executescript(SCHEMA)
+        return con
+
+    @staticmethod
+    def _settings_key(root: Path, patterns: Iterable[str], exclude: Iterable[str]):
+        return json.dumps([str(root), sorted(patterns), sorted(exclude)])
+
+    def scan(
+        self,
+        root: Path,
+        patterns: Iterable[str],
+        exclude: Iterable[str],
+        record: Callable[[str, os.stat_result], dict],
+        progress_callback: Optional[Callable[[float], None]] = None,
+        workers: Optional[int] = None,
+        rebuild: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Yield a record for every secret file under `root`, re-listing only
+        directories whose mtime changed (every directory with `rebuild`).
+        After the generator is exhausted, `added` and `removed` hold the
+        secret paths that changed since the previous scan.
+
+        Each child of `root` is walked as one unit of work; with `workers` > 1
+        the units run on a process pool, each given its slice of the index,
+        and `record` must then be picklable.
+        """
+        patterns = frozenset(patterns)
+        exclude = frozenset(exclude)
+        root = os.fspath(root)
+        con = self._connect()
+        try:
+            settings = self._settings_key(root, patterns, exclude)
+            row = con.execute(
+                "SELECT value FROM meta WHERE key = 'settings'"
+            ).fetchone()
+            if not row or row[0] != settings:
+                logger.info(f"Secrets index {self.path} is new or stale; full rescan")
+                con.execute("DELETE FROM dirs")
+            cached: Dict[str, tuple] = {
+                path: (mtime_ns, subdirs, secrets)
+                for path, mtime_ns, subdirs, secrets in con.execute(
+                    "SELECT path, mtime_ns, subdirs, secrets FROM dirs"
+                )
+            }
+            previous = {
+                os.path.join(path, name)
+                for path, (_, _, secrets) in cached.items()
+                for name in json.loads(secrets)
+            }
+            if rebuild:
+                logger.info(f"Rebuilding secrets index {self.path}")
+                cached = {}
+            seen: List[str] = []
+            found: List[str] = []
+            updates: List[tuple] = []
+
+            top = self._visit(root, cached, exclude, patterns, updates)
+            if top is None:
+                return
+            subdirs, secrets = top
+            seen.append(root)
+            for rec, path in _records(root, secrets, record):
+                found.append(path)
+                yield rec
+            starts = [os.path.join(root, name) for name in subdirs]
+            if workers and workers > 1 and len(starts) > 1:
+                walks = self._walk_parallel(
+                    starts, cached, exclude, patterns, record, workers
+                )
+            else:
+                walks = (
+                    _walk(start, cached, exclude, patterns, record) for start in starts
+                )
+            for i, (records, paths, dirs, listed) in enumerate(walks, start=1):
+                found.extend(paths)
+                seen.extend(dirs)
+                updates.extend(listed)
+                yield from records
+                if progress_callback:
+                    progress_callback(i / len(starts))
+            if progress_callback:
+                progress_callback(1.0)
+
+            with con:
+                con.executemany(
+                    "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", updates
+                )
+                con.executemany(
+                    "DELETE FROM dirs WHERE path = ?",
+                    [(p,) for p in cached.keys() - set(seen)],
+                )
+                con.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('settings', ?)", (settings,)
+                )
+            self.added = sorted(set(found) - previous)
+            self.removed = sorted(previous - set(found))
+            logger.info(
+                f"Secrets index: {len(seen)} dirs, {len(updates)} re-listed, "
+                f"{len(self.added)} added, {len(self.removed)} removed"
+            )
+        finally:
+            con.close()
+
+    @staticmethod
+    def _walk_parallel(starts, cached, exclude, patterns, record, workers):
+        """`_walk` each start on a process pool, yielding results as they finish."""
+        from concurrent.futures import as_completed
+
+        from local_machine.scheduler import process_pool
+
+        # Each worker only needs the index rows of its own subtree
+        slices: Dict[str, Dict[str, tuple]] = {start: {} for start in starts}
+        for path, row in cached.items():
+            start = _owner(path, slices)
+            if start is not None:
+                slices[start][path] = row
+        with process_pool(workers) as pool:
+            futures = [
+                pool.submit(_walk, start, slices[start], exclude, patterns, record)
+                for start in starts
+            ]
+            for future in as_completed(futures):
+                if cancel.cancelled():
+                    for f in futures:
+                        f.cancel()
+                    cancel.checkpoint()
+                try:
+                    yield future.result()
+                except Exception as e:
+                    logger.error(f"Secrets index worker failed: {e}")
+                    yield [], [], [], []
+
+    @staticmethod
+    def _visit(path, cached, exclude, patterns, updates):
+        """Return (subdir names, secret names) for `path`, listing only if needed."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError as e:
+            logger.debug(f"Skipping {path}: {e}")
+            return None
+        hit = cached.get(path)
+        if hit and hit[0] == mtime_ns:
+            return json.loads(hit[1]), json.loads(hit[2])
+        subdirs, secrets = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in exclude:
+                                subdirs.append(entry.name)
+                        elif entry.name in patterns:
+                            secrets.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"Skipping {path}: {e}")
+            return None
+        updates.append((path, mtime_ns, json.dumps(subdirs), json.dumps(secrets)))
+        return subdirs, secrets
+
+
+def _owner(path: str, starts: Dict[str, dict]) -> Optional[str]:
+    """The walk start `path` lies under (or is), if any."""
+    while path not in starts:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    return path
+
+
+def _records(directory, names, record):
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            rec = record(path, os.stat(path))
+        except OSError as e:
+            logger.error(f"Error accessing {path}: {e}")
+            continue
+        yield rec, path
+
+
+def _walk(start, cached, exclude, patterns, record):
+    """
+    Walk the subtree at `start` against `cached` (its index rows). Returns
+    the secret records, their paths, the directories seen and the index rows
+    of the directories that had to be listed.
+    """
+    # Process-pool worker: must stay a picklable module-level function
+    records, paths, seen, updates = [], [], [], []
+    stack = [start]
+    while stack:
+        current = stack.pop()
+        visited = SecretsIndex._visit(current, cached, exclude, patterns, updates)
+        if visited is None:
+            continue
+        seen.append(current)
+        child_dirs, secrets = visited
+        stack.extend(os.path.join(current, d) for d in child_dirs)
+        for rec, path in _records(current, secrets, record):
+            records.append(rec)
+            paths.append(path)
+    return records, paths, seen, updates
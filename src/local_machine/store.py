@@ -0,0 +1,337 @@
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from local_machine.log import logger
+
+from local_machine import cancel, metrics
+
+if TYPE_CHECKING:
+    from local_machine.filters import PathFilter
+
+MIN_CHUNK = 16 * 1024
+AVG_CHUNK = 64 * 1024
+MAX_CHUNK = 256 * 1024
+READ_SIZE = 1024 * 1024
+
+_MASK64 = (1 << 64) - 1
+# Deterministic "random" table for the gear rolling hash; it must never change,
+# otherwise chunk boundaries (and therefore deduplication) shift.
+_GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "little")
+    for i in range(256)
+]
+
+
+def _cut_candidates(data: bytes, bits: int):
+    """
+    Offsets `i` where the low `bits` bits of the gear hash of the `bits`
+    bytes ending at `i` are zero, computed for every offset at once.
+
+    Each step of the gear hash shifts it left by one, so a byte stops
+    affecting the low `bits` bits `bits` steps after it was added: those
+    bits depend on the last `bits` bytes only, whatever came before.
+    """
+    import numpy as np
+
+    dtype = np.uint32 if bits <= 32 else np.uint64
+    gear = np.array(_GEAR, dtype=np.uint64).astype(dtype)
+    # part[i] = sum(g[i - k] << k for k < width), doubling `width` each step;
+    # h gathers the parts for the set bits of `bits` (the first `covered`
+    # offsets so far)
+    part = gear[np.frombuffer(data, dtype=np.uint8)]
+    h = None
+    width, covered = 1, 0
+    while True:
+        if bits & width:
+            if h is None:
+                h = part.copy()
+            else:
+                h[covered:] += part[: len(part) - covered] << dtype(covered)
+            covered += width
+        if width * 2 > bits:
+            break
+        part[width:] += part[:-width] << dtype(width)
+        width *= 2
+    return np.flatnonzero((h & dtype((1 << bits) - 1)) == 0)
+
+
+def chunk_boundaries(
+    data: bytes,
+    min_size: int = MIN_CHUNK,
+    avg_size: int = AVG_CHUNK,
+    max_size: int = MAX_CHUNK,
+) -> Iterator[int]:
+    """
+    Yield content-defined cut points (exclusive end offsets) for `data`.
+
+    Uses a gear rolling hash, restarted `min_size` bytes into each chunk: a
+    cut is made where the low bits of the hash are all zero, so an insertion
+    only changes the chunks around it. The hash is vectorised with numpy
+    (see `_cut_candidates`); only the first few bytes after each restart,
+    before the hash covers a full window, are hashed in Python.
+    """
+    import numpy as np
+
+    bits = max(avg_size.bit_length() - 1, 1)
+    mask = (1 << bits) - 1
+    gear = _GEAR
+    n = len(data)
+    candidates = _cut_candidates(data, bits) if n > min_size else None
+    start = 0
+    while start < n:
+        if n - start <= min_size:
+            yield n
+            return
+        end = min(start + max_size, n)
+        first = start + min_size
+        full = min(first + bits - 1, end)
+        h = 0
+        cut = end
+        for i in range(first, full):
+            h = ((h << 1) + gear[data[i]]) & _MASK64
+            if not h & mask:
+                cut = i + 1
+                break
+        else:
+            k = np.searchsorted(candidates, full)
+            if k < len(candidates) and candidates[k] < end:
+                cut = int(candidates[k]) + 1
+        yield cut
+        start = cut
+
+
+def _mkstemp(target: Path) -> Tuple[int, Path]:
+    """A fresh hidden temp file beside `target`, unique per call."""
+    fd, name = tempfile.mkstemp(
+        dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+    )
+    return fd, Path(name)
+
+
+class ChunkStore:
+    """
+    Content-addressed, deduplicating backup store.
+
+    Files are split into content-defined chunks, each stored once (zlib
+    compressed) under its SHA-256 in `chunks/`. A backup run only adds the
+    chunks it has not seen before plus a small JSON manifest in `snapshots/`.
+    Files whose size and mtime match the previous snapshot of the same name
+    reuse its chunk list without being read.
+    """
+
+    def __init__(self, root: Path, compress_level: int = 6):
+        self.root = Path(root)
+        self.compress_level = compress_level
+        self.chunks_dir = self.root / "chunks"
+        self.snapshots_dir = self.root / "snapshots"
+
+    def timestamp(self):
+        # Microseconds, so two snapshots in the same second keep both manifests
+        return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+    def chunk_path(self, digest: str) -> Path:
+        return self.chunks_dir / digest[:2] / digest
+
+    def has_chunk(self, digest: str) -> bool:
+        return self.chunk_path(digest).exists()
+
+    def put_chunk(self, data: bytes) -> Tuple[str, bool]:
+        """Store one chunk; returns (digest, newly_written)."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if path.exists():
+            return digest, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        compressed = zlib.compress(data, self.compress_level)
+        fd, tmp = _mkstemp(path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            # Another thread or process may have stored the same chunk
+            # meanwhile; its copy is identical, so keep it.
+            if path.exists():
+                return digest, False
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        metrics.record(bytes_written=len(compressed))
+        return digest, True
+
+    def read_chunk(self, digest: str) -> bytes:
+        data = zlib.decompress(self.chunk_path(digest).read_bytes())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} is corrupt")
+        return data
+
+    def iter_chunks(self, path: Path) -> Iterator[bytes]:
+        """Read `path` as content-defined chunks."""
+        buf = b""
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(READ_SIZE)
+                buf += block
+                if not buf:
+                    break
+                cuts = list(chunk_boundaries(buf))
+                # Keep the tail back unless we hit EOF: its boundary may move
+                # once more data arrives.
+                if block:
+                    cuts = cuts[:-1]
+                start = 0
+                for cut in cuts:
+                    yield buf[start:cut]
+                    start = cut
+                buf = buf[start:]
+                if not block:
+                    break
+
+    def put_file(self, path: Path) -> Tuple[List[str], int]:
+        """Store a file's chunks; returns (chunk digests, bytes newly written)."""
+        digests: List[str] = []
+        new_bytes = 0
+        for chunk in self.iter_chunks(path):
+            digest, new = self.put_chunk(chunk)
+            digests.append(digest)
+            new_bytes += len(chunk) if new else 0
+        return digests, new_bytes
+
+    def chunk_digests(self, path: Path) -> List[str]:
+        """The chunk digests `put_file` would record for `path`, storing nothing."""
+        return [hashlib.sha256(c).hexdigest() for c in self.iter_chunks(path)]
+
+    def snapshot(self, name: str, files: Iterable[Tuple[Path, str]]) -> Path:
+        """
+        Store `files` as (source path, archive name) pairs under snapshot `name`.
+
+        Returns the path of the new manifest.
+        """
+        previous = self.previous_entries(name)
+        entries = []
+        total = new_total = reused = 0
+        for src, arcname in files:
+            cancel.checkpoint()
+            try:
+                st = src.stat()
+                old = previous.get(arcname)
+                if (
+                    old is not None
+                    and old["size"] == st.st_size
+                    and old["mtime_ns"] == st.st_mtime_ns
+                    and all(self.has_chunk(d) for d in old["chunks"])
+                ):
+                    digests, new_bytes = old["chunks"], 0
+                    reused += 1
+                    metrics.record(files=1)
+                else:
+                    digests, new_bytes = self.put_file(src)
+                    metrics.record(bytes_read=st.st_size, files=1)
+            except OSError as e:
+                logger.error(f"Error storing {src}: {e}")
+                continue
+            entries.append(
+                {
+                    "path": arcname,
+                    "size": st.st_size,
+                    "mode": st.st_mode & 0o7777,
+                    "mtime_ns": st.st_mtime_ns,
+                    "chunks": digests,
+                }
+            )
+            total += st.st_size
+            new_total += new_bytes
+        manifest = {
+            "name": name,
+            "created": datetime.now().isoformat(),
+            "files": entries,
+        }
+        dest = self.snapshots_dir / name / f"{self.timestamp()}.json"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = _mkstemp(dest)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps(manifest, indent=1))
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
+        logger.info(
+            f"Snapshot {name}: {len(entries)} files ({reused} unchanged), "
+            f"{total} bytes, {new_total} new bytes stored -> {dest}"
+        )
+        return dest
+
+    def previous_entries(self, name: str) -> Dict[str, dict]:
+        """The file entries of the latest snapshot `name`, by archive path."""
+        snapshots = self.list_snapshots(name)
+        if not snapshots:
+            return {}
+        try:
+            manifest = self.load_manifest(snapshots[-1])
+        except (OSError, ValueError) as e:
+            logger.debug(f"Ignoring unreadable manifest {snapshots[-1]}: {e}")
+            return {}
+        return {entry["path"]: entry for entry in manifest["files"]}
+
+    def snapshot_dir(
+        self, name: str, src_dir: Path, path_filter: Optional["PathFilter"] = None
+    ) -> Path:
+        src_dir = Path(src_dir)
+        if path_filter:
+            return self.snapshot(name, path_filter.walk(src_dir))
+        files = (
+            (p, p.relative_to(src_dir).as_posix())
+            for p in sorted(src_dir.rglob("*"))
+            if p.is_file() and not p.is_symlink()
+        )
+        return self.snapshot(name, files)
+
+    def list_snapshots(self, name: Optional[str] = None) -> List[Path]:
+        pattern = f"{name}/*.json" if name else "*/*.json"
+        return sorted(self.snapshots_dir.glob(pattern))
+
+    def load_manifest(self, manifest: Path) -> dict:
+        return json.loads(Path(manifest).read_text())
+
+    def write_entry(self, entry: dict, target: Path) -> Path:
+        """Rebuild one manifest file entry at `target`, atomically."""
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = _mkstemp(target)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for digest in entry["chunks"]:
+                    f.write(self.read_chunk(digest))
+            os.chmod(tmp, entry["mode"])
+            os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+        metrics.record(bytes_written=entry["size"], files=1)
+        return target
+
+    def restore(self, manifest: Path, dest_dir: Path) -> List[Path]:
+        """Rebuild the files of a snapshot under `dest_dir`."""
+        dest_dir = Path(dest_dir)
+        return [
+            self.write_entry(entry, dest_dir / entry["path"])
+            for entry in self.load_manifest(manifest)["files"]
+        ]
+
+    def gc(self) -> int:
+        """Delete chunks no longer referenced by any snapshot; returns count."""
+        live = set()
+        for manifest in self.list_snapshots():
+            for entry in self.load_manifest(manifest)["files"]:
+                live.update(entry["chunks"])
+        removed = 0
+        for path in self.chunks_dir.glob("*/*"):
+            if path.name not in live and not path.name.startswith("."):
+                path.unlink()
+                removed += 1
+        logger.info(f"Removed {removed} unreferenced chunks from {self.chunks_dir}")
+        return removed
@@ -0,0 +1,102 @@
+"""
+Directory browsing for config trees that can hold tens of thousands of files
+(e.g. `~/.config/gcloud` with its logs and credential caches).
+
+`dir_totals` walks a tree once with `os.scandir` and records the aggregate
+size and file count of every directory in it, so `list_level` can describe
+one level, sizes included, without touching anything below it. Symlinks are
+listed but never followed.
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# (bytes, files) below a directory
+Totals = Tuple[int, int]
+
+
+@dataclass
+class TreeEntry:
+    name: str
+    path: str
+    is_dir: bool
+    size: int  # bytes; for a directory, everything below it
+    files: int
+    modified: float
+
+    def row(self) -> dict:
+        return {
+            "name": self.name + "/" if self.is_dir else self.name,
+            "size_kb": round(self.size / 1024, 1),
+            "files": self.files,
+            "modified": datetime.fromtimestamp(self.modified).strftime(
+                "%Y-%m-%d %H:%M"
+            ),
+        }
+
+
+def dir_totals(root: str) -> Dict[str, Totals]:
+    """(bytes, files) for `root` and every directory below it, in one walk."""
+    # path -> (bytes, files) directly in it, and its subdirectories
+    own: Dict[str, Tuple[int, int, List[str]]] = {}
+    order: List[str] = []
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        order.append(path)
+        size = files = 0
+        subdirs: List[str] = []
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try:
+                        if e.is_dir(follow_symlinks=False):
+                            subdirs.append(e.path)
+                        else:
+                            size += e.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        own[path] = (size, files, subdirs)
+        stack.extend(subdirs)
+    # Every directory comes after its parent in `order`, so walking it
+    # backwards sums children before parents
+    totals: Dict[str, Totals] = {}
+    for path in reversed(order):
+        size, files, subdirs = own.pop(path)
+        for sub in subdirs:
+            sub_size, sub_files = totals[sub]
+            size, files = size + sub_size, files + sub_files
+        totals[path] = (size, files)
+    return totals
+
+
+def list_level(path: str, totals: Dict[str, Totals]) -> List[TreeEntry]:
+    """The entries directly in `path`, directories first, each by name."""
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                try:
+                    st = e.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                is_dir = e.is_dir(follow_symlinks=False)
+                size, files = totals.get(e.path, (0, 0)) if is_dir else (st.st_size, 1)
+                entries.append(
+                    TreeEntry(e.name, e.path, is_dir, size, files, st.st_mtime)
+                )
+    except OSError:
+        return []
+    return sorted(entries, key=lambda e: (not e.is_dir, e.name.lower()))
+
+
+def paginate(items: list, page: int, page_size: int) -> Tuple[list, int]:
+    """Items on 1-based `page`, and the number of pages."""
+    pages = max(-(-len(items) // page_size), 1)
+    page = min(max(page, 1), pages)
+    return items[(page - 1) * page_size : page * page_size], pages
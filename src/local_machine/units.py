@@ -0,0 +1,407 @@
+"""
+The built-in backup and listing units.
+
+Each unit takes a `RunContext` and returns the lines to print, with the
+ones for failed results flagged (see `UnitOutput`); `make_*` builds the
+object behind a unit from the same context (the app uses these too). The
+backup classes in `local_machine.utils` load their heavier engines
+(archiving, the process pool, the secrets index, DuckDB) only when a unit
+needs them. Units are declared in `local_machine.registry`.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from local_machine.registry import source_paths
+from local_machine.results import failed
+from local_machine.scheduler import UnitOutput
+from local_machine.utils import (
+    DotfilesBackup,
+    BrewBackup,
+    SSHKeysLister,
+    MacOSInfo,
+    VSCodeExtensions,
+    CrontabBackup,
+    LaunchAgentsBackup,
+    PipxList,
+    UVToolList,
+    RBackup,
+    GitBackup,
+    TerminalBackup,
+    CloudCLIsBackup,
+    DuckDBBackup,
+    SecretsBackup,
+    SECRETS_INDEX,
+    declared_sources,
+)
+
+if TYPE_CHECKING:
+    from local_machine.filters import PathFilter
+    from local_machine.store import ChunkStore
+
+
+@dataclass
+class RunContext:
+    backup_dir: Path
+    dry_run: bool = False
+    store: Optional["ChunkStore"] = None
+    force: bool = False
+    workers: Optional[int] = None
+    codec: str = "deflate"
+    duckdb_mode: str = "copy"
+    duckdb_workers: Optional[int] = None
+    secrets_exclude: Optional[List[str]] = None
+    # secrets: search file contents too, skipping files over this many bytes
+    secrets_contents: bool = False
+    secrets_max_scan_size: Optional[int] = None
+    # secrets: re-list every directory instead of trusting the index
+    secrets_rescan: bool = False
+    # restore: where to, which categories/globs, and concurrent installs
+    restore_target: Optional[Path] = None
+    restore_only: Optional[List[str]] = None
+    restore_include: Optional[List[str]] = None
+    install_jobs: Optional[int] = None
+    # mirror: second copy of the backup directory
+    mirror_dest: Optional[Path] = None
+    mirror_delete: bool = False
+    # Compiled include/exclude rules by unit name (see registry.unit_filters)
+    filters: Dict[str, "PathFilter"] = field(default_factory=dict)
+    # Source patterns by unit name (see registry.unit_sources); units missing
+    # here read the built-in ones
+    sources: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+
+def _line(*parts) -> str:
+    return " ".join(str(p) for p in parts)
+
+
+def _report(out: UnitOutput, label: str, result) -> None:
+    """Add the line for a backup or listing result, flagged if it failed."""
+    line = _line(label, result)
+    if failed(result):
+        out.fail(line)
+    else:
+        out.append(line)
+
+
+def _maybe_write(out, dry_run, fn, *a, **kw):
+    if dry_run:
+        out.append(f"[DRY RUN] Would run: {fn.__qualname__}")
+        return "Dry run: no files written."
+    return fn(*a, **kw)
+
+
+def make_dotfiles(ctx):
+    return DotfilesBackup(
+        ctx.backup_dir,
+        store=ctx.store,
+        force=ctx.force,
+        codec=ctx.codec,
+        path_filter=ctx.filters.get("dotfiles"),
+        sources=ctx.sources.get("dotfiles"),
+    )
+
+
+def make_brew(ctx):
+    return BrewBackup(ctx.backup_dir, force=ctx.force, sources=ctx.sources.get("brew"))
+
+
+def make_ssh(ctx):
+    return SSHKeysLister()
+
+
+def make_macos(ctx):
+    return MacOSInfo()
+
+
+def make_vscode(ctx):
+    return VSCodeExtensions(
+        ctx.backup_dir, force=ctx.force, sources=ctx.sources.get("vscode")
+    )
+
+
+def make_crontab(ctx):
+    return CrontabBackup()
+
+
+def make_launchagents(ctx):
+    return LaunchAgentsBackup()
+
+
+def make_pipx(ctx):
+    return PipxList(ctx.backup_dir, force=ctx.force, sources=ctx.sources.get("pipx"))
+
+
+def make_uv(ctx):
+    return UVToolList(ctx.backup_dir, force=ctx.force, sources=ctx.sources.get("uv"))
+
+
+def make_r(ctx):
+    return RBackup(
+        ctx.backup_dir,
+        store=ctx.store,
+        force=ctx.force,
+        codec=ctx.codec,
+        path_filter=ctx.filters.get("r"),
+        sources=ctx.sources.get("r"),
+    )
+
+
+def make_git(ctx):
+    return GitBackup(ctx.backup_dir, force=ctx.force, sources=ctx.sources.get("git"))
+
+
+def make_terminal(ctx):
+    return TerminalBackup(
+        ctx.backup_dir,
+        store=ctx.store,
+        force=ctx.force,
+        codec=ctx.codec,
+        path_filter=ctx.filters.get("terminal"),
+        sources=ctx.sources.get("terminal"),
+    )
+
+
+def make_cloud(ctx):
+    return CloudCLIsBackup(
+        ctx.backup_dir,
+        store=ctx.store,
+        force=ctx.force,
+        codec=ctx.codec,
+        path_filter=ctx.filters.get("cloud"),
+        sources=ctx.sources.get("cloud"),
+    )
+
+
+def make_duckdb(ctx):
+    return DuckDBBackup(
+        ctx.backup_dir,
+        force=ctx.force,
+        mode=ctx.duckdb_mode,
+        workers=ctx.duckdb_workers,
+        sources=ctx.sources.get("duckdb"),
+    )
+
+
+def make_secrets(ctx):
+    # A dry run writes nothing to the backup directory, the index included
+    index_path = None if ctx.dry_run else ctx.backup_dir / SECRETS_INDEX
+    search_dirs = source_paths(declared_sources("secrets", ctx.sources.get("secrets")))
+    return SecretsBackup(
+        search_dirs[0],
+        exclude=ctx.secrets_exclude,
+        index_path=index_path,
+        max_scan_size=ctx.secrets_max_scan_size,
+        rescan=ctx.secrets_rescan,
+    )
+
+
+def dotfiles_unit(ctx):
+    out = UnitOutput()
+    result = _maybe_write(out, ctx.dry_run, make_dotfiles(ctx).backup)
+    _report(out, "Dotfiles backup:", result)
+    return out
+
+
+def brew_unit(ctx):
+    out = UnitOutput()
+    brew = make_brew(ctx)
+    result = _maybe_write(out, ctx.dry_run, brew.backup)
+    _report(out, "Brewfile backup:", result)
+    _report(out, "Formulae:\n", brew.list_formulae())
+    _report(out, "Casks:\n", brew.list_casks())
+    return out
+
+
+def ssh_unit(ctx):
+    lister = make_ssh(ctx)
+    return [
+        _line("SSH Keys:", lister.list_keys()),
+        _line("SSH Config:\n", lister.show_config()),
+    ]
+
+
+def macos_unit(ctx):
+    info = make_macos(ctx).get_info()
+    out = UnitOutput()
+    _report(out, "Date:", info["date"])
+    _report(out, "macOS Version:", info["macos_version"])
+    _report(out, "Installed Applications:", info["applications"])
+    return out
+
+
+def vscode_unit(ctx):
+    out = UnitOutput()
+    vscode = make_vscode(ctx)
+    result = _maybe_write(out, ctx.dry_run, vscode.backup)
+    _report(out, "VS Code extension list backup:", result)
+    _report(out, "VS Code Extensions:", vscode.list_extensions())
+    _report(out, "VS Code User Settings:\n", vscode.user_settings())
+    return out
+
+
+def crontab_unit(ctx):
+    out = UnitOutput()
+    _report(out, "User Crontab:\n", make_crontab(ctx).export_crontab())
+    return out
+
+
+def launchagents_unit(ctx):
+    return [_line("LaunchAgents:", make_launchagents(ctx).list_agents())]
+
+
+def pipx_unit(ctx):
+    out = UnitOutput()
+    pipx = make_pipx(ctx)
+    result = _maybe_write(out, ctx.dry_run, pipx.backup)
+    _report(out, "pipx tool list backup:", result)
+    _report(out, "pipx tools:\n", pipx.list_tools())
+    return out
+
+
+def uv_unit(ctx):
+    out = UnitOutput()
+    uv = make_uv(ctx)
+    result = _maybe_write(out, ctx.dry_run, uv.backup)
+    _report(out, "uv tool list backup:", result)
+    _report(out, "uv tools:\n", uv.list_tools())
+    return out
+
+
+def r_unit(ctx):
+    out = UnitOutput()
+    result = _maybe_write(out, ctx.dry_run, make_r(ctx).backup)
+    _report(out, "R backup:", result)
+    return out
+
+
+def git_unit(ctx):
+    out = UnitOutput()
+    result = _maybe_write(out, ctx.dry_run, make_git(ctx).backup)
+    _report(out, "Git backup:", result)
+    return out
+
+
+def terminal_unit(ctx):
+    out = UnitOutput()
+    result = _maybe_write(out, ctx.dry_run, make_terminal(ctx).backup)
+    _report(out, "Terminal backup:", result)
+    return out
+
+
+def cloud_unit(ctx):
+    out = UnitOutput()
+    result = _maybe_write(out, ctx.dry_run, make_cloud(ctx).backup)
+    _report(out, "Cloud CLI backup:", result)
+    return out
+
+
+def duckdb_unit(ctx):
+    out = UnitOutput()
+    result = _maybe_write(out, ctx.dry_run, make_duckdb(ctx).backup)
+    _report(out, "DuckDB backup:", result)
+    return out
+
+
+def secrets_unit(ctx):
+    scanner = make_secrets(ctx)
+    secrets = scanner.report_table(workers=ctx.workers, content=ctx.secrets_contents)
+    if ctx.secrets_contents:
+        out = ["Secrets found:" if secrets else "No secrets found."]
+        for entry in secrets:
+            out.append(
+                f"{entry['path']} | line {entry['line'] or '-'} | {entry['detector']}"
+            )
+        return out
+    if not secrets:
+        out = ["No .env or .secrets.toml files found."]
+    else:
+        out = ["Secrets found:"]
+        for entry in secrets:
+            out.append(
+                f"{entry['path']} | {entry['size_bytes']} bytes | modified {entry['last_modified']}"
+            )
+    if scanner.index is not None:
+        out.append(_line("Added since last scan:", scanner.index.added))
+        out.append(_line("Removed since last scan:", scanner.index.removed))
+    return out
+
+
+def verify_unit(ctx):
+    from local_machine.verify import UNCHECKED, verify_backup
+
+    results = verify_backup(ctx.backup_dir, workers=ctx.workers)
+    bad = [r for r in results if not r.ok]
+    out = UnitOutput([_line("Verified:", len(results), "checks,", len(bad), "failed")])
+    for r in bad:
+        out.fail(f"FAILED {r.path} ({r.check}): {r.detail}")
+    for r in results:
+        if r.ok and r.detail.startswith(UNCHECKED):
+            out.append(f"UNCHECKED {r.path} ({r.check}): {r.detail}")
+    return out
+
+
+def restore_unit(ctx):
+    from local_machine.restore import restore_backup
+
+    results = restore_backup(
+        ctx.backup_dir,
+        target=ctx.restore_target,
+        categories=ctx.restore_only,
+        patterns=ctx.restore_include,
+        workers=ctx.workers,
+        install_jobs=ctx.install_jobs,
+        dry_run=ctx.dry_run,
+    )
+    counts = {}
+    for r in results:
+        counts[r.action] = counts.get(r.action, 0) + 1
+    out = UnitOutput(
+        [_line("Restore:", ", ".join(f"{n} {a}" for a, n in sorted(counts.items())))]
+    )
+    for r in results:
+        if r.action == "unchanged":
+            continue
+        detail = f" ({r.detail})" if r.detail else ""
+        if r.action == "failed":
+            out.fail(f"FAILED [{r.category}] {r.path}{detail}")
+        else:
+            out.append(f"{r.action} [{r.category}] {r.path}{detail}")
+    return out
+
+
+def mirror_unit(ctx):
+    if ctx.mirror_dest is None:
+        out = UnitOutput()
+        out.fail("Error: no mirror target (use --mirror-to)")
+        return out
+    if ctx.dry_run:
+        return UnitOutput(
+            [f"[DRY RUN] Would mirror {ctx.backup_dir} to {ctx.mirror_dest}"]
+        )
+    from local_machine.mirror import mirror
+
+    results = mirror(
+        ctx.backup_dir, ctx.mirror_dest, delete=ctx.mirror_delete, workers=ctx.workers
+    )
+    total = sum(r.size for r in results)
+    written = sum(r.written for r in results)
+    ratio = f" ({written / total:.1%})" if total else ""
+    out = UnitOutput(
+        [
+            _line(
+                "Mirrored to",
+                ctx.mirror_dest,
+                f"- wrote {written} of {total} bytes{ratio}",
+            )
+        ]
+    )
+    for r in results:
+        if r.action == "unchanged":
+            continue
+        if r.action == "failed":
+            out.fail(f"FAILED {r.path}: {r.detail}")
+            continue
+        out.append(f"{r.action} {r.path} ({r.written} of {r.size} bytes written)")
+    return out
@@ -1,68 +1,207 @@
 import os
-import shutil
-import zipfile
 from datetime import datetime
 from pathlib import Path
 
-from loguru import logger
-from plumbum import ProcessExecutionError, local
+from local_machine.log import logger
 
+from local_machine import cancel, metrics
+from local_machine.cache import cached_inventory
+from local_machine.fastcopy import copy_file
+from local_machine.manifest import skip_if_unchanged
+from local_machine.registry import builtin_sources, source_paths
+from local_machine.results import failed, failure
+from local_machine.runner import ToolError, run_tool, runner
 
-class DotfilesBackup:
-    def __init__(self, backup_dir: Path):
-        self.backup_dir = backup_dir
+# The archive, secrets-index and process-pool engines are imported where
+# they are used, so listing-only commands start without loading them.
+
+
+def brew_prefix():
+    prefix = Path(os.environ.get("HOMEBREW_PREFIX", "/opt/homebrew"))
+    return prefix if prefix.exists() else Path("/usr/local")
+
+
+# Cheap invalidation signals for cached tool listings: directories whose mtime
+# changes when something is installed, upgraded (relinked) or removed.
+def brew_formula_signals():
+    return [brew_prefix() / "Cellar", brew_prefix() / "opt"]
+
+
+def brew_cask_signals():
+    return [brew_prefix() / "Caskroom"]
+
+
+# The tool directories are the units' registry sources
+def vscode_extension_signals():
+    return source_paths(builtin_sources("vscode"))
+
+
+def uv_tool_signals():
+    return source_paths(builtin_sources("uv"))
+
+
+def pipx_signals():
+    return source_paths(builtin_sources("pipx"))
 
-    def timestamp(self):
-        return datetime.now().strftime("%Y%m%d_%H%M%S")
+
+def archive_dirs(jobs, max_workers=None, store=None, codec="deflate", path_filter=None):
+    """
+    Archive several (src_dir, archive_base) pairs concurrently.
+
+    Each archive is written by an `ArchiveWriter` with the given codec, which
+    also compresses members in parallel. With a `ChunkStore`, each directory
+    becomes a deduplicated snapshot named after the archive instead. A
+    `PathFilter` decides which files go in. Returns the created archive (or
+    snapshot manifest) paths in input order.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from local_machine.archive import ArchiveWriter
+
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    writer = ArchiveWriter(codec)
+
+    def make(job):
+        src, archive = job
+        if store is not None:
+            return str(store.snapshot_dir(Path(archive).name, src, path_filter))
+        path = writer.write_dir(archive, src, path_filter)
+        logger.info(f"Archived {src} to {path}")
+        return str(path)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(jobs)) as pool:
+        futures = [metrics.submit(pool, make, job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def declared_sources(unit, sources=None):
+    """A unit's source patterns: as configured, else as the registry declares them."""
+    return tuple(sources) if sources is not None else builtin_sources(unit)
+
+
+def config_archive_name(src: Path) -> str:
+    """Archive base name for a configuration directory, e.g. `~/.aws` -> aws_config."""
+    return f"{src.name.lstrip('.')}_config"
+
+
+# Timestamped dotfiles archives kept in the backup directory; older ones are
+# deleted once a new one is written
+DOTFILES_KEEP = 10
 
 
 class DotfilesBackup:
-    def __init__(self, backup_dir: Path):
+    # Small files, often rewritten unchanged; compare their content
+    hash_sources = True
+
+    def __init__(
+        self,
+        backup_dir: Path,
+        store=None,
+        force=False,
+        codec="deflate",
+        path_filter=None,
+        keep=DOTFILES_KEEP,
+        sources=None,
+    ):
         self.backup_dir = backup_dir
+        self.store = store
+        self.force = force
+        self.codec = codec
+        # Names the registry excludes (shell history, caches) are left out
+        self.path_filter = path_filter
+        self.keep = keep
+        self.patterns = declared_sources("dotfiles", sources)
 
     def timestamp(self):
         return datetime.now().strftime("%Y%m%d_%H%M%S")
 
+    def sources(self):
+        return [
+            f
+            for f in source_paths(self.patterns)
+            if f.is_file()
+            and (self.path_filter is None or not self.path_filter.excluded(f.name))
+        ]
+
+    @skip_if_unchanged("dotfiles")
     def backup(self):
         self.backup_dir.mkdir(parents=True, exist_ok=True)
-        backup_file = self.backup_dir / f"dotfiles_backup_{self.timestamp()}.zip"
-        dotfiles = [
-            f for f in Path.home().glob(".*") if f.is_file() and f.name != ".DS_Store"
+        backup_base = self.backup_dir / f"dotfiles_backup_{self.timestamp()}"
+        dotfiles = self.sources()
+        if self.store is not None:
+            return self.store.snapshot(
+                "dotfiles_backup", ((f, f.name) for f in dotfiles)
+            )
+        from local_machine.archive import ArchiveWriter
+
+        archive = ArchiveWriter(self.codec).write(
+            backup_base, ((f, f.name) for f in dotfiles)
+        )
+        self.prune()
+        return archive
+
+    def prune(self):
+        """Delete all but the newest `keep` dotfiles archives (and their sidecars)."""
+        from local_machine.archive import EXTENSIONS
+        from local_machine.fastcopy import sidecar_path
+
+        archives = [
+            path
+            for ext in dict.fromkeys(EXTENSIONS.values())
+            for path in self.backup_dir.glob(f"dotfiles_backup_*{ext}")
         ]
-        with zipfile.ZipFile(backup_file, "w") as zipf:
-            for file in dotfiles:
-                zipf.write(file, arcname=file.name)
-        return backup_file
+        # The timestamp in the name orders them, whatever the codec
+        archives.sort(key=lambda p: p.name.split(".", 1)[0])
+        for old in archives[: max(len(archives) - self.keep, 0)]:
+            old.unlink(missing_ok=True)
+            sidecar_path(old).unlink(missing_ok=True)
+            logger.info(f"Removed old dotfiles archive {old}")
 
 
 class BrewBackup:
-    def __init__(self, backup_dir: Path):
+    # Installs and uninstalls change the mtime of these directories; walking
+    # the Cellar itself would cost more than `brew bundle dump`.
+    recursive_sources = False
+
+    def __init__(self, backup_dir: Path, force=False, sources=None):
         self.backup_dir = backup_dir
+        self.force = force
+        self.patterns = declared_sources("brew", sources)
 
+    def sources(self):
+        return source_paths(self.patterns)
+
+    @skip_if_unchanged("brew")
     def backup(self):
         brewfile = self.backup_dir / "Brewfile"
         self.backup_dir.mkdir(parents=True, exist_ok=True)
         try:
-            local["brew"]["bundle", "dump", "--file", str(brewfile), "--force"]()
+            run_tool("brew", "bundle", "dump", "--file", str(brewfile), "--force")
             logger.info(f"Brewfile created at {brewfile}")
+            if brewfile.exists():
+                metrics.record(bytes_written=brewfile.stat().st_size, files=1)
             return brewfile
-        except ProcessExecutionError as e:
+        except ToolError as e:
             logger.error(f"Brew bundle dump failed: {e.stderr}")
-            return f"Error: {e.stderr}"
+            return failure(e.stderr)
 
+    @cached_inventory(brew_formula_signals)
     def list_formulae(self):
         try:
-            return local["brew"]["list", "--versions", "--formula"]()
-        except ProcessExecutionError as e:
+            return run_tool("brew", "list", "--versions", "--formula")
+        except ToolError as e:
             logger.error(f"brew list --formula failed: {e.stderr}")
-            return f"Error: {e.stderr}"
+            return failure(e.stderr)
 
+    @cached_inventory(brew_cask_signals)
     def list_casks(self):
         try:
-            return local["brew"]["list", "--versions", "--cask"]()
-        except ProcessExecutionError as e:
+            return run_tool("brew", "list", "--versions", "--cask")
+        except ToolError as e:
             logger.error(f"brew list --cask failed: {e.stderr}")
-            return f"Error: {e.stderr}"
+            return failure(e.stderr)
 
 
 class SSHKeysLister:
@@ -84,29 +223,97 @@ class SSHKeysLister:
 class MacOSInfo:
     def get_info(self):
         info = {}
-        try:
-            info["date"] = local["date"]().strip()
-        except ProcessExecutionError as e:
-            info["date"] = f"Error: {e.stderr}"
-        try:
-            info["macos_version"] = local["sw_vers"]().strip()
-        except ProcessExecutionError as e:
-            info["macos_version"] = f"Error: {e.stderr}"
+        date, version = runner.run_many([("date",), ("sw_vers",)])
+        for key, result in (("date", date), ("macos_version", version)):
+            if isinstance(result, ToolError):
+                info[key] = failure(result.stderr)
+            else:
+                info[key] = result.strip()
         try:
             info["applications"] = os.listdir("/Applications")
         except Exception as e:
-            info["applications"] = f"Error: {e}"
+            info["applications"] = failure(e)
         return info
 
 
+# Tool lists written to the backup directory for `restore` to reinstall from
+VSCODE_EXTENSIONS_FILE = "vscode_extensions.txt"
+UV_TOOLS_FILE = "uv_tools.txt"
+PIPX_TOOLS_FILE = "pipx_tools.txt"
+
+
+def write_list(path: Path, names) -> Path:
+    """Write one name per line, atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text("".join(f"{name}\n" for name in names))
+    os.replace(tmp, path)
+    metrics.record(bytes_written=path.stat().st_size, files=1)
+    logger.info(f"Wrote {len(names)} names to {path}")
+    return path
+
+
+def read_list(path: Path):
+    """The names in a file written by `write_list` (blank lines and # comments
+    are ignored), or [] if it does not exist."""
+    try:
+        lines = Path(path).read_text().splitlines()
+    except FileNotFoundError:
+        return []
+    return [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+
+
+def parse_uv_tools(output: str):
+    """Tool names from `uv tool list` (a "name vX.Y" line per tool, followed by
+    its "- executable" lines)."""
+    return [
+        line.split()[0]
+        for line in output.splitlines()
+        if line.strip() and not line.startswith(("-", " ", "warning:"))
+    ]
+
+
+def parse_pipx_tools(output: str):
+    """Package names from `pipx list` ("   package NAME VERSION, installed ...")."""
+    names = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and fields[0] == "package":
+            names.append(fields[1])
+    return names
+
+
 class VSCodeExtensions:
+    # The extension list is a few directory mtimes away, see the signals
+    recursive_sources = False
+
+    def __init__(self, backup_dir: Path = None, force=False, sources=None):
+        self.backup_dir = backup_dir
+        self.force = force
+        self.patterns = declared_sources("vscode", sources)
+
+    def sources(self):
+        return source_paths(self.patterns)
+
+    @skip_if_unchanged("vscode")
+    def backup(self):
+        extensions = self.list_extensions()
+        if failed(extensions):
+            return extensions[0]
+        # Without versions, so a restore installs the current release
+        return write_list(
+            self.backup_dir / VSCODE_EXTENSIONS_FILE,
+            [ext.split("@")[0] for ext in extensions],
+        )
+
+    @cached_inventory(vscode_extension_signals)
     def list_extensions(self):
         try:
-            output = local["code"]["--list-extensions", "--show-versions"]()
+            output = run_tool("code", "--list-extensions", "--show-versions")
             return output.strip().splitlines()
-        except ProcessExecutionError as e:
+        except ToolError as e:
             logger.error(f"VS Code list-extensions failed: {e.stderr}")
-            return [f"Error: {e.stderr}"]
+            return [failure(e.stderr)]
 
     def user_settings(self):
         settings_path = (
@@ -120,10 +327,10 @@ class VSCodeExtensions:
 class CrontabBackup:
     def export_crontab(self):
         try:
-            return local["crontab"]["-l"]()
-        except ProcessExecutionError as e:
+            return run_tool("crontab", "-l")
+        except ToolError as e:
             logger.error(f"crontab -l failed: {e.stderr}")
-            return f"Error: {e.stderr}"
+            return failure(e.stderr)
 
 
 class LaunchAgentsBackup:
@@ -135,169 +342,597 @@ class LaunchAgentsBackup:
 
 
 class PipxList:
+    recursive_sources = False
+
+    def __init__(self, backup_dir: Path = None, force=False, sources=None):
+        self.backup_dir = backup_dir
+        self.force = force
+        self.patterns = declared_sources("pipx", sources)
+
+    def sources(self):
+        return source_paths(self.patterns)
+
+    @skip_if_unchanged("pipx")
+    def backup(self):
+        output = self.list_tools()
+        if failed(output):
+            return output
+        return write_list(self.backup_dir / PIPX_TOOLS_FILE, parse_pipx_tools(output))
+
+    @cached_inventory(pipx_signals)
     def list_tools(self):
         try:
-            return local["pipx"]["list"]()
-        except ProcessExecutionError as e:
+            return run_tool("pipx", "list")
+        except ToolError as e:
             logger.error(f"pipx list failed: {e.stderr}")
-            return f"Error: {e.stderr}"
+            return failure(e.stderr)
 
 
 class UVToolList:
+    recursive_sources = False
+
+    def __init__(self, backup_dir: Path = None, force=False, sources=None):
+        self.backup_dir = backup_dir
+        self.force = force
+        self.patterns = declared_sources("uv", sources)
+
+    def sources(self):
+        return source_paths(self.patterns)
+
+    @skip_if_unchanged("uv")
+    def backup(self):
+        output = self.list_tools()
+        if failed(output):
+            return output
+        return write_list(self.backup_dir / UV_TOOLS_FILE, parse_uv_tools(output))
+
+    @cached_inventory(uv_tool_signals)
     def list_tools(self):
         try:
-            return local["uv"]["tool", "list"]()
-        except ProcessExecutionError as e:
+            return run_tool("uv", "tool", "list")
+        except ToolError as e:
             logger.error(f"uv tool list failed: {e.stderr}")
-            return f"Error: {e.stderr}"
+            return failure(e.stderr)
 
 
 class RBackup:
-    def __init__(self, backup_dir: Path):
+    """R profile files are copied; RStudio config directories are archived."""
+
+    hash_sources = True
+
+    def __init__(
+        self,
+        backup_dir: Path,
+        store=None,
+        force=False,
+        codec="deflate",
+        path_filter=None,
+        sources=None,
+    ):
         self.backup_dir = backup_dir
+        self.store = store
+        self.force = force
+        self.codec = codec
+        self.path_filter = path_filter
+        self.patterns = declared_sources("r", sources)
 
+    def sources(self):
+        return source_paths(self.patterns)
+
+    @skip_if_unchanged("r")
     def backup(self):
-        files = [Path.home() / ".Rprofile", Path.home() / ".Renviron"]
+        sources = self.sources()
         backed_up = []
-        for f in files:
-            if f.exists():
+        for f in sources:
+            if f.is_file():
                 dest = self.backup_dir / f.name
-                shutil.copy(f, dest)
+                copy_file(f, dest)
                 backed_up.append(dest)
                 logger.info(f"Copied {f} to {dest}")
         # RStudio config dirs
-        rstudio_dirs = [
-            Path.home() / ".config/rstudio",
-            Path.home() / ".rstudio-desktop",
-        ]
-        for d in rstudio_dirs:
-            if d.exists():
-                archive = self.backup_dir / (d.name + "_backup")
-                shutil.make_archive(str(archive), "zip", str(d))
-                backed_up.append(str(archive) + ".zip")
-                logger.info(f"Archived {d} to {archive}.zip")
+        backed_up.extend(
+            archive_dirs(
+                (
+                    (d, self.backup_dir / (d.name + "_backup"))
+                    for d in sources
+                    if d.is_dir()
+                ),
+                store=self.store,
+                codec=self.codec,
+                path_filter=self.path_filter,
+            )
+        )
         return backed_up if backed_up else ["No R or RStudio configs found."]
 
 
 class GitBackup:
-    def __init__(self, backup_dir: Path):
+    hash_sources = True
+
+    def __init__(self, backup_dir: Path, force=False, sources=None):
         self.backup_dir = backup_dir
+        self.force = force
+        self.patterns = declared_sources("git", sources)
 
+    def sources(self):
+        return source_paths(self.patterns)
+
+    @skip_if_unchanged("git")
     def backup(self):
-        files = [Path.home() / ".gitconfig", Path.home() / ".gitignore_global"]
+        files = self.sources()
         backed_up = []
         for f in files:
             if f.exists():
                 dest = self.backup_dir / f.name
-                shutil.copy(f, dest)
+                copy_file(f, dest)
                 backed_up.append(dest)
                 logger.info(f"Copied {f} to {dest}")
         return backed_up if backed_up else ["No Git configs found."]
 
 
 class TerminalBackup:
-    def __init__(self, backup_dir: Path):
+    """Terminal config directories (Warp) are archived; preference files copied."""
+
+    labels = {
+        "com.apple.Terminal.plist": "Terminal",
+        "com.googlecode.iterm2.plist": "iTerm2",
+    }
+
+    def __init__(
+        self,
+        backup_dir: Path,
+        store=None,
+        force=False,
+        codec="deflate",
+        path_filter=None,
+        sources=None,
+    ):
         self.backup_dir = backup_dir
+        self.store = store
+        self.force = force
+        self.codec = codec
+        self.path_filter = path_filter
+        self.patterns = declared_sources("terminal", sources)
+
+    def sources(self):
+        return source_paths(self.patterns)
 
+    @skip_if_unchanged("terminal")
     def backup(self):
-        backed_up = []
+        sources = self.sources()
         # Warp config
-        warp_dir = Path.home() / ".warp"
-        if warp_dir.exists():
-            archive = self.backup_dir / "warp_config"
-            shutil.make_archive(str(archive), "zip", str(warp_dir))
-            backed_up.append(str(archive) + ".zip")
-            logger.info(f"Archived {warp_dir} to {archive}.zip")
+        backed_up = archive_dirs(
+            (
+                (src, self.backup_dir / config_archive_name(src))
+                for src in sources
+                if src.is_dir()
+            ),
+            store=self.store,
+            codec=self.codec,
+            path_filter=self.path_filter,
+        )
         # Terminal.app and iTerm2 prefs
-        prefs = [
-            ("com.apple.Terminal.plist", "Terminal"),
-            ("com.googlecode.iterm2.plist", "iTerm2"),
-        ]
-        for fname, label in prefs:
-            src = Path.home() / "Library/Preferences" / fname
-            if src.exists():
-                dest = self.backup_dir / fname
-                shutil.copy(src, dest)
+        for src in sources:
+            if src.is_file():
+                dest = self.backup_dir / src.name
+                copy_file(src, dest)
                 backed_up.append(dest)
+                label = self.labels.get(src.name, src.stem)
                 logger.info(f"Copied {label} prefs: {src} to {dest}")
         return backed_up if backed_up else ["No terminal configs found to backup."]
 
 
 class CloudCLIsBackup:
-    def __init__(self, backup_dir: Path):
+    def __init__(
+        self,
+        backup_dir: Path,
+        store=None,
+        force=False,
+        codec="deflate",
+        path_filter=None,
+        sources=None,
+    ):
         self.backup_dir = backup_dir
+        self.store = store
+        self.force = force
+        self.codec = codec
+        self.path_filter = path_filter
+        self.patterns = declared_sources("cloud", sources)
+
+    def sources(self):
+        return source_paths(self.patterns)
 
+    @skip_if_unchanged("cloud")
     def backup(self):
-        dirs = [
-            (Path.home() / ".aws", "aws_config"),
-            (Path.home() / ".config/gcloud", "gcloud_config"),
-            (Path.home() / ".azure", "azure_config"),
-            (Path.home() / ".railway", "railway_config"),
-            (Path.home() / ".config/render", "render_config"),
-        ]
-        backed_up = []
-        for src, name in dirs:
-            if src.exists():
-                archive = self.backup_dir / name
-                shutil.make_archive(str(archive), "zip", str(src))
-                backed_up.append(str(archive) + ".zip")
-                logger.info(f"Archived {src} to {archive}.zip")
+        backed_up = archive_dirs(
+            (
+                (src, self.backup_dir / config_archive_name(src))
+                for src in self.sources()
+                if src.is_dir()
+            ),
+            store=self.store,
+            codec=self.codec,
+            path_filter=self.path_filter,
+        )
         return backed_up if backed_up else ["No Cloud CLI configs found."]
 
 
 class DuckDBBackup:
-    def __init__(self, backup_dir: Path):
+    """
+    Back up `~/duckdb.db`, either as a file copy (`mode="copy"`) or as an
+    incremental per-table Parquet export restorable with `IMPORT DATABASE`
+    (`mode="export"`, needs the `duckdb` package).
+    """
+
+    def __init__(
+        self, backup_dir: Path, force=False, mode="copy", workers=None, sources=None
+    ):
         self.backup_dir = backup_dir
+        self.force = force
+        self.mode = mode
+        self.workers = workers
+        # The database first, then its write-ahead log
+        self.patterns = declared_sources("duckdb", sources)
+
+    @property
+    def variant(self):
+        return "export" if self.mode == "export" else None
 
+    def sources(self):
+        return source_paths(self.patterns)
+
+    @skip_if_unchanged("duckdb")
     def backup(self):
-        db = Path.home() / "duckdb.db"
-        if db.exists():
-            dest = self.backup_dir / db.name
-            shutil.copy(db, dest)
-            logger.info(f"Copied DuckDB database: {db} to {dest}")
-            return [dest]
-        else:
+        db = self.sources()[0]
+        if not db.exists():
             logger.info("No DuckDB database found.")
             return ["No DuckDB database found."]
+        if self.mode == "export":
+            try:
+                from local_machine.duckdb_export import export_database
+
+                return export_database(
+                    db, self.backup_dir / "duckdb_export", workers=self.workers
+                )
+            except Exception as e:
+                logger.error(f"DuckDB export failed: {e}")
+                return [failure(e)]
+        dest = self.backup_dir / db.name
+        copy_file(db, dest)
+        logger.info(f"Copied DuckDB database: {db} to {dest}")
+        return [dest]
+
+
+# File name of the incremental secrets index kept in the backup directory
+SECRETS_INDEX = "secrets_index.sqlite"
+
+# Directory names never descended into when scanning for secrets
+DEFAULT_SCAN_EXCLUDES = frozenset(
+    {".venv", "venv", "node_modules", ".git", "target", "__pycache__", ".tox"}
+)
+
+
+def scan_files(root, exclude=DEFAULT_SCAN_EXCLUDES):
+    """
+    Yield an `os.DirEntry` for every file under `root` in a single pass.
+
+    Directories whose name is in `exclude` are pruned before descending, and
+    symlinked directories are not followed. Unreadable directories are skipped.
+    """
+    stack = [os.fspath(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in exclude:
+                                stack.append(entry.path)
+                        else:
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"Skipping {current}: {e}")
+
+
+def secret_record(path, stat):
+    return {
+        "path": str(path),
+        "size_bytes": stat.st_size,
+        "last_modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+    }
+
+
+def _scan_subtree(root, patterns, exclude):
+    # Process-pool worker: must stay a picklable module-level function
+    records = []
+    for file in scan_files(root, exclude):
+        if file.name in patterns:
+            try:
+                records.append(secret_record(file.path, file.stat()))
+            except OSError as e:
+                logger.error(f"Error accessing {file.path}: {e}")
+    return records
 
 
 class SecretsBackup:
     def __init__(
-        self, search_dir: Path = Path.home() / "code/github", venv_dir: str = ".venv"
+        self,
+        search_dir: Path = None,
+        venv_dir: str = ".venv",
+        exclude=None,
+        index_path=None,
+        max_scan_size=None,
+        rescan=False,
     ):
+        if search_dir is None:
+            search_dir = source_paths(builtin_sources("secrets"))[0]
         self.search_dir = search_dir
+        # Content scans skip bigger files (default: secret_scan.DEFAULT_MAX_SCAN_SIZE)
+        self.max_scan_size = max_scan_size
         self.venv_dir = venv_dir
-
-    def report_table(self, patterns={".env", ".secrets.toml"}, progress_callback=None):
-        secrets = []
-        patterns = patterns
-        all_dirs = [
-            root
-            for root, _, _ in os.walk(self.search_dir)
-            if self.venv_dir not in Path(root).parts
-        ]
-        total = len(all_dirs)
-        if total == 0:
-            return secrets
-        for i, root in enumerate(all_dirs):
+        self.exclude = frozenset(
+            exclude if exclude is not None else DEFAULT_SCAN_EXCLUDES
+        ) | {venv_dir}
+        # With an index, rescans only re-list directories whose mtime changed
+        # (all of them with `rescan`, which rebuilds it) and
+        # `index.added`/`index.removed` report the difference.
+        self.rescan = rescan
+        self.index = None
+        if index_path:
+            from local_machine.secrets_index import SecretsIndex
+
+            self.index = SecretsIndex(index_path)
+
+    def _top_entries(self):
+        try:
+            with os.scandir(self.search_dir) as it:
+                return list(it)
+        except OSError as e:
+            logger.error(f"Cannot scan {self.search_dir}: {e}")
+            return []
+
+    def _match(self, entries, patterns):
+        for entry in entries:
+            if entry.name in patterns:
+                try:
+                    yield secret_record(entry.path, entry.stat())
+                except OSError as e:
+                    logger.error(f"Error accessing {entry.path}: {e}")
+
+    def _repo_roots(self, entries, files):
+        """
+        Split the top of the tree into per-repository work units.
+
+        Children of `search_dir` that are repositories (or plain files) are
+        used as-is; other directories (e.g. an org folder) are opened one more
+        level so each repository becomes its own unit. Files met on the way are
+        appended to `files`.
+        """
+        roots = []
+        for entry in entries:
+            try:
+                if not entry.is_dir(follow_symlinks=False):
+                    files.append(entry)
+                elif entry.name in self.exclude:
+                    continue
+                elif os.path.exists(os.path.join(entry.path, ".git")):
+                    roots.append(entry.path)
+                else:
+                    with os.scandir(entry.path) as it:
+                        for child in it:
+                            if not child.is_dir(follow_symlinks=False):
+                                files.append(child)
+                            elif child.name not in self.exclude:
+                                roots.append(child.path)
+            except OSError as e:
+                logger.error(f"Error accessing {entry.path}: {e}")
+        return roots
+
+    def iter_secrets(
+        self, patterns={".env", ".secrets.toml"}, progress_callback=None, workers=None
+    ):
+        """
+        Stream secret-file records while walking `search_dir` once.
+
+        Progress is the fraction of top-level work units scanned so far, so no
+        up-front directory count is needed. With `workers` > 1 the walk is split
+        per repository across a process pool and records are yielded as each
+        repository finishes. With an index, the index decides which
+        directories are listed again and its walk is split across `workers`
+        per top-level directory.
+        """
+        patterns = frozenset(patterns)
+        if self.index is not None:
+            yield from self.index.scan(
+                self.search_dir,
+                patterns,
+                self.exclude,
+                secret_record,
+                progress_callback,
+                workers=workers,
+                rebuild=self.rescan,
+            )
+            return
+        top = self._top_entries()
+        if workers and workers > 1:
+            yield from self._iter_parallel(top, patterns, progress_callback, workers)
+            return
+        total = len(top)
+        for i, entry in enumerate(top):
+            cancel.checkpoint()
             if progress_callback:
                 progress_callback(i / total)
-            for file in os.listdir(root):
-                if file in patterns:
-                    file_path = Path(root) / file
-                    try:
-                        stat = file_path.stat()
-                        secrets.append(
-                            {
-                                "path": str(file_path),
-                                "size_bytes": stat.st_size,
-                                "last_modified": datetime.fromtimestamp(
-                                    stat.st_mtime
-                                ).isoformat(),
-                            }
-                        )
-                    except Exception as e:
-                        logger.error(f"Error accessing {file_path}: {e}")
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in self.exclude:
+                        continue
+                    yield from self._match(
+                        scan_files(entry.path, self.exclude), patterns
+                    )
+                else:
+                    yield from self._match([entry], patterns)
+            except OSError as e:
+                logger.error(f"Error accessing {entry.path}: {e}")
+        if progress_callback:
+            progress_callback(1.0)
+
+    def _iter_parallel(self, top, patterns, progress_callback, workers):
+        from concurrent.futures import as_completed
+
+        from local_machine.scheduler import process_pool
+
+        files = []
+        roots = self._repo_roots(top, files)
+        yield from self._match(files, patterns)
+        total = len(roots)
+        with process_pool(workers) as pool:
+            futures = [
+                pool.submit(_scan_subtree, root, patterns, self.exclude)
+                for root in roots
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                if cancel.cancelled():
+                    for f in futures:
+                        f.cancel()
+                    cancel.checkpoint()
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    logger.error(f"Secrets scan worker failed: {e}")
+                if progress_callback:
+                    progress_callback(done / total)
         if progress_callback:
             progress_callback(1.0)
+
+    def iter_content_secrets(
+        self, patterns={".env", ".secrets.toml"}, progress_callback=None, workers=None
+    ):
+        """
+        Stream records for credentials inside the files under `search_dir`.
+
+        Files named in `patterns` are reported whole, as by `iter_secrets`
+        (with no line). Every other text file below the size cap is searched
+        by the detectors in `local_machine.secret_scan`, and each match adds
+        its line and detector to the usual record. Batches of files go to a
+        process pool of `workers` processes (default: one per CPU; 1 scans in
+        this process) as the walk finds them, with a bounded number in flight,
+        and records are yielded as batches finish. Progress is the fraction of
+        top-level entries walked so far.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        from local_machine.scheduler import process_pool
+        from local_machine.secret_scan import (
+            DEFAULT_MAX_SCAN_SIZE,
+            batches,
+            content_record,
+            scan_batch,
+        )
+
+        patterns = frozenset(patterns)
+        named = []
+        totals = {"files": 0, "bytes": 0}
+
+        def walk():
+            top = self._top_entries()
+            for i, entry in enumerate(top):
+                if progress_callback:
+                    progress_callback(i / len(top))
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name in self.exclude:
+                            continue
+                        entries = scan_files(entry.path, self.exclude)
+                    else:
+                        entries = [entry]
+                except OSError as e:
+                    logger.error(f"Error accessing {entry.path}: {e}")
+                    continue
+                for found in entries:
+                    if found.name in patterns:
+                        named.append(found)
+                    else:
+                        yield found
+
+        def secret_files():
+            while named:
+                entry = named.pop()
+                try:
+                    yield content_record(entry.path, entry.stat(), None, "secret_file")
+                except OSError as e:
+                    logger.error(f"Error accessing {entry.path}: {e}")
+
+        def finished(files, result):
+            records, bytes_read = result
+            metrics.record(bytes_read=bytes_read, files=files)
+            totals["files"] += files
+            totals["bytes"] += bytes_read
+            return records
+
+        work = batches(walk(), self.max_scan_size or DEFAULT_MAX_SCAN_SIZE)
+        if workers == 1:
+            for batch in work:
+                yield from secret_files()
+                cancel.checkpoint()
+                yield from finished(len(batch), scan_batch(batch))
+        else:
+            # Enough batches queued to keep every worker busy, without
+            # holding the whole tree's paths in memory
+            window = 2 * (workers or os.cpu_count() or 1)
+            with process_pool(workers) as pool:
+                pending = {}
+
+                def checkpoint():
+                    if cancel.cancelled():
+                        for future in pending:
+                            future.cancel()
+                        cancel.checkpoint()
+
+                def collect(return_when):
+                    done, _ = wait(pending, return_when=return_when)
+                    for future in done:
+                        files = pending.pop(future)
+                        try:
+                            yield from finished(files, future.result())
+                        except Exception as e:
+                            logger.error(f"Secrets content scan worker failed: {e}")
+
+                for batch in work:
+                    yield from secret_files()
+                    checkpoint()
+                    pending[pool.submit(scan_batch, batch)] = len(batch)
+                    if len(pending) >= window:
+                        yield from collect(FIRST_COMPLETED)
+                while pending:
+                    checkpoint()
+                    yield from collect(FIRST_COMPLETED)
+        yield from secret_files()
+        logger.info(
+            f"Scanned {totals['files']} files ({totals['bytes']} bytes read) "
+            f"under {self.search_dir} for secrets"
+        )
+        if progress_callback:
+            progress_callback(1.0)
+
+    def report_table(
+        self,
+        patterns={".env", ".secrets.toml"},
+        progress_callback=None,
+        workers=None,
+        content=False,
+    ):
+        """
+        Secret-file records, or with `content` the records of
+        `iter_content_secrets` (sorted by path and line).
+        """
+        if content:
+            secrets = sorted(
+                self.iter_content_secrets(patterns, progress_callback, workers),
+                key=lambda r: (r["path"], r["line"] or 0),
+            )
+            return secrets
+        secrets = list(self.iter_secrets(patterns, progress_callback, workers))
+        metrics.record(files=len(secrets))
         return secrets
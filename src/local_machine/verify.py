@@ -0,0 +1,240 @@
+import hashlib
+import os
+import tarfile
+import zipfile
+import zlib
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from local_machine.log import logger
+
+from local_machine import cancel
+from local_machine.fastcopy import SIDECAR_SUFFIX, hash_file, read_sidecar
+from local_machine.manifest import MANIFEST_DIR
+from local_machine.scheduler import process_pool
+
+STORE_DIR = "store"
+# Zip members are CRC-checked in batches of roughly this many compressed bytes
+ZIP_BATCH_BYTES = 64 * 1024 * 1024
+CHUNK_BATCH = 512
+READ_SIZE = 1024 * 1024
+# Detail prefix of a check that could not be run (it does not fail)
+UNCHECKED = "unchecked"
+
+
+@dataclass
+class CheckResult:
+    path: str
+    check: str  # "sha256", "zip", "tar" or "chunks"
+    ok: bool
+    detail: str = ""
+
+
+def _check_hash(path: str, expected: str) -> CheckResult:
+    try:
+        actual = hash_file(Path(path))
+    except OSError as e:
+        return CheckResult(path, "sha256", False, str(e))
+    if actual != expected:
+        return CheckResult(path, "sha256", False, f"expected {expected}, got {actual}")
+    return CheckResult(path, "sha256", True)
+
+
+def _check_zip_members(path: str, names: List[str]) -> CheckResult:
+    """Read members fully; zipfile raises BadZipFile on a CRC mismatch."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            for name in names:
+                with zf.open(name) as member:
+                    while member.read(READ_SIZE):
+                        pass
+    except (OSError, zipfile.BadZipFile, zlib.error, EOFError) as e:
+        return CheckResult(path, "zip", False, str(e))
+    except (RuntimeError, NotImplementedError) as e:
+        # Encrypted members, or a compression method zipfile cannot read
+        return CheckResult(path, "zip", False, f"{type(e).__name__}: {e}")
+    return CheckResult(path, "zip", True, f"{len(names)} members")
+
+
+def _check_tar(path: str) -> CheckResult:
+    """
+    Stream the whole archive, which also checks the xz or zstd integrity
+    checks. A .tar.zst with no zstd library to read it is reported as
+    unchecked rather than failed.
+    """
+    from local_machine.archive import zstd_reader
+
+    members = 0
+    try:
+        with open(path, "rb") as raw:
+            if path.endswith(".tar.zst"):
+                try:
+                    stream = zstd_reader(raw)
+                except ValueError as e:
+                    return CheckResult(path, "tar", True, f"{UNCHECKED}: {e}")
+            else:
+                stream = raw  # tarfile detects xz itself
+            with tarfile.open(fileobj=stream, mode="r|*") as tar:
+                for member in tar:
+                    members += 1
+                    f = tar.extractfile(member)
+                    if f is not None:
+                        while f.read(READ_SIZE):
+                            pass
+    except (OSError, tarfile.TarError, EOFError) as e:
+        return CheckResult(path, "tar", False, str(e))
+    except Exception as e:
+        # zstd libraries raise their own error types on corrupt frames
+        return CheckResult(path, "tar", False, f"{type(e).__name__}: {e}")
+    return CheckResult(path, "tar", True, f"{members} members")
+
+
+def _check_chunks(root: str, paths: List[str]) -> CheckResult:
+    bad = []
+    for path in paths:
+        try:
+            data = zlib.decompress(Path(path).read_bytes())
+        except (OSError, zlib.error):
+            bad.append(Path(path).name)
+            continue
+        if hashlib.sha256(data).hexdigest() != Path(path).name:
+            bad.append(Path(path).name)
+    if bad:
+        return CheckResult(root, "chunks", False, f"corrupt chunks: {bad[:10]}")
+    return CheckResult(root, "chunks", True, f"{len(paths)} chunks")
+
+
+def _zip_batches(path: Path):
+    """Split a zip's members into batches; reading the central directory also
+    validates it."""
+    with zipfile.ZipFile(path) as zf:
+        batch, size = [], 0
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            batch.append(info.filename)
+            size += info.compress_size
+            if size >= ZIP_BATCH_BYTES:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+
+def _store_checks(store_root: Path, results: List[CheckResult]):
+    """Yield chunk-hash tasks; missing chunks referenced by snapshots are
+    reported directly."""
+    from local_machine.store import ChunkStore
+
+    store = ChunkStore(store_root)
+    chunks = {}
+    if store.chunks_dir.exists():
+        for entry in os.scandir(store.chunks_dir):
+            if entry.is_dir():
+                for chunk in os.scandir(entry.path):
+                    if not chunk.name.startswith("."):
+                        chunks[chunk.name] = chunk.path
+    for manifest in store.list_snapshots():
+        try:
+            files = store.load_manifest(manifest)["files"]
+        except (OSError, ValueError, KeyError) as e:
+            results.append(CheckResult(str(manifest), "chunks", False, str(e)))
+            continue
+        missing = {d for f in files for d in f["chunks"] if d not in chunks}
+        results.append(
+            CheckResult(
+                str(manifest),
+                "chunks",
+                not missing,
+                f"{len(missing)} missing chunks" if missing else f"{len(files)} files",
+            )
+        )
+    paths = sorted(chunks.values())
+    for i in range(0, len(paths), CHUNK_BATCH):
+        batch = paths[i : i + CHUNK_BATCH]
+        yield "chunks", _check_chunks, (str(store.chunks_dir), batch)
+
+
+def verify_backup(
+    backup_dir: Path,
+    workers: Optional[int] = None,
+    progress_callback: Optional[Callable[[float], None]] = None,
+) -> List[CheckResult]:
+    """
+    Check everything in `backup_dir` against what was recorded at backup time.
+
+    Files with a `.sha256` sidecar are re-hashed, zip central directories and
+    member CRCs are checked, .tar.xz and .tar.zst archives are streamed end
+    to end, and every chunk in the chunk store is re-hashed (and snapshots
+    checked for missing chunks). A sidecar whose file is gone is a failure.
+    All checks are spread over a process pool, and a check that raises fails
+    on its own without stopping the others. Files with nothing to check
+    against are skipped.
+    """
+    backup_dir = Path(backup_dir)
+    results: List[CheckResult] = []
+    # (check, function, args): args[0] is the path a failed result names
+    tasks = []
+    for root, dirs, files in os.walk(backup_dir):
+        if Path(root) == backup_dir:
+            dirs[:] = [d for d in dirs if d not in (MANIFEST_DIR, STORE_DIR)]
+        present = set(files)
+        for name in files:
+            if name.startswith(".") and name.endswith(".tmp"):
+                continue
+            if name.endswith(SIDECAR_SUFFIX):
+                target = name[: -len(SIDECAR_SUFFIX)]
+                if target and target not in present:
+                    results.append(
+                        CheckResult(
+                            str(Path(root) / target),
+                            "sha256",
+                            False,
+                            f"missing (its {SIDECAR_SUFFIX} sidecar is still there)",
+                        )
+                    )
+                continue
+            path = Path(root) / name
+            expected = read_sidecar(path)
+            if expected:
+                tasks.append(("sha256", _check_hash, (str(path), expected)))
+            if name.endswith(".zip"):
+                try:
+                    for batch in _zip_batches(path):
+                        tasks.append(("zip", _check_zip_members, (str(path), batch)))
+                except (OSError, zipfile.BadZipFile) as e:
+                    results.append(CheckResult(str(path), "zip", False, str(e)))
+            elif name.endswith((".tar.xz", ".tar.zst")):
+                tasks.append(("tar", _check_tar, (str(path),)))
+    if (backup_dir / STORE_DIR).is_dir():
+        tasks.extend(_store_checks(backup_dir / STORE_DIR, results))
+
+    if not tasks:
+        return results
+    with process_pool(workers) as pool:
+        futures = {
+            pool.submit(fn, *args): (check, args[0]) for check, fn, args in tasks
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            if cancel.cancelled():
+                for f in futures:
+                    f.cancel()
+                cancel.checkpoint()
+            try:
+                results.append(future.result())
+            except Exception as e:
+                check, path = futures[future]
+                logger.exception(f"Verify check {check} of {path} raised")
+                results.append(
+                    CheckResult(path, check, False, f"{type(e).__name__}: {e}")
+                )
+            if progress_callback:
+                progress_callback(done / len(futures))
+
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        logger.error(f"Verify failed: {r.path} ({r.check}): {r.detail}")
+    logger.info(f"Verified {backup_dir}: {len(results)} checks, {len(failed)} failed")
+    return sorted(results, key=lambda r: (r.ok, r.path))